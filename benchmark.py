@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# Benchmark of the EDI2ODX processing stages, with a synthetic EDI log generator
+# Part of EDI2ODX, project hosted on https://github.com/HB9DTX/EDI2ODX
+#
+# Usage examples:
+#   python3 benchmark.py                                # 100, 10k and 1M QSO logs + batch of files
+#   python3 benchmark.py --sizes 1000 100000 --batch-files 0 -o results.json
+#   python3 benchmark.py --compare results_old.json     # ratios against the results of a previous version
+#   python3 benchmark.py --generate big.edi --qsos 50000 --footer   # only write a synthetic log
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import maiden       # in local folder
+import edi2odx      # in local folder
+
+DEFAULT_SIZES = [100, 10000, 1000000]
+STAGES = ['read_edi_file', 'select_odx_only', 'generate_xlsx_csv_files', 'compute_dist_az', 'plotstations']
+# Stages needing the results of other stages, which are run (not timed) when they are not benchmarked
+DEPENDENCIES = {'generate_xlsx_csv_files': ['select_odx_only'], 'plotstations': ['compute_dist_az']}
+DEFAULT_MODES = {1: 0.55, 2: 0.3, 6: 0.05, 7: 0.05, 0: 0.05}    # EDI mode code: probability
+
+
+def generate_edi(filename, qsos, band='144 MHz', call='HB9XC', locator='JN36BK', spread=8.0,
+                 modes=None, start='202305061400', duration_hours=24, footer=False, seed=0):
+    # Writes a synthetic REG1TEST log
+    # qsos: number of QSOs, spread: the stations are spread uniformly over +/- spread degrees latitude
+    # (2 * spread degrees longitude) around locator, modes: {EDI mode code: probability},
+    # start (YYYYMMDDHHMM) and duration_hours: QSO times are evenly distributed over this period,
+    # crossing midnight if the period does, footer: add a Tucnak-like footer after the QSO records
+    rng = np.random.default_rng(seed)
+    mhl = maiden.Maiden()
+    home = mhl.maiden2latlon(locator)
+    latitudes = np.clip(home[0] + rng.uniform(-spread, spread, qsos), -89.9, 89.9)
+    longitudes = np.clip(home[1] + rng.uniform(-2 * spread, 2 * spread, qsos), -179.9, 179.9)
+    locators = np.char.upper(mhl.latlon2maiden_array(latitudes, longitudes, 6))
+    latitudes, longitudes = mhl.maiden2latlon_array(locators)
+    distances, _ = mhl.dist_az_array(home, latitudes, longitudes)
+    modes = modes or DEFAULT_MODES
+    mode_codes = rng.choice(list(modes), size=qsos, p=np.array(list(modes.values())) / sum(modes.values()))
+    start = datetime.datetime.strptime(start, '%Y%m%d%H%M')
+    minutes = np.sort(rng.integers(0, duration_hours * 60, qsos))
+    end = start + datetime.timedelta(hours=duration_hours)
+    with open(filename, 'w', newline='\r\n') as ediFile:
+        ediFile.write('[REG1TEST;1]\n')
+        ediFile.write('TName=Synthetic benchmark contest\n')
+        ediFile.write('TDate=%s;%s\n' % (start.strftime('%Y%m%d'), end.strftime('%Y%m%d')))
+        ediFile.write('PCall=%s\nPWWLo=%s\nPExch=\nPSect=MULTI\nPBand=%s\n' % (call, locator, band))
+        ediFile.write('[Remarks]\nGenerated by benchmark.py\n[QSORecords;%s]\n' % qsos)
+        lines = []
+        for number in range(qsos):
+            qso_time = start + datetime.timedelta(minutes=int(minutes[number]))
+            lines.append('%s;%s;OK%dXYZ;%s;59;%04d;59;%04d;;%s;%d;;%s;;\n'
+                         % (qso_time.strftime('%y%m%d'), qso_time.strftime('%H%M'), number % 5000,
+                            mode_codes[number], number % 10000, (number * 7) % 10000, locators[number],
+                            distances[number], 'N' if number % 17 == 0 else ''))
+            if len(lines) == 10000:
+                ediFile.writelines(lines)
+                lines = []
+        ediFile.writelines(lines)
+        if footer:
+            ediFile.write('IDENT;Tucnak;4.36\n[END;Tucnak 4.36]\n')
+
+
+def _timed(function, *args):
+    # Cold run: the locator caches filled by the log generator or by a previous run are emptied first
+    maiden.LOCATOR_CACHE.clear()
+    maiden.DIST_AZ_CACHE.clear()
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def benchmark_stages(qsos, stages, band='144 MHz'):
+    # Times each stage of the pipeline on a synthetic log of a given size (the log is always read)
+    # Returns a list of result dicts, the working directory must be a temporary folder
+    filename = 'bench_%d.edi' % qsos
+    generate_edi(filename, qsos, band=band, footer=True)
+    contest = edi2odx.Contest()
+    results = []
+    timings = [('read_edi_file', edi2odx.read_edi_file, (filename, contest, edi2odx.ODX_COLUMNS)),
+               ('select_odx_only', edi2odx.select_odx_only, (contest, edi2odx.ODX[band])),
+               ('generate_xlsx_csv_files', edi2odx.generate_xlsx_csv_files, (contest,)),
+               ('compute_dist_az', edi2odx.compute_dist_az, (contest,)),
+               ('plotstations', edi2odx.plotstations, (contest,))]
+    needed = {'read_edi_file'} | set(stages)
+    for stage in stages:
+        needed.update(DEPENDENCIES.get(stage, []))
+    for stage, function, args in timings:
+        if stage not in needed:
+            continue
+        seconds = _timed(function, *args)
+        if stage in stages:
+            results.append({'benchmark': stage, 'qsos': qsos, 'seconds': round(seconds, 4),
+                            'qsos_per_second': round(qsos / seconds) if seconds else None})
+            print('%-25s %9d QSOs %9.3f s' % (stage, qsos, seconds))
+    os.remove(filename)
+    return results
+
+
+def benchmark_batch(files, qsos, jobs, images=False):
+    # Times the processing of a folder of many EDI files, with `jobs` worker processes
+    # images: also render the statistics and map (network access or a filled tile cache needed), default text only
+    filenames = []
+    for number in range(files):
+        filenames.append('batch_%03d.edi' % number)
+        generate_edi(filenames[-1], qsos, call='HB%dXC' % number, seed=number)
+    statsmap = edi2odx.STATSMAP
+    edi2odx.STATSMAP = images
+    try:
+        seconds = _timed(edi2odx.process_files, filenames, jobs)
+    finally:
+        edi2odx.STATSMAP = statsmap
+    for filename in filenames:
+        os.remove(filename)
+    print('batch of %d files of %d QSOs, %d job(s)%s: %.3f s'
+          % (files, qsos, jobs, ', with images' if images else '', seconds))
+    return {'benchmark': 'batch_jobs_%d%s' % (jobs, '_images' if images else ''), 'files': files, 'qsos': qsos,
+            'jobs': jobs, 'images': images, 'seconds': round(seconds, 4)}
+
+
+def environment():
+    # Description of the benchmarked version and machine, stored with the results
+    try:
+        version = subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                                 cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        version = ''
+    return {'version': version, 'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'cpus': os.cpu_count(), 'numpy': np.__version__, 'pandas': edi2odx.pd.__version__}
+
+
+def compare(results, reference):
+    # Prints the ratio of the timings to those of a previous results file (> 1: slower than before)
+    previous = {(item['benchmark'], item.get('qsos'), item.get('jobs')): item['seconds']
+                for item in reference['results']}
+    for item in results['results']:
+        key = (item['benchmark'], item.get('qsos'), item.get('jobs'))
+        if previous.get(key):
+            print('%-25s %9s QSOs: %8.3f s, was %8.3f s (x %.2f)' % (item['benchmark'], item.get('qsos'),
+                  item['seconds'], previous[key], item['seconds'] / previous[key]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the EDI2ODX processing stages')
+    parser.add_argument('--sizes', nargs='*', type=int, default=DEFAULT_SIZES,
+                        help='number of QSOs of the benchmarked logs (default: %s)' % DEFAULT_SIZES)
+    parser.add_argument('--stages', nargs='*', choices=STAGES, default=STAGES, help='stages to benchmark')
+    parser.add_argument('--batch-files', type=int, default=100, help='number of files of the batch benchmark')
+    parser.add_argument('--batch-qsos', type=int, default=500, help='number of QSOs per file of the batch')
+    parser.add_argument('--batch-images', action='store_true',
+                        help='also render the statistics and map in the batch benchmark (needs network access '
+                             'or a filled tile cache, default: text outputs only)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='worker processes for the parallel batch benchmark')
+    parser.add_argument('-o', '--output', default='benchmark_results.json', help='JSON results file')
+    parser.add_argument('--compare', help='JSON results file of a previous version to compare with')
+    parser.add_argument('--generate', metavar='EDI_FILE', help='only write a synthetic log to this file')
+    parser.add_argument('--qsos', type=int, default=1000, help='number of QSOs of the generated log')
+    parser.add_argument('--band', default='144 MHz', help='PBand of the generated logs')
+    parser.add_argument('--spread', type=float, default=8.0, help='locator spread of the generated log (degrees)')
+    parser.add_argument('--hours', type=int, default=24, help='duration of the generated log (hours)')
+    parser.add_argument('--footer', action='store_true', help='add a Tucnak footer to the generated log')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)        # results printed, not the processing details and warnings
+
+    if args.generate:
+        generate_edi(args.generate, args.qsos, band=args.band, spread=args.spread,
+                     duration_hours=args.hours, footer=args.footer)
+        return 0
+
+    output = os.path.abspath(args.output)
+    results = {'environment': environment(), 'results': []}
+    with tempfile.TemporaryDirectory() as folder:
+        working_directory = os.getcwd()
+        os.chdir(folder)        # the output files are written in the current folder
+        try:
+            for qsos in args.sizes:
+                results['results'] += benchmark_stages(qsos, args.stages, args.band)
+            if args.batch_files:
+                for jobs in sorted({1, args.jobs}):
+                    results['results'].append(benchmark_batch(args.batch_files, args.batch_qsos, jobs,
+                                                                  args.batch_images))
+        finally:
+            os.chdir(working_directory)
+    with open(output, 'w') as outputFile:
+        json.dump(results, outputFile, indent=1)
+    print('Results written to %s' % output)
+    if args.compare:
+        with open(args.compare) as referenceFile:
+            compare(results, json.load(referenceFile))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
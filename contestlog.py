@@ -0,0 +1,195 @@
+# Contest logs of EDI2ODX: the Contest object, reading of an EDI file into the QSO table, QSO times
+# Part of EDI2ODX, project hosted on https://github.com/HB9DTX/EDI2ODX
+#
+# Shared by edi2odx.py and the modules it imports (odxwriter, qsocheck, crosscheck, odxarchive), which
+# therefore never import edi2odx: when it runs as a script, that would execute it a second time as a module.
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+import ediparser    # in local folder
+import edisources   # in local folder
+
+# WAVELENGTHS is used because the first line in the output txt file must contain the band not the QRG
+WAVELENGTHS = {'50 MHz': '6 m',
+               '144 MHz': '2 m',
+               '432 MHz': '70 cm',
+               '1,3 GHz': '23 cm',
+               '2,3 GHz': '13 cm',
+               '3,4 GHz': '9 cm',
+               '5,7 GHz': '6 cm',
+               '10 GHz': '3 cm',
+               '24 GHz': '12 mm'}
+# 2022-12-09 de G1OGY: IARU R1 designate band 2 Metres as 145 MHz and 70cm as 435 MHz (see ODX in edi2odx.py)
+WAVELENGTHS['145 MHz'] = WAVELENGTHS['144 MHz']
+WAVELENGTHS['435 MHz'] = WAVELENGTHS['432 MHz']
+
+
+class Contest:
+    # Objects of this class contain all the information for a given contest log
+    def __init__(self):
+        self.start = None               # contest start time
+        self.locator = None             # locator of the contest station
+        self.call = None                # callsign of the contest station
+        self.bandEDI = None             # contest operating band in EDI format
+        self.bandFileName = None        # operating band without underscores
+        self.outputFilePrefix = None    # common prefix of the output files
+        self.header = None              # all key=value pairs of the [REG1TEST;1] header
+        self.rejectedLines = None       # (line number, line) of the lines skipped by the EDI parser
+        self.qsoList = None             # contains the whole contest log with all columns
+        self.qsoDx = None               # best DXs only, with limited columns for DUBUS report
+        self.minDistance = None         # minimum distance of interest for ODX
+        self.timer = None               # edi2odx.StageTimer recording the processing stages (None: not recorded)
+        self.settings = None            # settings used for this log {name: value} (None: global settings)
+        self.live = None                # edi2odx.LiveLog (--follow): statistics accumulated for the plots
+
+
+# Compact typed schema of the QSO table (contest.qsoList): the text columns are categoricals (a log has few
+# distinct dates, times, calls, locators...), the integer columns use the smallest unsigned type holding their
+# values (pandas nullable type if some fields are empty), the positions added by edi2odx.compute_dist_az are float32
+PARSE_CHUNK = 100000            # QSO records converted at once while reading a log
+
+
+def qso_table(chunks):
+    # DataFrame of the QSO records read by ediparser.EdiReader.read_chunks, in the compact schema
+    # Each chunk is converted to arrays as soon as it is read: the codes of the text values are
+    # numbered in order of appearance over the whole log, the integers are stored as int64
+    # (float64 with NaN if some fields are empty) until their type is known
+    arrays = {}                         # column name -> list of arrays (integers, or codes of the text values)
+    categories = {}                     # text column name -> {value: code}
+    for chunk in chunks:
+        for name, values in chunk.items():
+            if name in ediparser.INTEGER_COLUMNS:
+                array = np.array(values, dtype=np.float64 if None in values else np.int64)
+            else:
+                codes, uniques = pd.factorize(np.array(values, dtype=object))
+                index = categories.setdefault(name, {})
+                mapping = [index.setdefault(value, len(index)) for value in uniques]
+                array = np.array(mapping + [-1], dtype=np.int32)[codes]     # -1: missing value
+            arrays.setdefault(name, []).append(array)
+    columns = {}
+    for name, parts in arrays.items():
+        values = np.concatenate(parts)
+        if name in ediparser.INTEGER_COLUMNS:
+            columns[name] = _compact_integers(values)
+        else:
+            columns[name] = pd.Categorical.from_codes(values, categories=list(categories[name]))
+    return pd.DataFrame(columns)
+
+
+def _compact_integers(values):
+    # Smallest unsigned integer type holding the values (the parser only accepts up to 9 digits),
+    # nullable pandas type if some values are missing (NaN)
+    missing = np.isnan(values) if values.dtype.kind == 'f' else np.zeros(len(values), dtype=bool)
+    highest = values[~missing].max() if not missing.all() else 0
+    dtype = np.min_scalar_type(int(highest)).name                       # e.g. uint16
+    if missing.any():
+        return pd.array(values, dtype='U' + dtype[1:].capitalize())     # e.g. UInt16
+    return values.astype(dtype)
+
+
+def read_edi_file(filename, contest, usecols=None):
+    # Read one EDI file and fills all the attributes of the contest object
+    # filename: path of the file, or edisources.EdiSource (member of an archive, stdin...)
+    # usecols: QSO columns to keep in contest.qsoList (default: all columns of the EDI format)
+    source = edisources.as_source(filename)
+    with source.open() as ediFile:
+        return read_edi_lines(ediFile, contest, usecols, source.name)
+
+
+def read_edi_lines(lines, contest, usecols=None, name='EDI log'):
+    # Same as read_edi_file, for a log given as an iterable of text lines (open file, io.StringIO, list of str)
+    # name: designation of the log in the messages
+
+    contest.start = 'YYYYMMDD'  # Just in case those arguments would be empty in the EDI file
+    contest.call = 'CALLSIGN'
+    contest.bandEDI = 'BAND'
+    contest.bandFileName = 'BAND'
+    contest.locator = 'LOCATOR'
+
+    # single pass over the file: header ([REG1TEST;1] section) first, then the QSO records
+    reader = ediparser.EdiReader(lines)
+    header = reader.read_header()
+    qsos_list = qso_table(reader.read_chunks(usecols, PARSE_CHUNK))
+
+    if header.get('TDate'):
+        contest.start = header['TDate'][0:8]
+        logging.info('contest start time found: %s', contest.start)
+
+    if header.get('PCall'):
+        portable = {47: 45}
+        contest.call = header['PCall'].translate(portable)
+        # Converts '/' into '-' to avoid messing-up the filename
+        logging.info('The station call sign is: %s', contest.call)
+
+    if header.get('PWWLo'):
+        contest.locator = header['PWWLo']
+        logging.info('The station locator is: %s', contest.locator)
+
+    if header.get('PBand'):
+        traffic_band = header['PBand']
+        contest.bandEDI = traffic_band  # To be used for selecting the ODX distance in dictionary
+        band_file_name = traffic_band.replace(' ', '')  # To be used in the filenames (no space, no comma)
+        band_file_name = band_file_name.replace(',', '_')
+        contest.bandFileName = band_file_name
+        logging.info('The operating band is: %s', contest.bandEDI)
+
+    if reader.rejected:
+        # Tucnak IDENT / [END;...] footer, truncated or garbage lines
+        logging.warning('%s line(s) of %s are not QSO records and were skipped', len(reader.rejected), name)
+        for line_number, line in reader.rejected:
+            logging.info('skipped line %s: %s', line_number, line)
+    if reader.declaredQsos is not None and reader.declaredQsos != reader.qsoCount:
+        logging.warning('%s QSO records announced in header, %s read', reader.declaredQsos, reader.qsoCount)
+
+    contest.header = header
+    contest.rejectedLines = reader.rejected
+    contest.qsoList = qsos_list
+    logging.debug('QSO List (full log):')
+    logging.debug(qsos_list)
+    contest.outputFilePrefix = contest.start + '_' + contest.call + '_'\
+        + contest.locator + '__' + contest.bandFileName
+    # contest start date, callsign and band are used to create "unique" filenames
+    return contest
+
+
+def qso_timestamps(qsos):
+    # UTC time of each QSO (datetime64 Series) from the EDI DATE (YYMMDD) and TIME (HHMM) columns
+    # every QSO record has its own date, so QSOs right after midnight are dated on the next day
+    # invalid date or time: NaT
+    return pd.to_datetime(qsos['DATE'].astype(str) + qsos['TIME'].astype(str), format='%y%m%d%H%M', errors='coerce')
+
+
+def format_timestamps(utc):
+    # DUBUS DATE (YYYY-MM-DD) and TIME (HH:MM) string arrays of a datetime64 Series
+    # the digits are written in a character array all at once, invalid times (NaT) give empty strings
+    minutes = utc.to_numpy(dtype='datetime64[m]')
+    invalid = np.isnat(minutes)
+    minutes = np.where(invalid, np.datetime64(0, 'm'), minutes)
+    days = minutes.astype('datetime64[D]')
+    months = days.astype('datetime64[M]')
+    fields = [(months.astype('datetime64[Y]').astype(np.int64) + 1970, 4),
+              (months.astype(np.int64) % 12 + 1, 2),
+              ((days - months).astype(np.int64) + 1, 2),
+              ((minutes - days).astype(np.int64) // 60, 2),
+              ((minutes - days).astype(np.int64) % 60, 2)]
+    digits = []     # ASCII codes of the 12 digits YYYYMMDDHHMM
+    for values, width in fields:
+        for power in range(width - 1, -1, -1):
+            digits.append((values // 10 ** power % 10 + ord('0')).astype(np.uint8))
+    dash = np.full(len(minutes), ord('-'), np.uint8)
+    colon = np.full(len(minutes), ord(':'), np.uint8)
+    dates = np.stack(digits[0:4] + [dash] + digits[4:6] + [dash] + digits[6:8], axis=1)
+    times = np.stack(digits[8:10] + [colon] + digits[10:12], axis=1)
+    dates = dates.view('S10').ravel().astype(str)
+    times = times.view('S5').ravel().astype(str)
+    dates[invalid] = ''
+    times[invalid] = ''
+    return dates, times
+
+
+def file_digest(filename):
+    # sha256 of the content of a file (path or edisources.EdiSource)
+    return edisources.as_source(filename).digest()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# Cross-check of the QSOs of several EDI logs (e.g. all the logs of a club and its partners after a contest)
+# Part of EDI2ODX, project hosted on https://github.com/HB9DTX/EDI2ODX
+#
+# Each QSO is looked up in the log of the worked station: same calls, same band, time within a few minutes,
+# compatible modes, and the logged locator matching the locator of the other log (PWWLo).
+# The QSOs are indexed by (call pair, band, time bucket of `window` minutes): a QSO is only compared with the
+# QSOs of the same call pair and band in its own and the two neighbouring buckets (hash joins of pandas),
+# so the whole check takes near-linear time in the total number of QSOs instead of comparing all the logs
+# with each other.
+#
+# Status of a QSO (REMARK column of the ODX files with edi2odx.py --confirm):
+#   confirmed     found in the log of the worked station (possibly with a busted call on the other side)
+#   bad locator   found, but the logged locator is not the locator of the other log
+#   bad mode      found, but the modes don't match (e.g. CW logged on one side, SSB on the other)
+#   bad call      not found, but a station with a similar call (1 character different, /P missing...)
+#                 logged this station at that time: the call was busted
+#   not in log    the worked station sent its log, the QSO is not in it
+#   no log        no log of the worked station on this band
+#   ''            not checked (invalid date or time, no call)
+#
+# Usage example:
+#   python3 crosscheck.py *.edi          (status counts per log, -v: each QSO which is not confirmed)
+
+import argparse
+import collections
+import logging
+import sys
+
+import numpy as np
+import pandas as pd
+
+import contestlog   # in local folder
+import edisources   # in local folder
+
+CONFIRMED = 'confirmed'
+BAD_LOCATOR = 'bad locator'
+BAD_MODE = 'bad mode'
+BAD_CALL = 'bad call'
+NOT_IN_LOG = 'not in log'
+NO_LOG = 'no log'
+STATUSES = (CONFIRMED, BAD_LOCATOR, BAD_MODE, BAD_CALL, NOT_IN_LOG, NO_LOG)
+
+WINDOW = 5                      # default maximum time difference in minutes (edi2odx.py: CROSSCHECK_WINDOW)
+CROSSCHECK_COLUMNS = ['DATE', 'TIME', 'CALL', 'MODE', 'LOCATOR', 'QRB']     # columns read for the cross-check
+
+# EDI mode code expected in the other log for each mode code (3: SSB sent / CW received <-> 4: CW sent / SSB received)
+# 0 (or missing): unknown mode, not checked
+MODE_PAIRS = {1: 1, 2: 2, 3: 4, 4: 3, 5: 5, 6: 6, 7: 7, 8: 8, 9: 9}
+
+
+def base_call(call):
+    # Call without portable prefix or suffix, e.g. HB9XC for HB9XC/P or DL/HB9XC
+    return max(call.split('/'), key=len)
+
+
+def similar_calls(call, other):
+    # True if two different calls are probably the same station, one of them busted:
+    # same base call, or one character changed, added or removed
+    if call == other or base_call(call) == base_call(other):
+        return True
+    if abs(len(call) - len(other)) > 1:
+        return False
+    if len(call) == len(other):
+        return sum(a != b for a, b in zip(call, other)) == 1
+    short, long = sorted((call, other), key=len)
+    for index in range(len(long)):
+        if long[:index] + long[index + 1:] == short:
+            return True
+    return False
+
+
+def station_call(contest):
+    # Call of the station of a log, as it is logged by the other stations
+    return (contest.header or {}).get('PCall', contest.call or '').strip().upper()
+
+
+def _normalized(column, normalize):
+    # normalize() of each string of a column, computed once per distinct value, '' where missing
+    values = pd.Categorical(column)
+    categories = [normalize(value) for value in values.categories.astype(str).tolist()] + ['']
+    return np.array(categories, dtype=object)[values.codes]
+
+
+def qso_index(contests, window):
+    # One table of the QSOs of all the logs, with the keys of the index:
+    # station (call of the log), worked (logged call), band (wavelength, e.g. 144 and 145 MHz are the same band),
+    # minute (time of the QSO in minutes) and bucket (minute // window)
+    # Returns the table and the array of the calls (station and worked columns: index in this array)
+    frames = []
+    for number, contest in enumerate(contests):
+        qsos = contest.qsoList
+        minutes = contestlog.qso_timestamps(qsos).to_numpy(dtype='datetime64[m]')
+        frames.append(pd.DataFrame({
+            'log': number,
+            'row': np.arange(len(qsos)),
+            'station': station_call(contest),
+            'home': (contest.locator or '').upper()[:6],
+            'band': contestlog.WAVELENGTHS.get(contest.bandEDI, contest.bandEDI),
+            'worked': _normalized(qsos['CALL'], lambda call: call.strip().upper()),
+            'locator': _normalized(qsos['LOCATOR'], lambda locator: locator.strip().upper()[:6]),
+            'mode': qsos['MODE'].astype('Int64').fillna(0).to_numpy(dtype=np.int64),
+            'minute': np.where(np.isnat(minutes), np.int64(-1), minutes.astype(np.int64)),
+            'valid': ~np.isnat(minutes)}))
+    table = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=['log', 'row', 'station', 'home', 'band', 'worked', 'locator', 'mode', 'minute', 'valid'])
+    table = table[table['valid'] & (table['worked'] != '')].drop(columns='valid')
+    table['bucket'] = table['minute'] // window
+    # calls and bands replaced by integer codes for the joins, calls[code]: call
+    codes, calls = pd.factorize(np.concatenate([table['station'].to_numpy(), table['worked'].to_numpy()]))
+    table['station'], table['worked'] = codes[:len(table)], codes[len(table):]
+    table['band'] = pd.factorize(table['band'])[0]
+    return table, np.asarray(calls, dtype=object)
+
+
+def window_join(left, right, left_on, right_on, window):
+    # Pairs of QSOs of left and right with equal keys (left_on / right_on columns) and at most `window` minutes
+    # apart: joined on the keys and the time bucket, for the buckets before, of and after each left QSO
+    # The columns of right get the suffix '_r', 'delta': time difference in minutes
+    right = right.rename(columns=lambda name: name + '_r')
+    right_on = [name + '_r' for name in right_on] + ['bucket_r']
+    pairs = []
+    for shift in (-1, 0, 1):
+        shifted = left.assign(bucket=left['bucket'] + shift)
+        pairs.append(shifted.reset_index().merge(right, left_on=left_on + ['bucket'], right_on=right_on))
+    pairs = pd.concat(pairs, ignore_index=True)
+    pairs['delta'] = (pairs['minute'] - pairs['minute_r']).abs()
+    return pairs[(pairs['delta'] <= window) & (pairs['log'] != pairs['log_r'])]
+
+
+def match_status(matches):
+    # Status of the QSOs found in the other log (one row of window_join per QSO): confirmed, bad locator or bad mode
+    expected_modes = matches['mode'].map(MODE_PAIRS)
+    bad_mode = expected_modes.notna() & matches['mode_r'].isin(list(MODE_PAIRS)) \
+        & (expected_modes != matches['mode_r'])
+    bad_locator = matches['locator'] != matches['home_r']
+    return np.where(bad_locator, BAD_LOCATOR, np.where(bad_mode, BAD_MODE, CONFIRMED))
+
+
+def crosscheck(contests, window=WINDOW):
+    # Status of each QSO of each log (see STATUSES), as a list of one array of strings per contest log
+    # (same order as contest.qsoList), also stored in the REMARK column of contest.qsoList
+    # window: maximum time difference in minutes of the two entries of a QSO
+    window = max(int(window), 1)
+    table, calls = qso_index(contests, window)
+    status = pd.Series('', index=table.index, dtype=object)
+
+    # QSO found in the log of the worked station: closest entry of the other log
+    matches = window_join(table, table, ['station', 'worked', 'band'], ['worked', 'station', 'band'], window)
+    matches = matches.sort_values('delta', kind='stable').drop_duplicates('index').set_index('index')
+    status[matches.index] = match_status(matches)
+
+    # not found: busted call, of this log (another station with a similar call logged this station at that time)
+    # or of the other log (the worked station logged a similar call at that time)
+    missing = table[status == '']
+    others = window_join(missing, table, ['station', 'band'], ['worked', 'band'], window)
+    busted = [similar_calls(calls[worked], calls[station])
+              for worked, station in zip(others['worked'], others['station_r'])]
+    status[others.loc[busted, 'index'].unique()] = BAD_CALL
+    missing = table[status == '']
+    others = window_join(missing, table, ['worked', 'band'], ['station', 'band'], window)
+    busted = [similar_calls(calls[station], calls[worked])
+              for station, worked in zip(others['station'], others['worked_r'])]
+    matches = others.loc[busted].sort_values('delta', kind='stable').drop_duplicates('index').set_index('index')
+    status[matches.index] = match_status(matches)
+
+    # not found, no busted call
+    bands = [contestlog.WAVELENGTHS.get(contest.bandEDI, contest.bandEDI) for contest in contests]
+    logs = set(zip(map(station_call, contests), bands))
+    missing = table[status == '']
+    has_log = [(calls[worked], bands[log]) in logs for worked, log in zip(missing['worked'], missing['log'])]
+    status[missing.index] = np.where(has_log, NOT_IN_LOG, NO_LOG)
+
+    results = []
+    for number, contest in enumerate(contests):
+        values = np.full(len(contest.qsoList), '', dtype=object)
+        in_log = table['log'] == number
+        values[table.loc[in_log, 'row'].to_numpy()] = status[in_log].to_numpy()
+        contest.qsoList['REMARK'] = pd.Categorical(values)
+        results.append(values)
+        logging.info('%s %s: %s', station_call(contest), contest.bandEDI, ', '.join(
+            '%s %s' % (count, name) for name, count in collections.Counter(values).most_common() if name))
+    return results
+
+
+def read_logs(filenames):
+    # Reads EDI files (paths or edisources.EdiSource, columns needed by the cross-check), returns the lists of the
+    # names and Contest objects of the files which could be read, the others are logged and left out
+    names = []
+    contests = []
+    for filename in filenames:
+        contest = contestlog.Contest()
+        try:
+            contestlog.read_edi_file(filename, contest, CROSSCHECK_COLUMNS)
+        except (OSError, ValueError) as error:
+            logging.error('%s not cross-checked: %s', filename, error)
+            continue
+        names.append(edisources.as_source(filename).name)
+        contests.append(contest)
+    return names, contests
+
+
+def crosscheck_files(filenames, window=WINDOW):
+    # Reads EDI files and cross-checks their QSOs, returns {name of the file: array of the status of the QSOs}
+    names, contests = read_logs(filenames)
+    return dict(zip(names, crosscheck(contests, window)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cross-check of the QSOs of several EDI logs')
+    parser.add_argument('files', nargs='+', help='EDI files, folders, zip or tar archives, glob patterns')
+    parser.add_argument('-w', '--window', type=int, default=WINDOW,
+                        help='maximum time difference in minutes (default: %(default)s)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='list each QSO which is not confirmed')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    names, contests = read_logs(edisources.expand(args.files))
+    for filename, contest, values in zip(names, contests, crosscheck(contests, args.window)):
+        counts = collections.Counter(values)
+        print('%s: %s QSOs, %s' % (filename, len(values), ', '.join(
+            '%s %s' % (counts[name], name) for name in STATUSES if counts[name])))
+        if args.verbose:
+            qsos = contest.qsoList
+            print(qsos[qsos['REMARK'] != CONFIRMED].to_string())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
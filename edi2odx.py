@@ -8,20 +8,41 @@
 # 2022-12-09 de G1OGY: trap and translate CALL/P
 # 2022-12-11 de G1OGY: amend QSO time derivation within `pandas` to provide midnight-crossing capability
 # 2022-12-12 de G1OGY: amend provision for and advice to produce "Excel" DXlog output
-# 2022-12-12 de G1OGY: Tucnak users - see line no. 132 of this file
+# 2022-12-12 de G1OGY: Tucnak users - see line no. 132 of this file (obsolete: footer lines are now skipped by ediparser.py)
 
 
 import pandas as pd  # sudo apt-get install python3-pandas or `sudo pip install pandas` to reduce 500MB apt(8) download
+import argparse
+import concurrent.futures
+import contextlib
+import cProfile
+import csv
+import hashlib
+import io
+import json
 import logging
 import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+try:
+    import resource     # Unix only, for the peak memory (max RSS) of the process
+except ImportError:
+    resource = None
+
+import math
+import numpy as np
 
 import maiden       # in local folder
+import ediparser    # in local folder
+import contestlog   # in local folder
+import odxwriter    # in local folder
+import edisources   # in local folder
 
-# following imports are only needed for statistics and mapping
-import numpy as np
-import matplotlib.pyplot as plt
-import math
-import geotiler     # as `pip` package, usage: https://wrobell.dcmod.org/geotiler/usage.html
+# matplotlib and geotiler (via tilecache.py, in local folder) are only needed for statistics and mapping:
+# they are imported by the plotting functions and tile_cache() at first use, so that the text-only path starts fast
 
 #################################################################################################
 # This section contains settings as global variables that might be altered by the user if needed
@@ -30,9 +51,31 @@ SORTBYQRB = False               # If True: Sorts the ODX from longest QRB to sma
                                 # DUBUS recommendation: False
 EXCELOUTPUT = False             # In case excel DXlog is needed, edit False to True
                                 # REQUIRES, minimum, `pip install openpyxl` (290kB)
+OUTPUT_FORMATS = ['txt']        # Output files: 'txt' (DUBUS), 'xlsx', 'csv', 'json', 'adif' of the best DXs,
+                                # 'log_csv', 'log_json', 'log_adif' of the whole log (see odxwriter.py)
 STATSMAP = True                 # if True compute the azimuth/elevation stats and plot a map with all contacted stations
+EXTENDEDMODES = False           # If True: FM and MGM QSOs are marked 'f' and 'm' in the MOD column
+                                # DUBUS recommendation: False
+ARCHIVE_DB = None               # SQLite file of the cross-contest QSO archive (see odxarchive.py), None: no archive
+CROSSCHECK_WINDOW = 5           # Cross-check of the logs (--confirm): max. time difference in minutes between the
+                                # two log entries of a QSO (see crosscheck.py)
+CHECK_QSOS = False              # If True: checks the QSOs of each log (logged QRB, locators, dupes, see qsocheck.py)
+QRB_TOLERANCE_KM = 5            # Check: logged QRB accepted if it differs from the distance computed from the
+QRB_TOLERANCE_PERCENT = 2.0     # locators by up to QRB_TOLERANCE_KM, or QRB_TOLERANCE_PERCENT % if larger
+EXCLUDE_FLAGGED = False         # If True (and CHECK_QSOS): QSOs flagged by the check are left out of the ODX files
 
 MAP_BBOX = (-10.0, 40.0, 30.0, 58.0)  # Map limits; lower left, upper right, (long, lat) # central europe
+MAP_ZOOM = 5                    # Zoom level of the map tiles
+MAP_MODE = 'points'             # 'points': one dot per station, 'density': QSOs per locator square (large logs)
+MAP_DENSITY_WEIGHT = 'count'    # density map colored by the 'count' of QSOs or by the sum of their 'km'
+MAP_DENSITY_SQUARE = 4          # locator length of the density map squares: 2 (field), 4 (square), 6 (subsquare)
+PLOT_DPI = None                 # Resolution of the plots and map images (None: matplotlib default, 100 dpi)
+PREVIEW_DPI = 50                # Resolution of the quick preview images (--preview option)
+TILE_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'edi2odx', 'tiles')
+                                # Map tiles are downloaded once and kept in this folder (None: no cache)
+TILE_CACHE_SIZE_MB = 200        # Maximum size of the tiles cache, least recently used tiles are removed
+TILE_SOURCE = None              # None: missing tiles are downloaded from OpenStreetMap
+                                # or local folder with {zoom}/{x}/{y}.png tiles, or URL of a local tile server
 
 # ODX dictionary sets the distance limits in km to select the interesting QSO's (per band)
 # band identifier according to EDI format spec for PBand argument.
@@ -48,15 +91,8 @@ ODX = {'50 MHz': 1000,
        '10 GHz': 100,
        '24 GHz': 50}
 # WAVELENGTHS is used because the first line in the output txt file must contain the band not the QRG
-WAVELENGTHS = {'50 MHz': '6 m',
-               '144 MHz': '2 m',
-               '432 MHz': '70 cm',
-               '1,3 GHz': '23 cm',
-               '2,3 GHz': '13 cm',
-               '3,4 GHz': '9 cm',
-               '5,7 GHz': '6 cm',
-               '10 GHz': '3 cm',
-               '24 GHz': '12 mm'}
+# (band names of the PBand values, defined in contestlog.py as the cross-check and the archive also need them)
+WAVELENGTHS = contestlog.WAVELENGTHS
 #################################################################################################
 # Unfortunately 432 or 435 MHz exist both as band definition (Wintest versus N1MM!)
 # OK1KKW and DARC definition of PBand also differ...therefore the entries are copied in the dictionaries
@@ -64,94 +100,84 @@ WAVELENGTHS = {'50 MHz': '6 m',
 #
 # 2022-12-09 de G1OGY: IARU R1 designate band 2 Metres as 145 MHz and 70cm as 435 MHz (as above)
 ODX['145 MHz'] = ODX['144 MHz']
-WAVELENGTHS['145 MHz'] = WAVELENGTHS['144 MHz']
 ODX['435 MHz'] = ODX['432 MHz']
-WAVELENGTHS['435 MHz'] = WAVELENGTHS['432 MHz']
 
-#logging.basicConfig(level=logging.DEBUG)
-logging.basicConfig(level=logging.INFO)
+# MOD letter of the DUBUS report for the EDI mode codes (sent mode of the mixed-mode codes)
+# 1: SSB, 2: CW, 3: SSB/CW, 4: CW/SSB, 5: AM, 6: FM, 7: RTTY (MGM), other or empty: ''
+DUBUS_MODES = {1: 's', 2: 'c', 3: 's', 4: 'c'}
+# More comprehensive, but doesn't correspond exactly to DUBUS / DG7FL preferences:
+# "8" for FT-8, 65 for JT65A. Empty if not known. No mention of "f" or "m" in DUBUS
+EXTENDED_MODES = {6: 'f', 7: 'm'}
+
+# QSO columns needed to generate the ODX txt/xlsx files and the statistics
+ODX_COLUMNS = ['DATE', 'TIME', 'CALL', 'MODE', 'LOCATOR', 'QRB']
+
+# global settings which may be changed by command line options, passed to the worker processes,
+# or replaced for a single log by the settings of process_edi()
+SETTING_NAMES = ('SORTBYQRB', 'EXCELOUTPUT', 'OUTPUT_FORMATS', 'EXTENDEDMODES', 'STATSMAP',
+                 'MAP_BBOX', 'MAP_ZOOM', 'PLOT_DPI', 'MAP_MODE', 'MAP_DENSITY_WEIGHT', 'MAP_DENSITY_SQUARE',
+                 'TILE_CACHE_DIR', 'TILE_CACHE_SIZE_MB', 'TILE_SOURCE', 'ODX', 'WAVELENGTHS',
+                 'TRACE_MEMORY', 'PROFILE_DIR', 'ARCHIVE_DB', 'CHECK_QSOS', 'QRB_TOLERANCE_KM',
+                 'QRB_TOLERANCE_PERCENT', 'EXCLUDE_FLAGGED')
+
+
+# Contest logs (see contestlog.py), also available here for the programs importing edi2odx
+Contest = contestlog.Contest
+read_edi_file = contestlog.read_edi_file
+read_edi_lines = contestlog.read_edi_lines
+file_digest = contestlog.file_digest
 
 
-class Contest:
-    # Objects of this class contain all the information for a given contest log
+def global_settings():
+    # Current values of the global settings {name: value}
+    return {name: globals()[name] for name in SETTING_NAMES}
+
+
+def contest_settings(contest):
+    # Settings to be used for a contest log: its own settings if any (see process_edi), else the global ones
+    return contest.settings if contest.settings is not None else global_settings()
+
+
+class StageTimer:
+    # Records wall time, number of rows and peak memory of each processing stage of one contest log
+    # peak_mb: peak of the memory allocated during the stage (above the memory allocated at its start),
+    # measured only if tracemalloc is tracing (--report), max_rss_mb: peak resident memory of the process
     def __init__(self):
-        self.start = None               # contest start time
-        self.locator = None             # locator of the contest station
-        self.call = None                # callsign of the contest station
-        self.bandEDI = None             # contest operating band in EDI format
-        self.bandFileName = None        # operating band without underscores
-        self.outputFilePrefix = None    # common prefix of the output files
-        self.qsoList = None             # contains the whole contest log with all columns
-        self.qsoDx = None               # best DXs only, with limited columns for DUBUS report
-        self.minDistance = None         # minimum distance of interest for ODX
-
-
-def read_edi_file(filename, contest):
-    # Read one EDI file and fills all the attributes of the contest object
-
-    contest.start = 'YYYYMMDD'  # Just in case those arguments would be empty in the EDI file
-    contest.call = 'CALLSIGN'
-    contest.bandEDI = 'BAND'
-    contest.bandFileName = 'BAND'
-    contest.locator = 'LOCATOR'
-
-    with open(filename, 'r', encoding="utf-8", errors="ignore") as ediFile:
-        # start by parsing the header ([REG1TEST;1] section of the file to extract start date, call and band
-        # https://stackoverflow.com/questions/63596329/python-pandas-read-csv-with-commented-header-line
-        for line in ediFile:
-            if line.startswith('TDate='):
-                contest.start = line[6:14]
-                logging.info('contest start time found: %s', contest.start)
-
-            if line.startswith('PCall='):
-                logging.debug('call found')
-                logging.debug(line)
-                contest.call = line[6:-1]
-                portable = {47: 45}
-                contest.call = contest.call.translate(portable)
-                # Converts '/' into '-' to avoid messing-up the filename
-                logging.info('The station call sign is: %s', contest.call)
-
-            if line.startswith('PWWLo='):
-                logging.debug('locator found')
-                logging.debug(line)
-                contest.locator = line[6:-1]
-                logging.info('The station locator is: %s', contest.locator)
-
-            if line.startswith('PBand='):
-                logging.debug('Band found')
-                logging.debug(line)
-                traffic_band = line[6:-1]
-                contest.bandEDI = traffic_band  # To be used for selecting the ODX distance in dictionary
-                band_file_name = traffic_band.replace(' ', '')  # To be used in the filenames (no space, no comma)
-                band_file_name = band_file_name.replace(',', '_')
-                contest.bandFileName = band_file_name
-                logging.info('The operating band is: %s', contest.bandEDI)
-
-            if line.startswith('[QSORecords'):
-                logging.debug('QSO log starts here')
-                break
-        # real log of QSO's starts here. The rest of the file is processed as a dataframe using pandas
-        # OGY: Tucnak users should replace the following line with the commented \
-        #     line below it so to ignore the last line IDENT in a Tucnak EDI file \
-        #     (or manually delete the IDENT line before processing).
-        logging.debug(line)
-        qsos_list = pd.read_csv(ediFile, delimiter=";", header=None) #, skiprows=1)
-        #qsos_list = pd.read_csv(ediFile, delimiter=";", skiprows=1, skipfooter=1, engine='python')
-        qsos_list.columns = ['DATE', 'TIME', 'CALL', 'MODE', 'SENT_RST', 'SENT_NR',
-                             'RECEIVED_RST', 'RECEIVED_NUMBER',
-                             'EXCHANGE', 'LOCATOR', 'QRB',
-                             'N_EXCH', 'N_LOCATOR', 'N_DXCC', 'DUPE']
-        # Column names matching EDI file format specification
-
-    contest.qsoList = qsos_list
-    logging.debug('QSO List (full log):')
-    logging.debug(qsos_list)
-    contest.outputFilePrefix = current_contest.start + '_' + current_contest.call + '_'\
-        + current_contest.locator + '__' + current_contest.bandFileName
-    # contest start date, callsign and band are used to create "unique" filenames
-    ediFile.close()
-    return contest
+        self.stages = []
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=None):
+        # The stage may set record['rows'] when the number of processed rows is known
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            allocated = tracemalloc.get_traced_memory()[0]
+        record = {'stage': name, 'rows': rows}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 6)
+            record['peak_mb'] = round((tracemalloc.get_traced_memory()[1] - allocated) / 2 ** 20, 3) \
+                if tracing else None
+            record['max_rss_mb'] = max_rss_mb()
+            self.stages.append(record)
+            logging.debug('Stage %s', record)
+
+
+def timed_stage(contest, name, rows=None):
+    # Context manager recording a processing stage in contest.timer (if any)
+    if contest.timer is None:
+        return contextlib.nullcontext({})
+    return contest.timer.stage(name, rows)
+
+
+def max_rss_mb():
+    # Peak resident memory of the process in MB, None if not available (Windows)
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)   # bytes on macOS, else kB
 
 
 def select_odx_only(contest, distance_limit):
@@ -159,45 +185,40 @@ def select_odx_only(contest, distance_limit):
     # i.e. the ones with distance exceeding a value given as parameter
     # keeps only the columns of interest for the DUBUS report, removes the others
 
-    qsos_dx = contest.qsoList[contest.qsoList['QRB'] >= distance_limit].copy()
-    # .copy needed to avoid SettingWithCopyWarning
-    logging.debug(qsos_dx)
-
-    # removes unuseful columns, keeps DATE, TIME, CALL, MODE, LOCATOR and QRB only
-    qsos_dx.drop(columns=['SENT_NR', 'SENT_RST', 'RECEIVED_RST', 'RECEIVED_NUMBER',
-                          'EXCHANGE', 'N_EXCH', 'N_LOCATOR', 'N_DXCC', 'DUPE'], inplace=True)
-
-    qsos_dx['DATE'] = pd.to_datetime(qsos_dx['DATE'], format='%y%m%d')
-    qsos_dx['DATE'] = qsos_dx['DATE'].dt.strftime('%Y-%m-%d')
-    # DATE conversion to format expected by DUBUS
-    logging.debug("Time debug XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXxx")
-    logging.debug(qsos_dx['TIME'])
-    qsos_dx['TIME'] = pd.to_datetime(qsos_dx['TIME'], format='%H%M')   #Buggous with QSO right after midnight. Seems corrected with python 3.10...
-    #qsos_dx['TIME'] = pd.to_datetime(qsos_dx['TIME'], infer_datetime_format=True) # Workaround for Python 3.8
+    # keeps DATE, TIME, CALL, LOCATOR, QRB and MODE (translated into MOD) only, other columns are unuseful
+    # and the REMARK column if the log was cross-checked (see crosscheck.py)
+    # QSOs flagged by the check of the QSOs (see qsocheck.py) are left out if EXCLUDE_FLAGGED
+    settings = contest_settings(contest)
+    remark = ['REMARK'] if 'REMARK' in contest.qsoList else []
+    selected = contest.qsoList['QRB'] >= distance_limit
+    if settings['EXCLUDE_FLAGGED'] and 'CHECK' in contest.qsoList:
+        selected &= contest.qsoList['CHECK'] == ''
+    qsos = contest.qsoList.loc[selected, ODX_COLUMNS + remark]
+    logging.debug(qsos)
+    utc = contestlog.qso_timestamps(qsos)
 
-    logging.debug(qsos_dx['TIME'])
-    qsos_dx['TIME'] = qsos_dx['TIME'].dt.strftime('%H:%M')
-    logging.debug(qsos_dx['TIME'])
-    # TIME conversion to format expected by DUBUS
+    if settings['SORTBYQRB']:
+        # Optional sorting by descending QSO distances (numerical, before the km unit is added)
+        # Date and time sorting as 2nd priority, otherwise log order would be random for QSO with same QRB
+        order = np.lexsort((utc.to_numpy(), -qsos['QRB'].to_numpy(dtype=np.int64)))
+        qsos = qsos.iloc[order]
+        utc = utc.iloc[order]
 
-    qsos_dx['QRB'] = qsos_dx['QRB'].astype(str) + ' km'
+    dates, times = contestlog.format_timestamps(utc)
+    # DATE and TIME conversion to format expected by DUBUS
+    modes = {**DUBUS_MODES, **EXTENDED_MODES} if settings['EXTENDEDMODES'] else DUBUS_MODES
+    qsos_dx = pd.DataFrame({'DATE': dates,
+                            'TIME': times,
+                            'CALL': qsos['CALL'].to_numpy(),
+                            'LOCATOR': qsos['LOCATOR'].to_numpy(),
+                            'QRB': np.char.add(qsos['QRB'].to_numpy().astype(str), ' km'),
+                            'MOD': qsos['MODE'].map(modes).fillna('').to_numpy()},
+                           index=qsos.index)
+    if remark:
+        qsos_dx['REMARK'] = qsos['REMARK'].astype(object).fillna('').to_numpy()
     # add the km unit to match DUBUS publication
-
-    qsos_dx['MOD'] = ['c' if x == 2 else 'c' if x == 4 else 's' if x == 1 else 's' if x == 3
-                      else '' for x in qsos_dx['MODE']]
-    #qsos_dx['MOD'] = ['m' if x == 7 else 'f' if x == 6 else 'c' if x == 2 else 'c' if x == 4
-    #                  else 's' if x == 1 else 's' if x == 3 else '' for x in qsos_dx['MODE']]
-    # More comprehensive, but doesn't correspond exactly to BUBUS / DG7FL preferences:
-    # "8" for FT-8, 65 for JT65A. Empty if not known. No mention of "f" or "m" in DUBUS
-    logging.debug(qsos_dx['MOD'])
-    qsos_dx.drop(columns=['MODE'], inplace=True)
     # Replace the MODE column which contains integers by a new column MOD
-    # which contains a single letter indicating FM, MGM, CW or SSB (sent mode)
-
-    if SORTBYQRB:
-        qsos_dx.sort_values(by=['QRB', 'DATE', 'TIME'], ascending=[False, True, True], inplace=True)
-        # Optional sorting by descending QSO distances
-        # Date and time sorting as 2nd/3rd priority, otherwise log order would be random for QSO with same QRB
+    # which contains a single letter indicating CW or SSB (sent mode), see DUBUS_MODES
 
     nr_qso_dx = qsos_dx.shape[0]
     logging.info('%s QSOs with distance over %s km:', nr_qso_dx, distance_limit)
@@ -207,23 +228,41 @@ def select_odx_only(contest, distance_limit):
     return contest
 
 
-def generate_xlsx_csv_files(contest):
-    # generate output files in text files for the best DX QSO's of the contest provided as argument
-    csv_filename = contest.outputFilePrefix + '_DXs.txt'
-    outfile = open(csv_filename, 'w')
-    outfile.write(contest.call + ' (' + contest.locator + ') wkd ' + WAVELENGTHS[contest.bandEDI] + ' with QRB > '+ str(contest.minDistance) + ' km:\n')
-    outfile.write('DATE\tTIME\tCALL\tLOCATOR\tQRB/MOD\n')   # no time between QSB and MOD ==> manual header write
-    # outfile.write('DATE\t\tTIME\tCALL\tLOCATOR\tQRB\t\tMOD\n')   # align header with QSO list,
-    # but less optimal for DG7SFL for integration into DUBUS
-    outfile.close()
-    logging.debug(csv_filename)
-    contest.qsoDx.to_csv(csv_filename, index=False, header=False, sep='\t', mode='a')
+def output_formats(settings):
+    # Output file formats of the settings: OUTPUT_FORMATS, and xlsx if EXCELOUTPUT, in the order of odxwriter
+    formats = set(settings['OUTPUT_FORMATS']) | ({'xlsx'} if settings['EXCELOUTPUT'] else set())
+    unknown = formats - set(odxwriter.OUTPUT_FILES)
+    if unknown:
+        raise ValueError('unknown output format(s): %s' % ', '.join(sorted(unknown)))
+    return [output_format for output_format in odxwriter.OUTPUT_FILES if output_format in formats]
+
+
+def needs_all_columns(formats):
+    # True if the output formats include an export of the whole log (all the EDI columns)
+    return any(output_format in odxwriter.LOG_FORMATS for output_format in formats)
+
+
+def generate_xlsx_csv_files(contest, formats=None):
+    # generate output files (txt, xlsx, csv, json, adif, see odxwriter.py) for the best DX QSO's of the
+    # contest provided as argument, and of the whole log, in one pass over the QSOs
+    # formats: formats to generate (default: output_formats() of the settings)
+    settings = contest_settings(contest)
+    if formats is None:
+        formats = output_formats(settings)
+    odxwriter.write_outputs(contest, formats, settings['WAVELENGTHS'][contest.bandEDI])
+    logging.debug('%s: %s', contest.outputFilePrefix, formats)
+
 
-    if EXCELOUTPUT:
-        excel_file_name = contest.outputFilePrefix + '_DXs.xlsx'
-        logging.debug(excel_file_name)
-        contest.qsoDx.to_excel(excel_file_name, index=False)
-    return
+def odx_text(contest):
+    # content of the DUBUS txt file for the best DX QSO's of the contest, as a string
+    return odxwriter.write_to_memory(contest, ['txt'], contest_settings(contest)['WAVELENGTHS'][contest.bandEDI])['txt']
+
+
+def generate_excel_file(contest, output=None):
+    # generate the xlsx file for the best DX QSO's, REQUIRES openpyxl
+    # output: file name or binary file object (default: <prefix>_DXs.xlsx)
+    targets = {'xlsx': output} if output is not None else None
+    odxwriter.write_outputs(contest, ['xlsx'], contest_settings(contest)['WAVELENGTHS'][contest.bandEDI], targets)
 
 
 def compute_dist_az(contest):
@@ -231,22 +270,18 @@ def compute_dist_az(contest):
     # Creates additional columns in contest.qsoList dataframe
     mhl = maiden.Maiden()
     mylatlong = mhl.maiden2latlon(contest.locator)
-    distances = np.zeros(contest.qsoList.shape[0])
-    azimuths = np.zeros(contest.qsoList.shape[0])
-    latitudes = np.zeros(contest.qsoList.shape[0])
-    longitudes = np.zeros(contest.qsoList.shape[0])
-    for index, contents in contest.qsoList.iterrows():
-        # OGY: logging.debug(index, contents['LOCATOR'])      # This log directive causes '--- Logging error ---' print
-        stationlatlong = mhl.maiden2latlon(contents['LOCATOR'])
-        if stationlatlong[0] is not None:  # avoids error if locator is not valid
-            (distances[index], azimuths[index]) = mhl.dist_az(mylatlong, stationlatlong)
-            latitudes[index] = stationlatlong[0]
-            longitudes[index] = stationlatlong[1]
-        else:  # fake / fill-in data
-            logging.debug(type(stationlatlong[0]))
-            (distances[index], azimuths[index]) = (0, 0)
-            latitudes[index] = mylatlong[0]
-            longitudes[index] = mylatlong[1]
+    locators = pd.Categorical(contest.qsoList['LOCATOR'])  # computed once per distinct locator
+    results = mhl.dist_az_locators(mylatlong, locators.categories.to_numpy(dtype=object))
+    # float32 columns, NaN (appended last) where the locator is missing (code -1)
+    latitudes, longitudes, distances, azimuths = (np.append(result, np.nan).astype(np.float32)[locators.codes]
+                                                  for result in results)
+    invalid = np.isnan(latitudes)  # locator not valid
+    logging.debug('%s QSOs with invalid locator', np.count_nonzero(invalid))
+    # fake / fill-in data: zero distance and azimuth at the position of the contest station
+    distances[invalid] = 0
+    azimuths[invalid] = 0
+    latitudes[invalid] = mylatlong[0]
+    longitudes[invalid] = mylatlong[1]
     contest.qsoList['DISTANCE2'] = distances
     contest.qsoList['AZIMUTH'] = azimuths
     contest.qsoList['LATITUDE'] = latitudes
@@ -255,110 +290,1009 @@ def compute_dist_az(contest):
     return contest
 
 
-def plotstations(contest):
+_tile_caches = {}                       # TILE_CACHE_DIR -> tilecache.TileCache
+_tile_caches_lock = threading.Lock()
+_render_pool = None                     # threads rendering the plots, created at first use
+_render_pool_lock = threading.Lock()
+_templates = threading.local()          # figures reused by each rendering thread, see figure_template()
+
+
+def tile_cache(settings=None):
+    # Map tiles disk cache of the settings (default: global settings), opened at first use (None if disabled)
+    settings = settings or global_settings()
+    if not settings['TILE_CACHE_DIR']:
+        return None
+    with _tile_caches_lock:
+        if settings['TILE_CACHE_DIR'] not in _tile_caches:
+            import tilecache
+            _tile_caches[settings['TILE_CACHE_DIR']] = tilecache.TileCache(settings['TILE_CACHE_DIR'],
+                                                                          settings['TILE_CACHE_SIZE_MB'])
+        return _tile_caches[settings['TILE_CACHE_DIR']]
+
+
+# plot name: suffix of the image file
+PLOT_FILES = {'azimuth': '_Azimuth.png', 'points': '_Points.png', 'map': '_Map.png'}
+RENDER_THREADS = 3                      # number of plots rendered concurrently
+
+
+def render_pool():
+    # Thread pool rendering the plots, kept for the whole run so that the figure templates of its threads are reused
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = concurrent.futures.ThreadPoolExecutor(RENDER_THREADS, thread_name_prefix='render')
+        return _render_pool
+
+
+def _reset_render_pool():
+    # A forked process (worker of process_files) gets the pool but none of its threads: a new one is created
+    global _render_pool, _render_pool_lock
+    _render_pool = None
+    _render_pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_render_pool)
+
+
+def plotstations(contest, charts=True, stationmap=True, outputs=None):
     # Plot contest statistics:
-    # - histogram of azimuths
-    # - histogram of distances to other stations
-    # - map al all contest stations in log
+    # - histogram of azimuths                       (if charts)
+    # - histogram of distances to other stations    (if charts)
+    # - map al all contest stations in log          (if stationmap)
+    # outputs: {plot name: file name or binary file object}, default: image files, see PLOT_FILES
+    # The plots are rendered concurrently with the object oriented matplotlib API (Agg canvas, no pyplot)
+    import tilecache
+
+    outputs = outputs or {name: contest.outputFilePrefix + suffix for name, suffix in PLOT_FILES.items()}
+    plots = []
+    if charts:
+        plots.append(('plot_azimuth', plot_azimuth, (contest, outputs['azimuth'])))
+        plots.append(('plot_points', plot_points, (contest, outputs['points'])))
+    if stationmap:
+        settings = contest_settings(contest)
+        with timed_stage(contest, 'map_tiles'):     # rendered once per run
+            mm, img = tilecache.base_map(settings['MAP_BBOX'], settings['MAP_ZOOM'], tile_cache(settings),
+                                         settings['TILE_SOURCE'])
+        plot_map = plot_density_on_map if settings['MAP_MODE'] == 'density' else plot_stations_on_map
+        plots.append(('plot_map', plot_map, (contest, mm, img, outputs['map'])))
+    if tracemalloc.is_tracing():        # the traced peak is process-wide: one plot at a time to measure each one
+        for stage, function, args in plots:
+            _render_plot(contest, stage, function, args)
+        return
+    futures = [render_pool().submit(_render_plot, contest, stage, function, args) for stage, function, args in plots]
+    for future in futures:
+        future.result()                 # raises the exception of a failed plot
+
+
+def _render_plot(contest, stage, function, args):
+    with timed_stage(contest, stage, contest.qsoList.shape[0]):
+        function(*args)
+
+
+def figure_template(name, build):
+    # Figure of the current thread for a given plot, built by build() at first use and then reused:
+    # only the data and the texts are replaced for each log, the axes, labels and canvas are kept
+    templates = _templates.__dict__.setdefault('figures', {})
+    if name not in templates:
+        templates[name] = build()
+    return templates[name]
+
 
+def _histogram_template():
+    # Figure, axes and annotation text of the azimuth histograms
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    ax.set_xlabel('Azimuth')
+    ax.set_xlim([0, 360])
+    annotation = ax.text(0.5, 0.95, '', transform=ax.transAxes, ha='center', va='top',
+                         bbox=dict(boxstyle='square', facecolor='None'))
+    ax.text(0.05, 0.0, 'Plot: EDI2ODX by HB9DTX', transform=fig.transFigure, fontsize='xx-small', color='black',
+            ha='left', va='bottom')
+    return fig, ax, annotation
+
+
+def _clear_data(ax):
+    # Removes the data of the previous log (histogram bars, scatter points) from a template axes,
+    # and puts the axes back at their default position, as tight_layout starts from the current position
+    from matplotlib.figure import SubplotParams
+    for artist in ax.patches + ax.collections:
+        artist.remove()
+    ax.relim()
+    defaults = SubplotParams()
+    ax.figure.subplots_adjust(defaults.left, defaults.bottom, defaults.right, defaults.top)
+
+
+def save_figure(fig, output, contest, **kwargs):
+    # Writes the figure as PNG (file name or binary file object), at PLOT_DPI if set
+    dpi = contest_settings(contest)['PLOT_DPI']
+    fig.savefig(output, format='png', dpi=dpi if dpi else 'figure', **kwargs)
+
+
+def _azimuth_data(contest, km):
+    # Values, weights (None: one per QSO, or the km if km) and range (None: range of the values) of the azimuth
+    # histograms: the azimuths of the QSOs, or in live mode the bins accumulated by contest.live
+    if contest.live is not None:
+        return contest.live.azimuths, contest.live.azimuthKm if km else contest.live.azimuthCounts, (0, 360)
+    return contest.qsoList['AZIMUTH'], contest.qsoList['DISTANCE2'] if km else None, None
+
+
+def plot_azimuth(contest, output):
     # Azimuths probability density plot
-    fig1, ax1 = plt.subplots()
+    fig1, ax1, annotation = figure_template('azimuth', _histogram_template)
+    _clear_data(ax1)
     ax1.set_title('Azimuth density probability computed from ' + contest.locator +
                   '\nContest ' + contest.start + '; Call ' + contest.call + '; Band ' + contest.bandEDI)
-    ax1.hist(contest.qsoList['AZIMUTH'], bins=int(math.sqrt(contest.qsoList.shape[0])))
-    ax1.set_xlabel('Azimuth')
+    azimuths, weights, limits = _azimuth_data(contest, km=False)
+    ax1.hist(azimuths, bins=int(math.sqrt(contest.qsoList.shape[0])), weights=weights, range=limits, color='C0')
     ax1.set_ylabel('Number of QSO')
-    ax1.set_xlim([0, 360])
-    annotation = 'Total number of QSO in log: ' + str(contest.qsoList.shape[0])
-    ax1.text(0.5, 0.95, annotation, transform=ax1.transAxes, ha='center', va='top',
-             bbox=dict(boxstyle='square', facecolor='None'))
-    annotation = 'Plot: EDI2ODX by HB9DTX'
-    ax1.text(0.05, 0.0, annotation, transform=fig1.transFigure, fontsize='xx-small', color='black', ha='left',
-             va='bottom')  # transform=ax1.transAxes, =fig1.transFigure
-    plt.savefig(contest.outputFilePrefix + '_Azimuth' + '.png')
-    # plt.show()
-    plt.close()
+    annotation.set_text('Total number of QSO in log: ' + str(contest.qsoList.shape[0]))
+    save_figure(fig1, output, contest)
 
+
+def plot_points(contest, output):
     # Histogram of Points (Distances)
-    fig2, ax2 = plt.subplots()
+    fig2, ax2, annotation = figure_template('points', _histogram_template)
+    _clear_data(ax2)
     ax2.set_title('Distances density probability computed from ' + contest.locator +
                   '\nContest ' + contest.start + '; Call ' + contest.call + '; Band ' + contest.bandEDI)
-    ax2.hist(contest.qsoList['AZIMUTH'], bins=int(math.sqrt(contest.qsoList.shape[0])),
-             weights=contest.qsoList['DISTANCE2'])
-    ax2.set_xlabel('Azimuth')
+    azimuths, weights, limits = _azimuth_data(contest, km=True)
+    ax2.hist(azimuths, bins=int(math.sqrt(contest.qsoList.shape[0])), weights=weights, range=limits, color='C0')
     ax2.set_ylabel('Number of points (km)')
-    ax2.set_xlim([0, 360])
-    annotation = 'Total number of QSO in log: ' + str(contest.qsoList.shape[0]) + '\nTotal km: '\
-                 + str(round(contest.qsoList['QRB'].sum()))
-    ax2.text(0.5, 0.95, annotation, transform=ax2.transAxes, ha='center', va='top',
-             bbox=dict(boxstyle='square', facecolor='None'))
-    annotation = 'Plot: EDI2ODX by HB9DTX'
-    ax2.text(0.05, 0, annotation, fontsize='xx-small', color='black', transform=fig1.transFigure, ha='left',
-             va='bottom')
-    plt.savefig(contest.outputFilePrefix + '_Points' + '.png')
-    # plt.show()
-    plt.close()
-
-    # Geographical map of stations
-    mm = geotiler.Map(extent=MAP_BBOX, zoom=5)
-    img = geotiler.render_map(mm)
-
-    points = list(zip(contest.qsoList['LONGITUDE'], contest.qsoList['LATITUDE']))
-    x, y = zip(*(mm.rev_geocode(p) for p in points))
+    annotation.set_text('Total number of QSO in log: ' + str(contest.qsoList.shape[0]) + '\nTotal km: '
+                        + str(round(contest.qsoList['QRB'].sum())))
+    save_figure(fig2, output, contest)
+
+
+def map_template(contest, img, build):
+    # Figure template of a station map, one per base map (see tilecache.map_key): a base map rendered again
+    # with the same key (e.g. after missing tiles) replaces the image of the template
+    import tilecache
+    settings = contest_settings(contest)
+    template = figure_template((build.__name__, tilecache.map_key(settings['MAP_BBOX'], settings['MAP_ZOOM'])),
+                               lambda: build(img))
+    image = template[1].images[0]
+    if image.baseMap is not img:
+        image.set_data(img)
+        image.baseMap = img
+    return template
+
+
+def _map_template(img):
+    # Figure, axes and annotation text of the station maps over a base map image
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(tight_layout=True)
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    ax.imshow(img).baseMap = img       # base map image drawn, see map_template()
+    ax.axis('off')
+    annotation = ax.text(1, 0, '', transform=ax.transAxes, ha='right', va='bottom',
+                         bbox=dict(boxstyle='square', facecolor='white'))
+    ax.text(0, 0, 'Plot: EDI2ODX by HB9DTX\nMap data: OpenStreetMap.', fontsize='xx-small', color='blue',
+            transform=ax.transAxes, ha='left', va='bottom')
+    return fig, ax, annotation
+
+
+def plot_stations_on_map(contest, mm, img, output):
+    # Draws the stations over the base map image
+    import tilecache
+    if contest.live is not None:        # live mode: each locator once
+        x, y = tilecache.rev_geocode(mm, contest.live.longitudes, contest.live.latitudes)
+    else:
+        x, y = tilecache.rev_geocode(mm, contest.qsoList['LONGITUDE'], contest.qsoList['LATITUDE'])
 
     mhl = maiden.Maiden()
-    mylatlong = mhl.maiden2latlon(contest.locator)
+    mylatlong = mhl.maiden2latlon(contest.locator)    # cached by compute_dist_az
     mylatlong = (mylatlong[1], mylatlong[0])
     mx, my = mm.rev_geocode(mylatlong)
 
-    fig3, ax3 = plt.subplots(tight_layout=True)
-    ax3.imshow(img)
+    fig3, ax3, annotation = map_template(contest, img, _map_template)
+    _clear_data(ax3)
     ax3.scatter(x, y, c='purple', edgecolor='none', s=10, alpha=0.9, label='all stations')
     ax3.scatter(mx, my, c='red', edgecolor='none', s=50, alpha=0.9, label='My station')
     ax3.set_title('Stations positions for contest ' + contest.start +
                   '\nCall ' + contest.call + '; Band ' + contest.bandEDI)
-    plt.axis('off')
-    annotation = 'Total number of stations in log: ' + str(contest.qsoList.shape[0])
-    ax3.text(1, 0, annotation, transform=ax3.transAxes, ha='right', va='bottom',
-             bbox=dict(boxstyle='square', facecolor='white'))
-    annotation = 'Plot: EDI2ODX by HB9DTX\nMap data: OpenStreetMap.'
-    ax3.text(0, 0, annotation, fontsize='xx-small', color='blue', transform=ax3.transAxes, ha='left', va='bottom')
-    # bbox=dict(boxstyle='square', facecolor='white'))
-    plt.savefig(contest.outputFilePrefix + '_Map' + '.png', bbox_inches='tight')
-    # plt.show()
-    plt.close()
+    annotation.set_text('Total number of stations in log: ' + str(contest.qsoList.shape[0]))
+    save_figure(fig3, output, contest, bbox_inches='tight')
 
 
-##############################################################################################
-# Main program starts here
-##############################################################################################
-logging.info('Program START')
-logging.info('Distance limits to select the QSOs, per band: %s', ODX)
+# Size (degrees of longitude, latitude) of the locator squares of the density map, per locator length
+LOCATOR_SQUARES = {2: (20.0, 10.0), 4: (2.0, 1.0), 6: (5 / 60, 2.5 / 60)}
+
 
-file_list = []                                      # list all EDI files in the local folder
-for file in os.listdir():
-    if file.endswith(".edi") or file.endswith(".EDI"):  # list only EDI files
-        file_list.append(file)
-logging.info('EDI files to process: %s', file_list)
+def _density_template(img):
+    # Station map template with an inset color bar for the density map
+    fig, ax, annotation = _map_template(img)
+    return fig, ax, annotation, ax.inset_axes([0.03, 0.2, 0.025, 0.35])
 
-for file in file_list:
+
+def density_edges(settings):
+    # Longitudes and latitudes of the edges of the locator squares covering the map (MAP_BBOX),
+    # the locator grid starts at -180, -90
+    west, south, east, north = settings['MAP_BBOX']
+    width, height = LOCATOR_SQUARES[settings['MAP_DENSITY_SQUARE']]
+    lon_edges = np.arange(math.floor((west + 180) / width) * width - 180, east + width, width)
+    lat_edges = np.arange(math.floor((south + 90) / height) * height - 90, north + height, height)
+    return lon_edges, lat_edges
+
+
+def density_counts(qsos, settings):
+    # Number of QSOs (or km, MAP_DENSITY_WEIGHT) per locator square of the map, rows: latitudes
+    lon_edges, lat_edges = density_edges(settings)
+    km = settings['MAP_DENSITY_WEIGHT'] == 'km'
+    counts, _, _ = np.histogram2d(qsos['LATITUDE'], qsos['LONGITUDE'], bins=[lat_edges, lon_edges],
+                                  weights=qsos['DISTANCE2'] if km else None)
+    return counts
+
+
+def plot_density_on_map(contest, mm, img, output):
+    # Draws the number of QSOs (or the km, MAP_DENSITY_WEIGHT) per locator square over the base map image
+    # The QSOs are counted per square first and a fixed grid of squares is drawn:
+    # the rendering time doesn't depend on the number of QSOs (whole season, multi-op station...)
+    import tilecache
+    settings = contest_settings(contest)
+    lon_edges, lat_edges = density_edges(settings)
+    km = settings['MAP_DENSITY_WEIGHT'] == 'km'
+    if contest.live is not None:        # live mode: accumulated counts
+        counts = contest.live.density
+    else:
+        counts = density_counts(contest.qsoList, settings)
+    x, y = tilecache.rev_geocode(mm, *np.meshgrid(lon_edges, lat_edges))
+
+    mhl = maiden.Maiden()
+    mylatlong = mhl.maiden2latlon(contest.locator)    # cached by compute_dist_az
+    mx, my = mm.rev_geocode((mylatlong[1], mylatlong[0]))
+
+    fig3, ax3, annotation, colorbar_axes = map_template(contest, img, _density_template)
+    _clear_data(ax3)
+    mesh = ax3.pcolormesh(x, y, np.ma.masked_equal(counts, 0), cmap='plasma', alpha=0.7, shading='flat')
+    ax3.scatter(mx, my, c='red', edgecolor='none', s=50, alpha=0.9, label='My station')
+    ax3.set_title('QSO density for contest ' + contest.start +
+                  '\nCall ' + contest.call + '; Band ' + contest.bandEDI)
+    colorbar_axes.clear()
+    colorbar = fig3.colorbar(mesh, cax=colorbar_axes)
+    colorbar.ax.tick_params(labelsize='xx-small')
+    colorbar.ax.set_title('km' if km else 'QSOs', fontsize='xx-small')
+    annotation.set_text('Total number of stations in log: ' + str(contest.qsoList.shape[0]) +
+                        '\nper locator square (%s characters)' % settings['MAP_DENSITY_SQUARE'])
+    save_figure(fig3, output, contest, bbox_inches='tight')
+
+
+# Incremental re-runs: the manifest, stored next to the output files, records for each EDI file the hash of
+# its content and, per output stage, a fingerprint of the settings the outputs depend on.
+# A stage is re-generated only if the EDI file or its settings changed or if one of its output files is missing
+MANIFEST_FILE = '.edi2odx_manifest.json'
+MANIFEST_VERSION = 1                    # to be incremented when the content of the outputs changes
+STAGE_OUTPUTS = {output_format: [suffix] for output_format, suffix in odxwriter.OUTPUT_FILES.items()}
+STAGE_OUTPUTS.update({'plots': ['_Azimuth.png', '_Points.png'],
+                 'map': ['_Map.png'],
+                 'check': ['_check.csv'],
+                 'archive': []})
+
+
+def stage_fingerprints(band, remarks=None):
+    # Fingerprint of the settings affecting each output stage enabled by the current settings,
+    # for a log of a given band (changing the ODX limit of another band doesn't affect the log)
+    # remarks: REMARK of the QSOs of the log (cross-check), they are part of the fingerprint of the outputs
+    text = [MANIFEST_VERSION, ODX.get(band), WAVELENGTHS.get(band), SORTBYQRB, EXTENDEDMODES]
+    if remarks is not None:
+        text.append(hashlib.sha1('\n'.join(remarks).encode()).hexdigest())
+    check = [MANIFEST_VERSION, QRB_TOLERANCE_KM, QRB_TOLERANCE_PERCENT]
+    if CHECK_QSOS and EXCLUDE_FLAGGED:
+        text += ['exclude flagged'] + check[1:]
+    stages = {output_format: [MANIFEST_VERSION] if output_format in odxwriter.LOG_FORMATS else text
+              for output_format in output_formats(global_settings())}
+    if CHECK_QSOS:
+        stages['check'] = check
+    if ARCHIVE_DB:                      # a log already processed is archived in another database
+        stages['archive'] = [MANIFEST_VERSION, os.path.abspath(ARCHIVE_DB)]
+    if STATSMAP:
+        stages['plots'] = [MANIFEST_VERSION] + ([PLOT_DPI] if PLOT_DPI else [])
+        stages['map'] = [MANIFEST_VERSION, list(MAP_BBOX), MAP_ZOOM] + ([PLOT_DPI] if PLOT_DPI else []) \
+            + ([MAP_MODE, MAP_DENSITY_WEIGHT, MAP_DENSITY_SQUARE] if MAP_MODE != 'points' else [])
+    return {stage: hashlib.sha1(json.dumps(values).encode()).hexdigest() for stage, values in stages.items()}
+
+
+def stale_stages(entry, digest, remarks=None):
+    # Output stages to re-generate for an EDI file given its manifest entry of the previous run,
+    # None if all of them are to be generated (new or modified file)
+    if entry is None or entry.get('sha256') != digest:
+        return None
+    return {stage for stage, fingerprint in stage_fingerprints(entry['band'], remarks).items()
+            if entry['stages'].get(stage) != fingerprint
+            or not all(os.path.exists(entry['prefix'] + suffix) for suffix in STAGE_OUTPUTS[stage])}
+
+
+def load_manifest():
+    try:
+        with open(MANIFEST_FILE) as manifestFile:
+            manifest = json.load(manifestFile)
+    except (OSError, ValueError):
+        return {}
+    return manifest if manifest.get('version') == MANIFEST_VERSION else {}
+
+
+def save_manifest(manifest):
+    manifest['version'] = MANIFEST_VERSION
+    with open(MANIFEST_FILE + '.tmp', 'w') as manifestFile:
+        json.dump(manifest, manifestFile, indent=1, sort_keys=True)
+    os.replace(MANIFEST_FILE + '.tmp', MANIFEST_FILE)
+
+
+def process_file(filename, previous=None, force=False, remarks=None):
+    # Process one EDI file: ODX txt (and optional xlsx, csv, json, adif) files, statistics and map
+    # filename: path of the file, or edisources.EdiSource (member of an archive, stdin...)
+    # previous: manifest entry of the file from the previous run, force: re-generate all outputs
+    # remarks: REMARK of each QSO of the log (status of the cross-check of the logs, see crosscheck.py)
+    # Returns a dict summarizing the processing of the file, with the new manifest entry
     logging.info('-' * 80)
-    logging.info('Processing %s', file)
+    source = edisources.as_source(filename)
+    logging.info('Processing %s', source.name)
+    digest = file_digest(source)
+    stages = None if force else stale_stages(previous, digest, remarks)
+    if stages == set():
+        logging.info('Outputs %s* are up to date', previous['prefix'])
+        return {'file': source.name, 'status': 'ok', 'skipped': True, 'prefix': previous['prefix'],
+                'qsos': previous['qsos'], 'odx': previous['odx'], 'manifest': previous}
+
     current_contest = Contest()
-    read_edi_file(file, current_contest)                                # read one EDI file
+    current_contest.timer = StageTimer()
+    with timed_stage(current_contest, 'parse') as record:
+        all_columns = ARCHIVE_DB or needs_all_columns(output_formats(global_settings()))
+        columns = ODX_COLUMNS + (['DUPE'] if CHECK_QSOS else [])
+        read_edi_file(source, current_contest, None if all_columns else columns)   # read one EDI file
+        record['rows'] = current_contest.qsoList.shape[0]
+    if remarks is not None:
+        current_contest.qsoList['REMARK'] = pd.Categorical(remarks)
     logging.debug(current_contest)
     logging.debug(current_contest.start)
     logging.debug(current_contest.locator)
     logging.debug(current_contest.qsoList)
 
-    select_odx_only(current_contest, ODX[current_contest.bandEDI])      # select best DX's
+    fingerprints = stage_fingerprints(current_contest.bandEDI, remarks)
+    if stages is None:
+        stages = set(fingerprints)
+    else:
+        logging.info('Outputs to update: %s', sorted(stages))
+    check = None
+    if CHECK_QSOS:                                                      # flags wrong QRB, locators, dupes
+        import qsocheck     # in local folder
+        with timed_stage(current_contest, 'check', current_contest.qsoList.shape[0]):
+            check = qsocheck.check_contest(current_contest, current_contest.outputFilePrefix + '_check.csv'
+                                           if 'check' in stages else None, QRB_TOLERANCE_KM, QRB_TOLERANCE_PERCENT)
+
+    with timed_stage(current_contest, 'odx_selection', current_contest.qsoList.shape[0]):
+        select_odx_only(current_contest, ODX[current_contest.bandEDI])  # select best DX's
     logging.debug(current_contest.qsoDx)
 
-    generate_xlsx_csv_files(current_contest)                            # generate the txt (and optional xls)
+    with timed_stage(current_contest, 'outputs', current_contest.qsoDx.shape[0]):
+        generate_xlsx_csv_files(current_contest, [stage for stage in stages if stage in odxwriter.OUTPUT_FILES])
+
+    if 'plots' in stages or 'map' in stages:                            # generates contest statistics and map
+        with timed_stage(current_contest, 'dist_az', current_contest.qsoList.shape[0]):
+            compute_dist_az(current_contest)
+        plotstations(current_contest, 'plots' in stages, 'map' in stages)   # one stage per plot
+
+    if 'archive' in stages:                                             # appends the log to the QSO archive
+        with timed_stage(current_contest, 'archive', current_contest.qsoList.shape[0]):
+            archive_contest(current_contest, source.name, digest)
+
+    entry = {'sha256': digest, 'band': current_contest.bandEDI, 'prefix': current_contest.outputFilePrefix,
+             'qsos': current_contest.qsoList.shape[0], 'odx': current_contest.qsoDx.shape[0],
+             'stages': dict(previous['stages']) if previous and previous.get('sha256') == digest else {}}
+    entry['stages'].update({stage: fingerprints[stage] for stage in stages})
+    result = {'file': source.name, 'status': 'ok', 'prefix': current_contest.outputFilePrefix,
+              'qsos': entry['qsos'], 'odx': entry['odx'], 'manifest': entry, 'stages': current_contest.timer.stages}
+    if check is not None:
+        result['check'] = check
+    return result
+
+
+def archive_contest(contest, filename, digest):
+    # Appends the log to the cross-contest QSO archive ARCHIVE_DB (see odxarchive.py)
+    import odxarchive
+    connection = odxarchive.connect(ARCHIVE_DB)
+    try:
+        odxarchive.ingest_contest(connection, contest, filename, digest)
+    finally:
+        connection.close()
+
+
+def write_archived_odx_files(connection, min_qrb=None, output=None, **criteria):
+    # Regenerates the DUBUS _DXs.txt text of all the archived contests (see odxarchive.py) matching the criteria
+    # of odxarchive.query, with the ODX distance limit of each band unless min_qrb is given
+    # output: folder in which the output files (_DXs.txt and the other OUTPUT_FORMATS) are written, default: the
+    # _DXs.txt text is printed, so that a query never overwrites the files written from the log itself
+    import odxarchive
+    qsos = odxarchive.query(connection, min_qrb=min_qrb, **criteria)
+    if output is not None:
+        os.makedirs(output, exist_ok=True)
+    for contest in odxarchive.archived_contests(connection, qsos):
+        select_odx_only(contest, min_qrb if min_qrb is not None else ODX[contest.bandEDI])
+        if output is None:
+            print(odx_text(contest))
+            continue
+        contest.outputFilePrefix = os.path.join(output, contest.outputFilePrefix)
+        generate_xlsx_csv_files(contest)
+        logging.info('%s_DXs.txt written', contest.outputFilePrefix)
+
+
+def process_edi(source, settings=None, images=None):
+    # Library API: converts one EDI log in memory, without writing any file nor changing any global state,
+    # so that it can be called from a long-running program (e.g. web service), concurrently from threads
+    # source: path of the EDI file, content of the file (bytes or str), file object or edisources.EdiSource
+    # settings: {name: value} replacing some of the global settings for this log only (see SETTING_NAMES)
+    # images: render the statistics and map (default: STATSMAP setting), REQUIRES matplotlib and geotiler
+    # Returns a dict: 'contest' (Contest object, .qsoList / .qsoDx DataFrames), 'text' (content of the DUBUS
+    # txt file), 'xlsx' (bytes of the xlsx file if EXCELOUTPUT), 'outputs' {format: content} of all the
+    # output formats (OUTPUT_FORMATS, see odxwriter.py), 'stats' and 'images' {plot name: PNG bytes}
+    # stats['check']: report of the check of the QSOs if CHECK_QSOS (see qsocheck.py)
+    unknown = set(settings or ()) - set(SETTING_NAMES)
+    if unknown:
+        raise ValueError('unknown setting(s): %s' % ', '.join(sorted(unknown)))
+    contest = Contest()
+    contest.settings = dict(global_settings(), **(settings or {}))
+    contest.timer = StageTimer()
+    if isinstance(source, bytes):
+        source = io.StringIO(source.decode('utf-8', errors='ignore'))
+    elif isinstance(source, str) and '\n' in source:
+        source = io.StringIO(source)
+    formats = output_formats(contest.settings)
+    columns = None if needs_all_columns(formats) else ODX_COLUMNS + (['DUPE'] if contest.settings['CHECK_QSOS'] else [])
+    with timed_stage(contest, 'parse') as record:
+        if isinstance(source, (str, os.PathLike, edisources.EdiSource)):
+            read_edi_file(source, contest, columns)
+        else:
+            read_edi_lines(source, contest, columns)
+        record['rows'] = contest.qsoList.shape[0]
+    check = None
+    if contest.settings['CHECK_QSOS']:
+        import qsocheck
+        with timed_stage(contest, 'check', contest.qsoList.shape[0]):
+            check = qsocheck.check_contest(contest, None, contest.settings['QRB_TOLERANCE_KM'],
+                                           contest.settings['QRB_TOLERANCE_PERCENT'])
+
+    limits = contest.settings['ODX']
+    if contest.bandEDI not in limits:
+        raise ValueError('no ODX distance limit for band %s' % contest.bandEDI)
+    with timed_stage(contest, 'odx_selection', contest.qsoList.shape[0]):
+        select_odx_only(contest, limits[contest.bandEDI])
+    with timed_stage(contest, 'outputs', contest.qsoDx.shape[0]):
+        outputs = odxwriter.write_to_memory(contest, set(formats) | {'txt'},     # text: always
+                                            contest.settings['WAVELENGTHS'][contest.bandEDI])
+    result = {'contest': contest, 'text': outputs['txt'], 'xlsx': outputs.get('xlsx'), 'images': {},
+              'outputs': {output_format: outputs[output_format] for output_format in formats}}
+
+    if contest.settings['STATSMAP'] if images is None else images:
+        with timed_stage(contest, 'dist_az', contest.qsoList.shape[0]):
+            compute_dist_az(contest)
+        outputs = {name: io.BytesIO() for name in PLOT_FILES}
+        plotstations(contest, outputs=outputs)
+        result['images'] = {name: output.getvalue() for name, output in outputs.items()}
+
+    qsos = contest.qsoList
+    result['stats'] = {'qsos': qsos.shape[0], 'odx': contest.qsoDx.shape[0], 'odx_limit': contest.minDistance,
+                       'rejected_lines': len(contest.rejectedLines), 'total_km': int(qsos['QRB'].sum()),
+                       'best_dx': None, 'check': check, 'stages': contest.timer.stages}
+    if qsos.shape[0]:
+        best = qsos.loc[qsos['QRB'].idxmax()]
+        result['stats']['best_dx'] = {'call': best['CALL'], 'locator': best['LOCATOR'], 'qrb': int(best['QRB'])}
+    return result
+
+
+class _LogCollector(logging.Handler):
+    # Keeps the log records of one file processed in a worker process, to be replayed by the main process
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.format(record)             # fills record.exc_text from record.exc_info
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None          # traceback objects can't be sent back to the main process
+        self.records.append(record)
+
+
+_log_collector = None                   # set in the worker processes only
+
+TRACE_MEMORY = False                    # measure the peak memory of each stage with tracemalloc (slower)
+PROFILE_DIR = None                      # folder of the cProfile statistics, one .prof file per EDI file
+
+
+def _init_worker(level, settings):
+    # Initializer of the worker processes: same settings as the main process,
+    # log records are collected instead of being printed
+    global _log_collector
+    globals().update(settings)
+    _log_collector = _LogCollector()
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(_log_collector)
+    root_logger.setLevel(level)
+
+
+def _process_file_isolated(filename, previous=None, force=False, remarks=None):
+    # Runs process_file, a failure is logged and returned as result instead of aborting the run
+    start = time.perf_counter()
+    name = edisources.as_source(filename).name
+    if _log_collector is not None:
+        _log_collector.records = []
+    if TRACE_MEMORY and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    try:
+        if PROFILE_DIR:
+            profiler = cProfile.Profile()
+            result = profiler.runcall(process_file, filename, previous, force, remarks)
+            profile_file = os.path.join(PROFILE_DIR, os.path.basename(name) + '.prof')
+            profiler.dump_stats(profile_file)
+            logging.info('Profile statistics written to %s', profile_file)
+        else:
+            result = process_file(filename, previous, force, remarks)
+    except Exception as error:
+        logging.exception('Processing of %s failed', name)
+        result = {'file': name, 'status': 'failed', 'error': repr(error)}
+    result['seconds'] = time.perf_counter() - start
+    result['pid'] = os.getpid()
+    result['cache'] = maiden.cache_info()
+    if _log_collector is not None:
+        result['log'] = _log_collector.records
+    return result
+
 
-    if STATSMAP:                                                        # generates contest statistics and map
-        compute_dist_az(current_contest)
-        plotstations(current_contest)
-    del current_contest                 # deletes current_contest object after processing
+def _unique_sources(sources):
+    # First source of each log content and {name of a duplicate source: name of its first source}:
+    # the same log given twice (e.g. in a folder and in an archive) would write the same output files
+    unique = []
+    duplicates = {}
+    names = {}                          # sha256: name of the first source
+    for source in sources:
+        if source.name in names.values() or source.name in duplicates:
+            continue                    # same file given twice, one result
+        try:
+            digest = file_digest(source)
+        except OSError:                 # reported by process_file
+            unique.append(source)
+            continue
+        if digest in names:
+            duplicates[source.name] = names[digest]
+        else:
+            names[digest] = source.name
+            unique.append(source)
+    return unique, duplicates
 
-logging.info('Program END')
+
+def process_files(file_list, workers=1, manifest=None, force=False, remarks=None):
+    # Processes all the files (paths or edisources.EdiSource), in parallel over a pool of worker processes
+    # if workers > 1
+    # manifest: {filename: entry} of the previous run, up to date outputs are not re-generated unless force
+    # remarks: {filename: REMARK of each QSO} (cross-check of the logs)
+    # The log of each file is output in one block when the file is finished
+    # A file with the same content as a previous one of the list is not processed again
+    # Returns the list of the per-file results in the order of file_list (one per file given several times)
+    manifest = manifest or {}
+    remarks = remarks or {}
+    names = list(dict.fromkeys(edisources.as_source(filename).name for filename in file_list))
+    sources, duplicates = _unique_sources(edisources.as_source(filename) for filename in file_list)
+    results = {}
+    if workers <= 1 or len(sources) <= 1:
+        for source in sources:
+            results[source.name] = _process_file_isolated(source, manifest.get(source.name), force,
+                                                          remarks.get(source.name))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                    initargs=(logging.getLogger().level, global_settings())) as pool:
+            futures = {pool.submit(_process_file_isolated, source, manifest.get(source.name), force,
+                                   remarks.get(source.name)): source.name for source in sources}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as error:  # worker process died
+                    result = {'file': futures[future], 'status': 'failed', 'error': repr(error)}
+                    logging.error('Processing of %s failed: %s', futures[future], result['error'])
+                for record in result.pop('log', []):
+                    logging.getLogger(record.name).handle(record)
+                results[futures[future]] = result
+    for name, first in duplicates.items():
+        logging.warning('%s is the same log as %s, not processed again', name, first)
+        results[name] = dict({key: value for key, value in results[first].items() if key not in ('stages', 'log')},
+                             file=name, skipped=True, duplicate=first, seconds=0.0)
+    return [results[name] for name in names]
+
+
+def log_summary(results, seconds):
+    # Aggregate summary of a batch run
+    failed = [result for result in results if result['status'] != 'ok']
+    duplicates = sum(1 for result in results if 'duplicate' in result)
+    logging.info('=' * 80)
+    logging.info('%s EDI file(s) processed in %.1f s: %s ok (%s already up to date%s), %s failed',
+                 len(results), seconds, len(results) - len(failed),
+                 sum(1 for result in results if result.get('skipped')) - duplicates,
+                 ', %s duplicate(s)' % duplicates if duplicates else '', len(failed))
+    results = [result for result in results if 'duplicate' not in result]     # counted once
+    logging.info('%s QSOs in total, %s ODX QSOs',
+                 sum(result.get('qsos', 0) for result in results),
+                 sum(result.get('odx', 0) for result in results))
+    checked = [result for result in results if 'check' in result]
+    if checked:
+        logging.info('Check of the QSOs: %s QSOs flagged in %s file(s), home locator invalid or suspect in %s',
+                     sum(result['check']['flagged'] for result in checked),
+                     sum(1 for result in checked if result['check']['flagged']),
+                     sum(1 for result in checked if result['check']['home']))
+    for result in failed:
+        logging.info('FAILED %s: %s', result['file'], result.get('error'))
+    cache = {}                          # caches are per process, counters are cumulative
+    for result in results:
+        if 'cache' in result:
+            cache[result['pid']] = result['cache']
+    for name in ('locator', 'dist_az'):
+        logging.info('%s cache: %s hits, %s misses', name,
+                     sum(info[name]['hits'] for info in cache.values()),
+                     sum(info[name]['misses'] for info in cache.values()))
+    totals = {}                         # total time per processing stage
+    for result in results:
+        for record in result.get('stages', []):
+            totals[record['stage']] = totals.get(record['stage'], 0) + record['seconds']
+    if totals:
+        logging.info('Time per stage: %s', ', '.join('%s %.2f s' % item for item in totals.items()))
+
+
+REPORT_FIELDS = ['file', 'status', 'stage', 'rows', 'seconds', 'peak_mb', 'max_rss_mb']
+
+
+def write_report(results, seconds, filename):
+    # Run report: JSON (run, per file and per stage details) or CSV (one line per file and stage)
+    # depending on the extension of filename
+    if filename.lower().endswith('.csv'):
+        with open(filename, 'w', newline='') as reportFile:
+            writer = csv.DictWriter(reportFile, REPORT_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            for result in results:
+                writer.writerow({'file': result['file'], 'status': result['status'], 'stage': 'total',
+                                 'rows': result.get('qsos'), 'seconds': round(result['seconds'], 6)})
+                for record in result.get('stages', []):
+                    writer.writerow(dict(record, file=result['file'], status=result['status']))
+    else:
+        report = {'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'seconds': round(seconds, 6),
+                  'settings': global_settings(),
+                  'files': [{key: value for key, value in result.items() if key not in ('manifest', 'log')}
+                            for result in results]}
+        with open(filename, 'w') as reportFile:
+            json.dump(report, reportFile, indent=1, default=str)
+    logging.info('Run report written to %s', filename)
+
+
+WATCH_SETTLE = 2.0                      # seconds without change before a file dropped in the watched folder is processed
+WATCH_POLL = 1.0                        # scan interval of the watched folder if inotify is not available
+
+
+def warm_up():
+    # Loads what the first log would otherwise wait for: plotting modules, map tiles and rendered base map
+    if not STATSMAP:
+        return
+    try:
+        import tilecache
+        from matplotlib.backends import backend_agg     # noqa: F401
+        tilecache.base_map(MAP_BBOX, MAP_ZOOM, tile_cache(), TILE_SOURCE)
+    except Exception as error:                          # e.g. no network: retried with the first log
+        logging.warning('Base map not loaded in advance: %r', error)
+
+
+def watch_folder(folder, force=False, stop=None):
+    # Daemon mode: processes the EDI files of folder as soon as they arrive or are modified, until interrupted
+    # (Ctrl-C, or stop: threading.Event). Everything stays loaded between files (modules, locator caches,
+    # base map), the outputs and the manifest are written in the current folder as for a normal run
+    import watchfolder     # in local folder
+    warm_up()
+    watcher = watchfolder.FolderWatcher(folder, settle=WATCH_SETTLE, poll_interval=WATCH_POLL)
+    manifest = load_manifest()
+    try:
+        while stop is None or not stop.is_set():
+            file_list = watcher.wait(timeout=None if stop is None else 1.0)
+            if not file_list:
+                continue
+            start = time.perf_counter()
+            results = process_files(file_list, 1, manifest.get('files'), force)
+            manifest.setdefault('files', {}).update({result['file']: result['manifest']
+                                                     for result in results if 'manifest' in result})
+            save_manifest(manifest)
+            log_summary(results, time.perf_counter() - start)
+            logging.info('Waiting for EDI files in %s', folder)
+    except KeyboardInterrupt:
+        logging.info('Watch of %s stopped', folder)
+    finally:
+        watcher.close()
+
+
+FOLLOW_INTERVAL = 10.0                  # live mode (--follow): seconds between two updates of the outputs
+AZIMUTH_STEP = 0.5                      # live mode: width in degrees of the bins accumulating the azimuths
+
+
+def _concat_qsos(tables):
+    # Concatenation of QSO tables in the compact schema: the categoricals are merged into one categorical
+    # (pd.concat would turn categoricals with different categories into object columns)
+    columns = {}
+    for name in tables[0]:
+        if isinstance(tables[0][name].dtype, pd.CategoricalDtype):
+            columns[name] = pd.api.types.union_categoricals([table[name] for table in tables])
+        else:
+            columns[name] = pd.concat([table[name] for table in tables], ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+class LiveLog:
+    # Live mode (--follow): a log still being written, processed as it grows. Only the QSOs appended since the
+    # previous update are parsed, located and selected; the ODX list and the data of the plots are accumulated,
+    # so that an update costs in proportion to the new QSOs (plus the writing of the outputs).
+    # The azimuth histograms are accumulated in bins of AZIMUTH_STEP degrees (drawn over 0-360 degrees),
+    # the map shows each locator once (points mode) or the accumulated QSOs per locator square (density mode)
+    def __init__(self):
+        self.contest = None             # Contest of the log, its .live is this object
+        self.parts = []                 # (qsoList, qsoDx) of the QSOs not yet added to the contest
+        self.qsos = 0                   # number of QSOs read
+        self.azimuths = np.arange(AZIMUTH_STEP / 2, 360, AZIMUTH_STEP)     # centers of the azimuth bins
+        self.azimuthCounts = None       # number of QSOs per azimuth bin
+        self.azimuthKm = None           # km per azimuth bin
+        self.locators = set()           # locators on the map
+        self.longitudes = None          # position of each locator on the map
+        self.latitudes = None
+        self.density = None             # QSOs (or km) per locator square of the map, see density_counts
+
+    def start(self, lines, name):
+        # Reads the whole log (first update, or log rewritten), returns the number of QSOs
+        contest = Contest()
+        read_edi_lines(lines, contest, None if needs_all_columns(output_formats(global_settings())) else ODX_COLUMNS,
+                       name)
+        contest.live = self
+        self.contest = contest
+        self.parts = []
+        self.qsos = contest.qsoList.shape[0]
+        self.azimuthCounts = np.zeros(len(self.azimuths))
+        self.azimuthKm = np.zeros(len(self.azimuths))
+        self.locators = set()
+        self.longitudes = np.empty(0, np.float32)
+        self.latitudes = np.empty(0, np.float32)
+        if STATSMAP:
+            self.density = np.zeros([len(edges) - 1 for edges in reversed(density_edges(global_settings()))])
+            compute_dist_az(contest)
+            self._accumulate(contest.qsoList)
+        select_odx_only(contest, ODX[contest.bandEDI])
+        return self.qsos
+
+    def append(self, lines, line_number):
+        # Reads QSO lines appended to the log (line_number: number of lines of the log before them),
+        # returns the number of new QSOs
+        reader = ediparser.EdiReader(lines)
+        reader.lineNumber = line_number     # header already read
+        columns = list(self.contest.qsoList.columns.intersection(ediparser.QSO_COLUMNS))
+        qsos = contestlog.qso_table(reader.read_chunks(columns, contestlog.PARSE_CHUNK))
+        for line_number, line in reader.rejected:
+            logging.info('skipped line %s: %s', line_number, line)
+        if qsos.shape[0] == 0:
+            return 0
+        qsos.index = pd.RangeIndex(self.qsos, self.qsos + qsos.shape[0])
+        part = Contest()
+        part.locator = self.contest.locator
+        part.qsoList = qsos
+        if STATSMAP:
+            compute_dist_az(part)
+            self._accumulate(qsos)
+        select_odx_only(part, self.contest.minDistance)
+        self.parts.append((part.qsoList, part.qsoDx))
+        self.qsos += qsos.shape[0]
+        return qsos.shape[0]
+
+    def _accumulate(self, qsos):
+        # Adds QSOs (with the columns of compute_dist_az) to the data of the plots
+        bins = np.minimum((qsos['AZIMUTH'].to_numpy() / AZIMUTH_STEP).astype(np.int64), len(self.azimuths) - 1)
+        self.azimuthCounts += np.bincount(bins, minlength=len(self.azimuths))
+        self.azimuthKm += np.bincount(bins, weights=qsos['DISTANCE2'].to_numpy(), minlength=len(self.azimuths))
+        first = qsos.drop_duplicates('LOCATOR')
+        new = np.array([locator not in self.locators for locator in first['LOCATOR']], dtype=bool)
+        self.locators.update(first.loc[new, 'LOCATOR'])
+        self.longitudes = np.append(self.longitudes, first.loc[new, 'LONGITUDE'].to_numpy())
+        self.latitudes = np.append(self.latitudes, first.loc[new, 'LATITUDE'].to_numpy())
+        self.density += density_counts(qsos, global_settings())
+
+    def update(self):
+        # Adds the new QSOs to the tables of the contest, returns the contest
+        contest = self.contest
+        if self.parts:
+            contest.qsoList = _concat_qsos([contest.qsoList] + [qsos for qsos, _ in self.parts])
+            contest.qsoDx = pd.concat([contest.qsoDx] + [qsos_dx for _, qsos_dx in self.parts])
+            if SORTBYQRB:               # the new ODX QSOs are sorted with the previous ones
+                order = np.lexsort(((contest.qsoDx['DATE'] + contest.qsoDx['TIME']).to_numpy(),
+                                    -contest.qsoList.loc[contest.qsoDx.index, 'QRB'].to_numpy(dtype=np.int64)))
+                contest.qsoDx = contest.qsoDx.iloc[order]
+            self.parts = []
+        return contest
+
+    def write_outputs(self):
+        # Writes the output files, plots and map of the QSOs read so far
+        contest = self.update()
+        generate_xlsx_csv_files(contest)
+        if STATSMAP and contest.qsoList.shape[0]:
+            plotstations(contest)
+
+
+def follow_file(filename, interval=None, stop=None):
+    # Live mode: follows an EDI file while the logging program writes it, and updates its outputs every
+    # `interval` seconds (default: FOLLOW_INTERVAL) with the QSOs appended in the meantime, until interrupted
+    # (Ctrl-C, or stop: threading.Event). The outputs are written in the current folder as for a normal run
+    import livelog      # in local folder
+    interval = FOLLOW_INTERVAL if interval is None else interval
+    warm_up()
+    follower = livelog.LogFollower(filename)
+    live = LiveLog()
+    logging.info('Following %s, outputs updated every %s s', filename, interval)
+    try:
+        while stop is None or not stop.is_set():
+            update = follower.poll()
+            if update is not None:
+                start = time.perf_counter()
+                try:
+                    if update.reset:
+                        logging.info('Reading %s', filename)
+                        new = live.start(update.lines, filename)
+                    else:
+                        new = live.append(update.lines, update.lineNumber)
+                    if new or update.reset:
+                        live.write_outputs()
+                        logging.info('%s new QSOs, %s QSOs, %s ODX QSOs, outputs %s* updated in %.2f s', new,
+                                     live.qsos, live.contest.qsoDx.shape[0], live.contest.outputFilePrefix,
+                                     time.perf_counter() - start)
+                except Exception:
+                    logging.exception('Update of %s failed', filename)
+                    follower.restart()  # read again from the start at the next update
+            if stop is None:
+                time.sleep(interval)
+            else:
+                stop.wait(interval)
+    except KeyboardInterrupt:
+        logging.info('Follow of %s stopped', filename)
+
+
+def main():
+    global STATSMAP, TILE_SOURCE, TRACE_MEMORY, PROFILE_DIR, ARCHIVE_DB, PLOT_DPI, WATCH_SETTLE
+    global MAP_MODE, MAP_DENSITY_WEIGHT, OUTPUT_FORMATS, CROSSCHECK_WINDOW, CHECK_QSOS, EXCLUDE_FLAGGED
+    #logging.basicConfig(level=logging.DEBUG)
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Extraction of Best DX out of EDI files')
+    parser.add_argument('files', nargs='*',
+                        help='EDI files, folders, zip or tar archives of EDI files, glob patterns (e.g. '
+                             '"logs/**/*.edi") or - for a log read from stdin (default: EDI files of the current folder)')
+    parser.add_argument('-r', '--recursive', action='store_true',
+                        help='also process the EDI files of the subfolders of the given folders')
+    parser.add_argument('--include', action='append', metavar='PATTERN',
+                        help='names of the EDI files to take in folders and archives (default: *.edi, case '
+                             'insensitive), may be repeated')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of files processed in parallel, 0 = number of CPUs (default: 1)')
+    parser.add_argument('-t', '--text-only', action='store_true',
+                        help='only generate the output files (txt, xlsx...), no statistics and map (fast startup)')
+    parser.add_argument('--density', choices=['count', 'km'],
+                        help='map of the number of QSOs (count) or of the km per locator square instead of '
+                             'one dot per station, for logs with many QSOs')
+    parser.add_argument('--preview', action='store_true',
+                        help='render the plots and map at PREVIEW_DPI (%s dpi) for a quick look' % PREVIEW_DPI)
+    parser.add_argument('--formats', type=lambda value: [item.strip() for item in value.split(',') if item.strip()],
+                        help='comma separated output formats (default: %s): txt, xlsx, csv, json, adif of the best '
+                             'DXs, log_csv, log_json, log_adif of the whole log' % ','.join(OUTPUT_FORMATS))
+    parser.add_argument('--confirm', nargs='?', type=int, const=CROSSCHECK_WINDOW, metavar='MINUTES',
+                        help='cross-check the QSOs of the processed logs with each other (time difference up to '
+                             'MINUTES, default %s) and write the status in the REMARK column of the ODX files'
+                             % CROSSCHECK_WINDOW)
+    parser.add_argument('--check', action='store_true',
+                        help='check the QSOs: logged QRB against the locators, invalid locators, dupes '
+                             '(flagged QSOs written to a _check.csv file per log)')
+    parser.add_argument('--exclude-flagged', action='store_true',
+                        help='check the QSOs and leave the flagged QSOs out of the ODX files')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='re-generate all outputs, even those which are up to date')
+    parser.add_argument('--watch', metavar='FOLDER',
+                        help='daemon mode: process the EDI files of FOLDER as they arrive, until interrupted')
+    parser.add_argument('--follow', metavar='FILE',
+                        help='live mode: follow FILE while the logging program writes it and update its outputs '
+                             'with the new QSOs, until interrupted')
+    parser.add_argument('--interval', type=float, default=FOLLOW_INTERVAL,
+                        help='with --follow, seconds between two updates of the outputs (default: %s)'
+                             % FOLLOW_INTERVAL)
+    parser.add_argument('--settle', type=float, default=WATCH_SETTLE,
+                        help='with --watch, seconds without change before a new file is processed '
+                             '(default: %s)' % WATCH_SETTLE)
+    parser.add_argument('--archive', metavar='DATABASE', default=ARCHIVE_DB,
+                        help='append the processed logs to this QSO archive (see odxarchive.py)')
+    parser.add_argument('--report', metavar='FILE',
+                        help='write a run report with time, rows and peak memory of each processing stage '
+                             'of each file (JSON, or CSV if FILE ends with .csv)')
+    parser.add_argument('--profile', metavar='FOLDER',
+                        help='profile the processing of each file with cProfile, statistics written to FOLDER')
+    parser.add_argument('--tile-source', default=TILE_SOURCE,
+                        help='local folder with {zoom}/{x}/{y}.png map tiles or URL of a local tile server, '
+                             'used instead of OpenStreetMap for the tiles missing in the cache')
+    parser.add_argument('--prefill-tiles', nargs='*', type=int, metavar='ZOOM',
+                        help='only fill the map tiles cache for MAP_BBOX at the given zoom levels '
+                             '(default: MAP_ZOOM) and exit')
+    args = parser.parse_args()
+
+    TILE_SOURCE = args.tile_source
+    ARCHIVE_DB = args.archive
+    TRACE_MEMORY = TRACE_MEMORY or bool(args.report)
+    if args.profile:
+        PROFILE_DIR = args.profile
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+    if args.text_only:
+        STATSMAP = False
+    if args.preview:
+        PLOT_DPI = PREVIEW_DPI
+    if args.formats is not None:
+        OUTPUT_FORMATS = args.formats
+        try:
+            output_formats(global_settings())
+        except ValueError as error:
+            parser.error(str(error))
+    if args.check or args.exclude_flagged:
+        CHECK_QSOS = True
+        EXCLUDE_FLAGGED = EXCLUDE_FLAGGED or args.exclude_flagged
+    if args.density:
+        MAP_MODE = 'density'
+        MAP_DENSITY_WEIGHT = args.density
+    if args.prefill_tiles is not None:
+        if tile_cache() is None:
+            parser.error('TILE_CACHE_DIR is not set')
+        import tilecache
+        tilecache.prefill(MAP_BBOX, args.prefill_tiles or [MAP_ZOOM], tile_cache(), TILE_SOURCE)
+        logging.info('Map tiles cache: %s', tile_cache().info())
+        return 0
+
+    logging.info('Program START')
+    logging.info('Distance limits to select the QSOs, per band: %s', ODX)
+    if args.watch:
+        if args.confirm is not None:
+            parser.error('--confirm needs all the logs, it can not be used with --watch')
+        WATCH_SETTLE = args.settle
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))     # e.g. stopped as a service
+        watch_folder(args.watch, args.force)
+        logging.info('Program END')
+        return 0
+
+    if args.follow:
+        if args.confirm is not None:
+            parser.error('--confirm needs all the logs, it can not be used with --follow')
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        follow_file(args.follow, args.interval)
+        logging.info('Program END')
+        return 0
+
+    # default: all EDI files in the local folder
+    file_list = edisources.expand(args.files or [os.curdir], args.recursive,
+                                  args.include or edisources.EDI_PATTERNS)
+    logging.info('EDI files to process: %s', [source.name for source in file_list])
+
+    start = time.perf_counter()
+    remarks = None
+    if args.confirm is not None:
+        import crosscheck   # in local folder
+        CROSSCHECK_WINDOW = args.confirm
+        remarks = crosscheck.crosscheck_files(file_list, CROSSCHECK_WINDOW)
+    manifest = load_manifest()
+    results = process_files(file_list, args.jobs or os.cpu_count(), manifest.get('files'), args.force, remarks)
+    manifest.setdefault('files', {}).update({result['file']: result['manifest']
+                                             for result in results if 'manifest' in result})
+    save_manifest(manifest)
+    log_summary(results, time.perf_counter() - start)
+    if args.report:
+        write_report(results, time.perf_counter() - start, args.report)
+    logging.info('Program END')
+    return 1 if any(result['status'] != 'ok' for result in results) else 0
+
+
+##############################################################################################
+# Main program starts here
+##############################################################################################
+if __name__ == '__main__':
+    sys.exit(main())
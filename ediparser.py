@@ -0,0 +1,115 @@
+# Streaming parser for EDI (REG1TEST) contest log files
+# Part of EDI2ODX, project hosted on https://github.com/HB9DTX/EDI2ODX
+# Format specification: doc/EDI_Format_OK1KKW.html and doc/EDI_REG1TEST.pdf
+#
+# The file is read once, line by line: the [REG1TEST;1] header is collected into a dict,
+# the QSO records are converted to typed values and only the requested columns are kept.
+# Lines of the [QSORecords] section which are not QSO records (Tucnak IDENT or [END;...] footer,
+# truncated or garbage lines) are skipped and reported instead of aborting the parsing.
+
+import re
+
+# Column names matching EDI file format specification, in file order
+QSO_COLUMNS = ['DATE', 'TIME', 'CALL', 'MODE', 'SENT_RST', 'SENT_NR',
+               'RECEIVED_RST', 'RECEIVED_NUMBER',
+               'EXCHANGE', 'LOCATOR', 'QRB',
+               'N_EXCH', 'N_LOCATOR', 'N_DXCC', 'DUPE']
+# Columns converted to int (None if the field is empty), all other columns are kept as strings
+INTEGER_COLUMNS = ('MODE', 'SENT_RST', 'SENT_NR', 'RECEIVED_RST', 'RECEIVED_NUMBER', 'QRB')
+
+_INTEGER_INDEXES = frozenset(QSO_COLUMNS.index(name) for name in INTEGER_COLUMNS)
+# Numbers of the integer fields: ASCII digits only (str.isdigit also accepts e.g. superscripts), at most 9 so
+# that they fit any integer type of the QSO table
+_NUMBER = re.compile(r'[0-9]{1,9}')
+_DATE = re.compile(r'[0-9]{6}')
+_TIME = re.compile(r'[0-9]{4}')
+
+
+class EdiFormatError(ValueError):
+    # Raised when a file doesn't contain any [QSORecords] section, i.e. is not an EDI log
+    pass
+
+
+class EdiReader:
+    # Reads one EDI file from an iterable of text lines (open file, list of str, ...)
+    # Usage: reader = EdiReader(file); reader.read_header(); then iterate over reader.read_chunks()
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.lineNumber = 0             # number of the last line read
+        self.header = {}                # key=value pairs of the [REG1TEST;1] section
+        self.remarks = []               # free text lines of the [Remarks] section
+        self.declaredQsos = None        # number of QSOs announced by [QSORecords;N]
+        self.qsoCount = 0               # number of QSO records read
+        self.rejected = []              # (line number, line) of lines that are not QSO records
+
+    def read_header(self):
+        # Reads the file up to and including the [QSORecords;N] line, returns the header dict
+        section = None
+        for line in self.lines:
+            self.lineNumber += 1
+            line = line.rstrip('\r\n')
+            if line.startswith('['):
+                section = line.strip('[] ').split(';')[0]
+                if section == 'QSORecords':
+                    count = line.strip('[] ').split(';')[1:2]
+                    if count and count[0].strip().isdigit():
+                        self.declaredQsos = int(count[0])
+                    return self.header
+            elif section == 'Remarks':
+                self.remarks.append(line)
+            elif '=' in line:
+                key, value = line.split('=', 1)
+                self.header[key.strip()] = value
+        raise EdiFormatError('no [QSORecords] section found')
+
+    def _parse(self, line):
+        # Converts one line to the list of its typed fields, None if the line is not a QSO record
+        fields = line.rstrip('\r\n').split(';')
+        if len(fields) < len(QSO_COLUMNS) or any(fields[len(QSO_COLUMNS):]):
+            return None
+        fields = fields[:len(QSO_COLUMNS)]
+        date, time = fields[0], fields[1]
+        if not _DATE.fullmatch(date) or not _TIME.fullmatch(time):
+            return None
+        for index in _INTEGER_INDEXES:
+            value = fields[index].strip()
+            if _NUMBER.fullmatch(value):
+                fields[index] = int(value)
+            elif value:
+                return None
+            else:
+                fields[index] = None    # empty field (e.g. QRB of a QSO without locator)
+        return fields
+
+    def _qso_fields(self):
+        # Generator over the parsed fields of all the QSO records, rejected lines are collected
+        for line in self.lines:
+            self.lineNumber += 1
+            fields = self._parse(line)
+            if fields is None:
+                if line.strip():
+                    self.rejected.append((self.lineNumber, line.rstrip('\r\n')))
+                continue
+            self.qsoCount += 1
+            yield fields
+
+    def read_chunks(self, usecols=None, size=100000):
+        # Generator of dicts {column name: list of values} of up to `size` QSO records each (at least one,
+        # possibly empty, dict), so that large logs can be converted to compact arrays chunk by chunk
+        # usecols: column names to keep (default all), the other fields are discarded while reading
+        if self.lineNumber == 0:
+            self.read_header()
+        names = QSO_COLUMNS if usecols is None else [name for name in QSO_COLUMNS if name in usecols]
+        indexes = [QSO_COLUMNS.index(name) for name in names]
+        columns = [[] for _ in names]
+        count = 0                       # records of the current chunk (no column if usecols is empty)
+        for fields in self._qso_fields():
+            for column, index in zip(columns, indexes):
+                column.append(fields[index])
+            count += 1
+            if count == size:
+                yield dict(zip(names, columns))
+                columns = [[] for _ in names]
+                count = 0
+        if count or self.qsoCount == 0:
+            yield dict(zip(names, columns))
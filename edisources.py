@@ -0,0 +1,155 @@
+# Input sources of EDI logs for EDI2ODX: files, members of zip / tar archives, stdin and in-memory buffers
+# Part of EDI2ODX, project hosted on https://github.com/HB9DTX/EDI2ODX
+#
+# An EdiSource only describes where a log is (it is small and can be sent to the worker processes); the log is
+# read when the source is opened, as a stream of text lines for the parser: archive members are decompressed
+# while they are parsed, nothing is extracted to disk (the logs of a compressed tar archive are read into memory
+# while the archive is listed, in one pass, as its members can't be reached directly).
+# expand() turns command line arguments (files, folders, archives, glob patterns, '-' for stdin) into sources.
+
+import fnmatch
+import glob
+import hashlib
+import io
+import os
+import sys
+import tarfile
+import zipfile
+
+EDI_PATTERNS = ('*.edi',)           # default names of the EDI logs (case insensitive) in folders and archives
+ZIP_SUFFIXES = ('.zip',)
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+class EdiSource:
+    # kind: 'file' (path), 'zip' (member of the zip archive path), 'tar' (member of the uncompressed tar
+    # archive path, data at offset, size bytes), 'bytes' (content of the log in data, e.g. stdin, member of a
+    # compressed tar archive)
+    # name: designation of the log in the messages, the manifest and the results (e.g. logs.zip:HB9XC.edi)
+    def __init__(self, kind, path=None, member=None, data=None, offset=None, size=None, name=None):
+        self.kind = kind
+        self.path = path
+        self.member = member
+        self.data = data
+        self.offset = offset
+        self.size = size
+        self.name = name or (path + ':' + member if member else path)
+
+    def __repr__(self):
+        return 'EdiSource(%s)' % self.name
+
+    def open_binary(self):
+        # Binary file object of the content of the log
+        if self.kind == 'file':
+            return open(self.path, 'rb')
+        if self.kind == 'zip':
+            with zipfile.ZipFile(self.path) as archive:     # the archive file stays open until the member is closed
+                return archive.open(self.member)
+        if self.kind == 'tar':
+            return io.BufferedReader(_FileSlice(self.path, self.offset, self.size))
+        return io.BytesIO(self.data)
+
+    def open(self):
+        # Text file object of the log (iterable of lines), to be used in a with statement
+        return io.TextIOWrapper(self.open_binary(), encoding='utf-8', errors='ignore')
+
+    def digest(self):
+        # sha256 of the content of the log
+        digest = hashlib.sha256()
+        with self.open_binary() as stream:
+            for block in iter(lambda: stream.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+
+class _FileSlice(io.RawIOBase):
+    # size bytes of a file from offset (member of an uncompressed tar archive), read as a file
+    def __init__(self, path, offset, size):
+        self.file = open(path, 'rb')
+        self.file.seek(offset)
+        self.remaining = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.file.read(min(len(buffer), self.remaining))
+        buffer[:len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+def as_source(source):
+    # EdiSource of a path (or of an EdiSource)
+    return source if isinstance(source, EdiSource) else EdiSource('file', os.fspath(source))
+
+
+def from_bytes(data, name='<bytes>'):
+    # EdiSource of the content of a log (bytes or str)
+    return EdiSource('bytes', data=data.encode('utf-8') if isinstance(data, str) else bytes(data), name=name)
+
+
+def _matches(name, patterns):
+    # True if the base name matches one of the glob patterns (case insensitive)
+    base = os.path.basename(name).lower()
+    return any(fnmatch.fnmatch(base, pattern.lower()) for pattern in patterns)
+
+
+def is_archive(path):
+    return path.lower().endswith(ZIP_SUFFIXES + TAR_SUFFIXES)
+
+
+def archive_members(path, patterns=EDI_PATTERNS):
+    # Sources of the EDI logs (names matching patterns) of a zip or tar archive, in archive order
+    # Members of a compressed tar archive are read here, in a single pass over the archive (a compressed
+    # member can only be reached by decompressing everything before it)
+    if path.lower().endswith(ZIP_SUFFIXES):
+        with zipfile.ZipFile(path) as archive:
+            return [EdiSource('zip', path, info.filename) for info in archive.infolist()
+                    if not info.is_dir() and _matches(info.filename, patterns)]
+    sources = []
+    with tarfile.open(path, 'r:') if path.lower().endswith('.tar') else tarfile.open(path, 'r|*') as archive:
+        for info in archive:
+            if not info.isfile() or not _matches(info.name, patterns):
+                continue
+            if path.lower().endswith('.tar'):
+                sources.append(EdiSource('tar', path, info.name, offset=info.offset_data, size=info.size))
+            else:
+                sources.append(EdiSource('bytes', path, info.name, data=archive.extractfile(info).read()))
+    return sources
+
+
+def folder_files(folder, recursive=False, patterns=EDI_PATTERNS):
+    # Paths of the EDI logs (names matching patterns) of a folder, sorted, and of its subfolders if recursive
+    paths = []
+    for root, folders, files in os.walk(folder):
+        folders[:] = sorted(name for name in folders if not name.startswith('.')) if recursive else []
+        paths += [os.path.join(root, name) for name in sorted(files) if _matches(name, patterns)]
+    return paths
+
+
+def expand(arguments, recursive=False, patterns=EDI_PATTERNS, stdin=None):
+    # Sources of the EDI logs designated by command line arguments, in the order of the arguments:
+    # file, folder (EDI logs matching patterns, with the subfolders if recursive), zip / tar archive
+    # (members matching patterns), glob pattern (e.g. logs/**/*.edi) or '-' (log read from stdin)
+    sources = []
+    for argument in arguments:
+        if argument == '-':
+            sources.append(from_bytes((stdin or sys.stdin.buffer).read(), '<stdin>'))
+        elif os.path.isdir(argument):
+            sources += [as_source(os.path.normpath(path)) for path in folder_files(argument, recursive, patterns)]
+        elif not os.path.exists(argument) and any(character in argument for character in '*?['):
+            for path in sorted(glob.glob(argument, recursive=True)):
+                if is_archive(path):
+                    sources += archive_members(path, patterns)
+                elif not os.path.isdir(path):
+                    sources.append(as_source(os.path.normpath(path)))
+        elif is_archive(argument):
+            sources += archive_members(argument, patterns)
+        else:
+            sources.append(as_source(os.path.normpath(argument)))
+    return sources
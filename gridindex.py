@@ -0,0 +1,113 @@
+# Grid index on the sphere of the positions of the worked stations, for the QSO archive (odxarchive.py)
+# Part of EDI2ODX, project hosted on https://github.com/HB9DTX/EDI2ODX
+#
+# The cells of the grid are the locator squares (2 degrees of longitude x 1 degree of latitude, e.g. JN47),
+# numbered row * COLUMNS + column (row: latitude + 90, column: (longitude + 180) / 2). The archive stores the
+# position (decoded locator) and the cell of each QSO, with an index on the cell: a query only reads the QSOs of
+# the cells which may intersect the searched area (circle, box or azimuth sector around a reference position),
+# then the positions of these candidates are filtered exactly. The candidate cells are found from the cell
+# centers: every point of a cell is within CELL_RADIUS_KM of its center.
+
+import math
+
+import numpy as np
+
+import maiden       # in local folder
+
+CELL_WIDTH = 2.0                        # degrees of longitude
+CELL_HEIGHT = 1.0                       # degrees of latitude
+COLUMNS = int(360 / CELL_WIDTH)
+ROWS = int(180 / CELL_HEIGHT)
+KM_PER_DEGREE = 60 * 1.853              # as maiden.Maiden.dist_az
+CELL_RADIUS_KM = 125.0                  # max. distance from the center of a cell to its points (124.3 km, equator)
+SLACK_KM = 2.0                          # distances and azimuths of maiden.dist_az_array are rounded: candidates kept
+SLACK_DEGREES = 1.0                     # this close to the limits
+
+
+def cells(latitudes, longitudes):
+    # Cell of each position (arrays of degrees), -1 where the position is unknown (NaN)
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    unknown = np.isnan(latitudes) | np.isnan(longitudes)
+    rows = np.clip(np.floor((np.nan_to_num(latitudes) + 90) / CELL_HEIGHT), 0, ROWS - 1).astype(np.int64)
+    columns = np.floor((np.nan_to_num(longitudes) + 180) / CELL_WIDTH).astype(np.int64) % COLUMNS
+    return np.where(unknown, -1, rows * COLUMNS + columns)
+
+
+def _grid(rows, columns):
+    # Cells and latitude, longitude of the centers of all the cells of the given rows and columns
+    rows, columns = np.meshgrid(np.asarray(rows, dtype=np.int64), np.asarray(columns, dtype=np.int64) % COLUMNS,
+                                indexing='ij')
+    rows = rows.ravel()
+    columns = columns.ravel()
+    return (rows * COLUMNS + columns, (rows + 0.5) * CELL_HEIGHT - 90,
+            (columns + 0.5) * CELL_WIDTH - 180)
+
+
+def _rows(south, north):
+    return np.arange(max(int(math.floor((south + 90) / CELL_HEIGHT)), 0),
+                     min(int(math.floor((north + 90) / CELL_HEIGHT)), ROWS - 1) + 1)
+
+
+def in_box(latitudes, longitudes, west, south, east, north):
+    # True for the positions in the box (west > east: the box crosses the 180th meridian)
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    inside = (latitudes >= south) & (latitudes <= north)
+    if west <= east:
+        return inside & (longitudes >= west) & (longitudes <= east)
+    return inside & ((longitudes >= west) | (longitudes <= east))
+
+
+def box_cells(west, south, east, north):
+    # Cells intersecting a box of longitudes and latitudes (west > east: the box crosses the 180th meridian)
+    first = int(math.floor((west + 180) / CELL_WIDTH))
+    last = int(math.floor((east + 180) / CELL_WIDTH))
+    if last < first:
+        last += COLUMNS
+    return _grid(_rows(south, north), np.arange(first, min(last, first + COLUMNS - 1) + 1))[0]
+
+
+def _sector_width(azimuth_from, azimuth_to):
+    # Width in degrees of the sector from azimuth_from clockwise to azimuth_to (0 to 360: 360)
+    width = (azimuth_to - azimuth_from) % 360
+    return 360 if width == 0 and azimuth_to != azimuth_from else width
+
+
+def in_sector(azimuths, azimuth_from, azimuth_to):
+    # True for the azimuths in the sector from azimuth_from clockwise to azimuth_to (degrees)
+    return (np.asarray(azimuths) - azimuth_from) % 360 <= _sector_width(azimuth_from, azimuth_to)
+
+
+def circle_cells(position, radius_km):
+    # Cells which may hold positions within radius_km of position (latitude, longitude)
+    # Returns the cells and the distance and azimuth of their centers from position
+    reach = math.radians((radius_km + CELL_RADIUS_KM + SLACK_KM) / KM_PER_DEGREE)     # angular radius
+    latitude = math.radians(position[0])
+    rows = _rows(position[0] - math.degrees(reach), position[0] + math.degrees(reach))
+    if reach >= math.pi / 2 - abs(latitude):
+        columns = np.arange(COLUMNS)   # the circle contains a pole: all the longitudes
+    else:
+        half_width = math.degrees(math.asin(math.sin(reach) / math.cos(latitude)))
+        first = int(math.floor((position[1] - half_width + 180) / CELL_WIDTH))
+        last = int(math.floor((position[1] + half_width + 180) / CELL_WIDTH))
+        columns = np.arange(first, min(last, first + COLUMNS - 1) + 1)
+    grid, latitudes, longitudes = _grid(rows, columns)
+    distances, azimuths = maiden.Maiden.dist_az_array(position, latitudes, longitudes)
+    near = distances <= radius_km + CELL_RADIUS_KM + SLACK_KM
+    return grid[near], distances[near], azimuths[near]
+
+
+def sector_cells(position, azimuth_from, azimuth_to, min_km=0, max_km=None):
+    # Cells which may hold positions seen from position in the azimuth sector (azimuth_from clockwise to
+    # azimuth_to, degrees) at a distance between min_km and max_km (None: no limit)
+    grid, distances, azimuths = circle_cells(position, max_km if max_km is not None else 180 * KM_PER_DEGREE)
+    keep = distances >= (min_km or 0) - CELL_RADIUS_KM - SLACK_KM
+    # half angle under which a cell is seen from position (on the sphere), the cells around position are all kept
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = math.sin(math.radians(CELL_RADIUS_KM / KM_PER_DEGREE)) / np.sin(np.radians(distances / KM_PER_DEGREE))
+        margins = np.degrees(np.arcsin(np.minimum(ratio, 1.0))) + SLACK_DEGREES
+    around = (distances <= CELL_RADIUS_KM) | (ratio >= 1)
+    width = _sector_width(azimuth_from, azimuth_to)
+    keep &= around | (width + 2 * margins >= 360) | ((azimuths - azimuth_from + margins) % 360 <= width + 2 * margins)
+    return grid[keep]
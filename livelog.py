@@ -0,0 +1,101 @@
+# Follow of an EDI log while it is written by the logging program, for the live mode of EDI2ODX (edi2odx.py --follow)
+# Part of EDI2ODX, project hosted on https://github.com/HB9DTX/EDI2ODX
+#
+# The logging programs append the new QSO records at the end of the file, or rewrite the whole file (the header
+# holds the number of QSOs, the claimed score...). Either way the QSO records already read are found unchanged at
+# the start of the [QSORecords] section: at each poll only the header and the bytes after the records already read
+# are read from the file. The whole file is read again if it was truncated, if the records already read changed
+# (their last TAIL_CHECK bytes are compared) or if the station, band or date of the header changed.
+# Only complete lines are taken (the last line may be half written), and the records stop at the first line
+# starting with '[' (e.g. [END;...] footer written after the records), which is read again at the next poll.
+
+import collections
+import os
+
+import ediparser    # in local folder
+
+TAIL_CHECK = 4096                       # bytes at the end of the records already read checked at each poll
+KEY_FIELDS = ('TDate', 'PCall', 'PWWLo', 'PBand')   # header fields of the log, the log is read again if they change
+
+# reset: True if lines are the whole file (header included), False if they are the QSO lines appended since the
+# previous update; lineNumber: number of lines of the file before lines
+Update = collections.namedtuple('Update', ['reset', 'lines', 'lineNumber'])
+
+
+def _read_header(logFile):
+    # Header dict, offset of the QSO records and number of header lines of an EDI file opened in binary mode
+    logFile.seek(0)
+    reader = ediparser.EdiReader(line.decode('utf-8', errors='ignore') for line in iter(logFile.readline, b''))
+    header = reader.read_header()       # stops right after the [QSORecords;N] line
+    return header, logFile.tell(), reader.lineNumber
+
+
+def _records_length(data):
+    # Number of bytes of the complete record lines at the start of data
+    end = data.rfind(b'\n') + 1
+    if data.startswith(b'['):
+        return 0
+    section = data.find(b'\n[', 0, end)
+    return end if section < 0 else section + 1
+
+
+class LogFollower:
+    # Usage: follower = LogFollower(path); while True: update = follower.poll(); ...
+    # The first update is the whole file (reset)
+    def __init__(self, path):
+        self.path = path
+        self.signature = None           # (size, mtime) of the file at the last poll
+        self.header = None              # KEY_FIELDS of the header at the last update, None: file to be read again
+        self.consumed = 0               # bytes of the QSO records read
+        self.tail = b''                 # last bytes of the QSO records read
+        self.recordLines = 0            # number of lines of the QSO records read
+
+    def restart(self):
+        # The next poll returns the whole file, even if it didn't change
+        self.signature = None
+        self.header = None
+
+    def _unchanged(self, logFile, start):
+        # True if the QSO records read at the previous polls are still at the start of the records section
+        end = start + self.consumed
+        if os.fstat(logFile.fileno()).st_size < end:
+            return False                # truncated
+        logFile.seek(end - len(self.tail))
+        return logFile.read(len(self.tail)) == self.tail
+
+    def poll(self):
+        # Update of the file since the previous poll, None if no new complete line (or no file, no header yet)
+        try:
+            status = os.stat(self.path)
+        except OSError:
+            return None
+        signature = (status.st_size, status.st_mtime_ns)
+        if signature == self.signature:
+            return None
+        self.signature = signature
+        with open(self.path, 'rb') as logFile:
+            try:
+                header, start, header_lines = _read_header(logFile)
+            except ediparser.EdiFormatError:
+                return None             # header not completely written yet
+            key = {name: header.get(name) for name in KEY_FIELDS}
+            reset = key != self.header or not self._unchanged(logFile, start)
+            if reset:
+                self.header = key
+                self.consumed = 0
+                self.tail = b''
+                self.recordLines = 0
+            logFile.seek(start + self.consumed)
+            data = logFile.read()
+            records = data[:_records_length(data)]
+            if reset:
+                logFile.seek(0)
+                data = logFile.read(start) + records
+            elif not records:
+                return None
+        self.consumed += len(records)
+        self.tail = (self.tail + records)[-TAIL_CHECK:]
+        line_number = 0 if reset else header_lines + self.recordLines
+        self.recordLines += records.count(b'\n')
+        return Update(reset, (data if reset else records).decode('utf-8', errors='ignore').splitlines(True),
+                      line_number)
@@ -9,7 +9,10 @@
 """
 import re
 import math
-from collections import namedtuple
+import threading
+from collections import namedtuple, OrderedDict
+
+import numpy as np
 
 Col = namedtuple(
     'color',
@@ -58,11 +61,88 @@ def line_input() -> tuple:
     return selection, l_inp
 
 
+class LocatorCache:
+    """
+    Size-bounded least recently used cache with hit/miss counters,
+    shared by all Maiden instances of the process
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :param key: cache key
+        :return: cached value or None if not in cache
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Stores value, evicting the least recently used entries above maxsize
+        :param key: cache key
+        :param value: value to store (not None)
+        """
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Empties the cache and resets the counters
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def info(self) -> dict:
+        """
+        :return: hits, misses, current and maximum size
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "size": len(self._entries), "maxsize": self.maxsize}
+
+
+LOCATOR_CACHE_SIZE = 65536  # decoded locators kept in memory
+DIST_AZ_CACHE_SIZE = 262144  # (home position, locator) distance/azimuth results kept in memory
+LOCATOR_CACHE = LocatorCache(LOCATOR_CACHE_SIZE)  # locator -> (lat, lon)
+DIST_AZ_CACHE = LocatorCache(DIST_AZ_CACHE_SIZE)  # (home lat, home lon, locator) -> (lat, lon, dist, az)
+
+
+def cache_info() -> dict:
+    """
+    Returns hit/miss statistics of the locator and distance/azimuth caches
+    """
+    return {"locator": LOCATOR_CACHE.info(), "dist_az": DIST_AZ_CACHE.info()}
+
+
+# Locators made of alternating letter/number pairs, decoded in bulk by Maiden.maiden2latlon_array
+_REGULAR_LOCATOR = re.compile(r"[A-Ra-r]{2}\d\d(?:[A-Xa-x]{2}\d\d)*(?:[A-Xa-x]{2})?")
+
+
 class Maiden:
     """
     Maidenhead locator functions
     latlon2maiden: lat/lon position to locator
     maiden2latlon: locator to lat/long position
+    latlon2maiden_array, maiden2latlon_array, dist_az_array:
+        same on numpy arrays, for whole contest logs at once
+    dist_az_locators: locators to positions, distances and azimuths
+    Decoded locators and distances are kept in LOCATOR_CACHE / DIST_AZ_CACHE
     Geodg2dms (class) dec deg to deg, min, sec
 
     """
@@ -117,6 +197,16 @@ class Maiden:
         :param loctr: Maidenhead locator 4 up to 10 characters
         :return: lon, lat (dg decimal) or None, None (invalid input)
         """
+        pos = LOCATOR_CACHE.get(loctr)
+        if pos is None:
+            pos = self._maiden2latlon(loctr)
+            LOCATOR_CACHE.put(loctr, pos)
+        return pos
+
+    def _maiden2latlon(self, loctr: str) -> tuple:
+        """
+        Uncached maiden2latlon
+        """
         lon = lat = -90
         # check validity of input
         if not re.match(r"([A-Ra-r]{2}\d\d)(([A-Za-z]{2})(\d\d)?){0,2}", loctr):
@@ -165,6 +255,159 @@ class Maiden:
         azimuth = round((azimuth + 360) % 360)
         return dist, azimuth
 
+    @staticmethod
+    def latlon2maiden_array(lat, lon, loc_len: int) -> np.ndarray:
+        """
+        Calculates maiden locators for arrays of positions,
+        same results as latlon2maiden for every element
+        :param lat: array of latitudes decimal
+        :param lon: array of longitudes decimal
+        :param loc_len: precision 4 to 10
+        :return: array of Maidenhead locator strings ("" for invalid input)
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        if not 4 <= loc_len <= 10:
+            return np.full(lat.shape, "", dtype="U1")
+        if divmod(loc_len, 2)[1] > 0:  # must be even
+            loc_len = 2 * divmod(loc_len, 2)[0]
+        valid = np.isfinite(lat) & np.isfinite(lon)
+        lat = np.where(valid, lat, 0.)
+        lon = np.where(valid, lon, 0.)
+        # one column of character codes per locator character
+        chars = np.empty(lat.shape + (loc_len,), dtype=np.uint8)
+        l_a = np.divmod(lat + 90, 10)
+        l_o = np.divmod(lon + 180, 20)
+        chars[..., 0] = ord("A") + l_o[0].astype(np.int64)
+        chars[..., 1] = ord("A") + l_a[0].astype(np.int64)
+        lon = l_o[1] / 2
+        lat = l_a[1]
+        for i in range(1, int(loc_len / 2)):
+            l_o = np.divmod(lon, 1)
+            l_a = np.divmod(lat, 1)
+            if (i + 1) % 2:
+                base = ord("a")
+                lon = 10 * l_o[1]
+                lat = 10 * l_a[1]
+            else:
+                base = ord("0")
+                lon = 24 * l_o[1]
+                lat = 24 * l_a[1]
+            chars[..., 2 * i] = base + l_o[0].astype(np.int64)
+            chars[..., 2 * i + 1] = base + l_a[0].astype(np.int64)
+        locators = chars.reshape(-1).view("S%d" % loc_len).astype("U%d" % loc_len)
+        locators = locators.reshape(lat.shape)
+        locators[~valid] = ""
+        return locators
+
+    def maiden2latlon_array(self, locators) -> tuple:
+        """
+        Calculates latitudes and longitudes in decimal degrees for an
+        array of locators, same results as maiden2latlon for every element
+        :param locators: sequence or array of Maidenhead locators
+        :return: lat, lon arrays (dg decimal), NaN where the input is invalid
+        """
+        locators = np.asarray(locators, dtype=object)
+        uniques, inverse = np.unique(
+            np.array([x if isinstance(x, str) else "" for x in locators.reshape(-1)], dtype=object),
+            return_inverse=True)
+        lat = np.full(len(uniques), np.nan)
+        lon = np.full(len(uniques), np.nan)
+        # regular locators (alternating letter/number pairs) missing in the
+        # cache are decoded together by length, anything else goes through
+        # maiden2latlon
+        by_length = {}
+        for i, loctr in enumerate(uniques):
+            pos = LOCATOR_CACHE.get(loctr)
+            if pos is None and _REGULAR_LOCATOR.fullmatch(loctr):
+                by_length.setdefault(len(loctr), []).append(i)
+                continue
+            if pos is None:
+                try:
+                    pos = self._maiden2latlon(loctr)
+                except ValueError:  # letter and number pairs do not interleave
+                    continue
+                LOCATOR_CACHE.put(loctr, pos)
+            if pos[0] is not None:
+                lat[i], lon[i] = pos
+        for length, indexes in by_length.items():
+            codes = np.frombuffer("".join(uniques[indexes]).upper().encode("ascii"),
+                                  dtype=np.uint8).reshape(len(indexes), length).astype(np.int64)
+            lon_u = np.full(len(indexes), -90.)
+            lat_u = np.full(len(indexes), -90.)
+            for j in range(length // 2):
+                zero = ord("0") if j % 2 else ord("A")
+                lon_u += self.f_10_24(j) * (codes[:, 2 * j] - zero)
+                lat_u += self.f_10_24(j) * (codes[:, 2 * j + 1] - zero)
+            lon_u *= 2
+            lon_u += self.f_10_24(length // 2 - 1) / 2  # Centre of the field
+            lat_u += self.f_10_24(length // 2 - 1) / 2
+            lat[indexes] = np.round(lat_u, 6)
+            lon[indexes] = np.round(lon_u, 6)
+            for i in indexes:
+                LOCATOR_CACHE.put(uniques[i], (float(lat[i]), float(lon[i])))
+        return lat[inverse].reshape(locators.shape), lon[inverse].reshape(locators.shape)
+
+    def dist_az_locators(self, pos1: tuple, locators) -> tuple:
+        """
+        Decodes an array of locators and calculates distances and compass
+        directions from pos1, results are cached per reference position
+        :param pos1: Latitude, Longitude of the reference position
+        :param locators: sequence or array of Maidenhead locators
+        :return: lat, lon, distance and azimuth arrays, NaN where the locator is invalid
+        """
+        locators = np.asarray(locators, dtype=object)
+        uniques, inverse = np.unique(
+            np.array([x if isinstance(x, str) else "" for x in locators.reshape(-1)], dtype=object),
+            return_inverse=True)
+        results = np.full((len(uniques), 4), np.nan)
+        missing = []
+        for i, loctr in enumerate(uniques):
+            cached = DIST_AZ_CACHE.get((pos1[0], pos1[1], loctr))
+            if cached is None:
+                missing.append(i)
+            else:
+                results[i] = cached
+        if missing:
+            lat, lon = self.maiden2latlon_array(uniques[missing])
+            dist, azimuth = self.dist_az_array(pos1, lat, lon)
+            results[missing] = np.column_stack((lat, lon, dist, azimuth))
+            for i in missing:
+                DIST_AZ_CACHE.put((pos1[0], pos1[1], uniques[i]), tuple(results[i].tolist()))
+        results = results[inverse].reshape(locators.shape + (4,))
+        return results[..., 0], results[..., 1], results[..., 2], results[..., 3]
+
+    @staticmethod
+    def dist_az_array(pos1: tuple, lat2, lon2) -> tuple:
+        """
+        Calculates distances and compass directions from pos1 to arrays of
+        positions, same results as dist_az for every element
+        :param pos1: Latitude, Longitude of the reference position
+        :param lat2: array of latitudes
+        :param lon2: array of longitudes
+        :return: distance and azimuth arrays, NaN where the position is NaN
+        """
+        lat2_dg = np.asarray(lat2, dtype=np.float64)
+        lon2_dg = np.asarray(lon2, dtype=np.float64)
+        lat1 = math.radians(pos1[0])
+        lon1 = math.radians(pos1[1])
+        lat2 = np.radians(lat2_dg)
+        lon2 = np.radians(lon2_dg)
+        dlon = np.radians(lon2_dg - pos1[1])
+        dist = math.sin(lat1) * np.sin(lat2) + math.cos(lat1) \
+            * np.cos(lat2) * np.cos(dlon)
+        dist = np.rint(np.degrees(np.arccos(np.clip(dist, -1., 1.))) * 60 * 1.853)
+        x_1 = np.sin(dlon) * np.cos(lat2)
+        x_2 = math.cos(lat1) * np.sin(lat2) \
+            - (math.sin(lat1) * np.cos(lat2) * np.cos(dlon))
+        azimuth = np.degrees(np.arctan2(x_1, x_2))
+        azimuth = np.rint((azimuth + 360) % 360)
+        # compare identical inputs
+        same = (lat2 == lat1) & (lon2 == lon1)
+        dist[same] = 0.
+        azimuth[same] = 0.
+        return dist, azimuth
+
 
 class Geodg2dms:
     """
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# Persistent cross-contest QSO archive (SQLite) for EDI2ODX
+# Part of EDI2ODX, project hosted on https://github.com/HB9DTX/EDI2ODX
+#
+# Parsed EDI logs are appended to a local SQLite database (one row per contest with its header, one row
+# per QSO), indexed on call, locator, band and date, so that questions like "all QSOs over 800 km on 2 m
+# in the last five years" or "every time we worked this call" don't need to re-parse the EDI files.
+# The position of each worked station (decoded locator) is stored with its cell of a grid index on the sphere
+# (see gridindex.py): "stations within 150 km of JN47" or "QSOs in the 300-330 degrees sector beyond 600 km"
+# from any reference locator only read the QSOs of the cells around the searched area.
+#
+# Usage examples:
+#   python3 odxarchive.py ingest qsos.db *.edi
+#   python3 odxarchive.py query qsos.db --band "144 MHz" --min-qrb 800 --since 2018-01-01
+#   python3 odxarchive.py query qsos.db --call OK1KIR
+#   python3 odxarchive.py query qsos.db --band "10 GHz" --near JN47 150
+#   python3 odxarchive.py query qsos.db --sector JN36BK 300 330 600
+#   python3 odxarchive.py odx qsos.db --band "144 MHz" --since 2022-01-01 -o dubus   # DUBUS _DXs.txt files per contest
+
+import argparse
+import json
+import logging
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+
+import contestlog   # in local folder
+import ediparser    # in local folder
+import edisources   # in local folder
+import gridindex    # in local folder
+import maiden       # in local folder
+
+SCHEMA_VERSION = 1
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS contests (
+    id INTEGER PRIMARY KEY,
+    sha256 TEXT UNIQUE,             -- content hash of the EDI file
+    filename TEXT,
+    start TEXT,                     -- YYYYMMDD (TDate)
+    call TEXT,                      -- PCall
+    locator TEXT,                   -- PWWLo
+    band TEXT,                      -- PBand
+    header TEXT,                    -- whole [REG1TEST;1] header, JSON
+    ingested TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE UNIQUE INDEX IF NOT EXISTS contests_log ON contests (start, call, band);
+CREATE TABLE IF NOT EXISTS qsos (
+    contest_id INTEGER REFERENCES contests (id) ON DELETE CASCADE,
+    band TEXT,                      -- copied from the contest, for the indexed queries
+    utc TEXT,                       -- YYYY-MM-DD HH:MM, for date range queries
+    date TEXT, time TEXT, call TEXT, mode INTEGER, sent_rst INTEGER, sent_nr INTEGER,
+    received_rst INTEGER, received_number INTEGER, exchange TEXT, locator TEXT, qrb INTEGER,
+    n_exch TEXT, n_locator TEXT, n_dxcc TEXT, dupe TEXT,
+    lat REAL, lon REAL,             -- position of the worked station (decoded locator), NULL if not valid
+    cell INTEGER                    -- cell of the position in the grid index (gridindex.py)
+);
+CREATE INDEX IF NOT EXISTS qsos_call ON qsos (call);
+CREATE INDEX IF NOT EXISTS qsos_locator ON qsos (locator);
+CREATE INDEX IF NOT EXISTS qsos_band_qrb ON qsos (band, qrb);
+CREATE INDEX IF NOT EXISTS qsos_utc ON qsos (utc);
+CREATE INDEX IF NOT EXISTS qsos_cell ON qsos (cell);
+'''
+# QSO columns of the archive, same order as ediparser.QSO_COLUMNS
+QSO_FIELDS = [name.lower() for name in ediparser.QSO_COLUMNS]
+
+
+def connect(database):
+    # Opens (and creates if needed) the archive database
+    connection = sqlite3.connect(database, timeout=60)     # several worker processes may ingest at once
+    connection.execute('PRAGMA foreign_keys = ON')
+    connection.execute('PRAGMA case_sensitive_like = ON')     # LIKE 'JN4%' can use the locator index
+    version = connection.execute('PRAGMA user_version').fetchone()[0]
+    if version not in (0, SCHEMA_VERSION):
+        raise ValueError('%s: archive schema version %s is not supported' % (database, version))
+    connection.executescript(SCHEMA)
+    connection.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+    return connection
+
+
+def positions(locators):
+    # Latitude, longitude (NaN if not valid) and grid index cell (-1) of the position of each locator
+    latitudes, longitudes = maiden.Maiden().maiden2latlon_array(np.asarray(locators, dtype=object))
+    return latitudes, longitudes, gridindex.cells(latitudes, longitudes)
+
+
+def ingest_contest(connection, contest, filename, sha256):
+    # Appends a parsed contest log (contestlog.Contest read with all columns) to the archive
+    # A file already ingested is skipped, a new version of the log of the same contest, call and band
+    # replaces the previous one. Returns the number of QSOs added
+    if connection.execute('SELECT 1 FROM contests WHERE sha256 = ?', (sha256,)).fetchone():
+        logging.info('%s already in archive', filename)
+        return 0
+    header = contest.header or {}
+    call = header.get('PCall', contest.call)
+    with connection:
+        connection.execute('DELETE FROM contests WHERE start = ? AND call = ? AND band = ?',
+                           (contest.start, call, contest.bandEDI))
+        contest_id = connection.execute(
+            'INSERT INTO contests (sha256, filename, start, call, locator, band, header) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (sha256, filename, contest.start, call, contest.locator, contest.bandEDI, json.dumps(header))).lastrowid
+        qsos = contest.qsoList
+        utc = contestlog.qso_timestamps(qsos).dt.strftime('%Y-%m-%d %H:%M')
+        columns = [qsos[name].astype(object).where(qsos[name].notna(), None) if name in qsos
+                   else [None] * len(qsos) for name in ediparser.QSO_COLUMNS]
+        for name in ('CALL', 'LOCATOR'):
+            if name in qsos:
+                columns[ediparser.QSO_COLUMNS.index(name)] = qsos[name].str.upper()
+        latitudes, longitudes, cells = positions(columns[ediparser.QSO_COLUMNS.index('LOCATOR')])
+        known = cells >= 0
+        columns += [pd.Series(values).astype(object).where(known, None) for values in (latitudes, longitudes, cells)]
+        rows = ((contest_id, contest.bandEDI) + values
+                for values in zip(utc.astype(object).where(utc.notna(), None), *columns))
+        connection.executemany('INSERT INTO qsos (contest_id, band, utc, %s, lat, lon, cell) VALUES (?, ?, ?%s)'
+                               % (', '.join(QSO_FIELDS), ', ?' * (len(QSO_FIELDS) + 3)), rows)
+    logging.info('%s QSOs of %s added to archive', len(contest.qsoList), filename)
+    return len(contest.qsoList)
+
+
+def ingest_files(database, filenames):
+    # Parses EDI files (paths or edisources.EdiSource) and appends them to the archive, returns the number of
+    # QSOs added
+    connection = connect(database)
+    added = 0
+    for source in map(edisources.as_source, filenames):
+        contest = contestlog.Contest()
+        try:
+            contestlog.read_edi_file(source, contest)
+        except (OSError, ValueError) as error:
+            logging.error('%s not ingested: %s', source.name, error)
+            continue
+        added += ingest_contest(connection, contest, source.name, contestlog.file_digest(source))
+    connection.close()
+    return added
+
+
+def band_aliases(band):
+    # All the PBand values designating the same band (e.g. 144 MHz and 145 MHz), see contestlog.WAVELENGTHS
+    wavelength = contestlog.WAVELENGTHS.get(band)
+    if wavelength is None:
+        return [band]
+    return [name for name, value in contestlog.WAVELENGTHS.items() if value == wavelength]
+
+
+def reference_position(locator):
+    # Latitude, longitude of a reference locator of the spatial queries, ValueError if it is not valid
+    position = maiden.Maiden().maiden2latlon(locator.strip())
+    if position[0] is None:
+        raise ValueError('%s is not a valid locator' % locator)
+    return position
+
+
+def query(connection, band=None, min_qrb=None, since=None, until=None, call=None, locator=None, station=None,
+          near=None, bbox=None, sector=None):
+    # QSOs of the archive matching all the given criteria, as a DataFrame sorted by time
+    # since/until: YYYY-MM-DD (inclusive), call: worked station, locator: prefix of the locator of the
+    # worked station (e.g. JN47), station: call of the contest station
+    # Position of the worked station (grid index, see gridindex.py):
+    # near: (locator, km) within km of the reference locator, bbox: (west, south, east, north) in degrees
+    # (west > east: across the 180th meridian), sector: (locator, azimuth_from, azimuth_to[, min_km[, max_km]])
+    # seen from the reference locator in the sector from azimuth_from clockwise to azimuth_to (degrees)
+    # With near or sector, the columns distance and azimuth from the reference locator (of sector if both) are added
+    cells = None                        # cells of the grid index which may hold the searched positions
+    if near:
+        cells = gridindex.circle_cells(reference_position(near[0]), near[1])[0]
+    if bbox:
+        cells = gridindex.box_cells(*bbox) if cells is None else np.intersect1d(cells, gridindex.box_cells(*bbox))
+    if sector:
+        found = gridindex.sector_cells(reference_position(sector[0]), *sector[1:])
+        cells = found if cells is None else np.intersect1d(cells, found)
+    conditions = []
+    parameters = []
+    if band:
+        aliases = band_aliases(band)
+        conditions.append('q.band IN (%s)' % ', '.join('?' * len(aliases)))
+        parameters += aliases
+    if min_qrb is not None:
+        conditions.append('q.qrb >= ?')
+        parameters.append(min_qrb)
+    if since:
+        conditions.append('q.utc >= ?')
+        parameters.append(since)
+    if until:
+        conditions.append('q.utc < ?')
+        parameters.append(until + ' 24:00')
+    if call:
+        conditions.append('q.call = ?')
+        parameters.append(call.upper())
+    if locator:
+        conditions.append('q.locator LIKE ?')     # uses the index, calls and locators are stored uppercase
+        parameters.append(locator.upper() + '%')
+    if station:
+        conditions.append('c.call = ?')
+        parameters.append(station.upper())
+    if cells is not None:               # uses the cell index, the cells are given in a temporary table
+        connection.execute('CREATE TEMP TABLE IF NOT EXISTS query_cells (cell INTEGER PRIMARY KEY)')
+        connection.execute('DELETE FROM query_cells')
+        connection.executemany('INSERT INTO query_cells VALUES (?)', ((cell,) for cell in cells.tolist()))
+        conditions.append('q.cell IN (SELECT cell FROM query_cells)')
+    sql = ('SELECT c.start AS contest, c.call AS station, c.locator AS station_locator, q.* '
+           'FROM qsos q JOIN contests c ON c.id = q.contest_id')
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    # +q.utc: the QSOs of the cells are sorted, instead of scanning the whole utc index
+    qsos = pd.read_sql_query(sql + (' ORDER BY +q.utc' if cells is not None else ' ORDER BY q.utc'), connection,
+                             params=parameters)
+    if cells is None:
+        return qsos
+
+    # exact positions of the QSOs of the cells
+    keep = np.ones(len(qsos), dtype=bool)
+    if bbox:
+        keep &= gridindex.in_box(qsos['lat'], qsos['lon'], *bbox)
+    for criterion in (near, sector):
+        if criterion:
+            distances, azimuths = maiden.Maiden.dist_az_array(reference_position(criterion[0]), qsos['lat'],
+                                                              qsos['lon'])
+            if criterion is near:
+                keep &= distances <= near[1]
+            else:
+                limits = list(sector[3:])
+                min_km, max_km = (limits + [0, None][len(limits):])[:2]
+                keep &= gridindex.in_sector(azimuths, sector[1], sector[2]) & (distances >= (min_km or 0))
+                if max_km is not None:
+                    keep &= distances <= max_km
+            qsos['distance'] = distances
+            qsos['azimuth'] = azimuths
+    return qsos[keep].reset_index(drop=True)
+
+
+def archived_contests(connection, qsos):
+    # Rebuilds one contestlog.Contest per contest log from query results, as if read from the EDI file
+    contests = []
+    for contest_id, rows in qsos.groupby('contest_id', sort=False):
+        start, call, locator, band, header = connection.execute(
+            'SELECT start, call, locator, band, header FROM contests WHERE id = ?', (int(contest_id),)).fetchone()
+        contest = contestlog.Contest()
+        contest.start = start
+        contest.call = call.translate({47: 45})
+        contest.locator = locator
+        contest.bandEDI = band
+        contest.bandFileName = band.replace(' ', '').replace(',', '_')
+        contest.header = json.loads(header)
+        contest.outputFilePrefix = start + '_' + contest.call + '_' + locator + '__' + contest.bandFileName
+        contest.qsoList = rows[QSO_FIELDS].rename(columns=dict(zip(QSO_FIELDS, ediparser.QSO_COLUMNS)))
+        contests.append(contest)
+    return contests
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cross-contest QSO archive of EDI2ODX')
+    commands = parser.add_subparsers(dest='command', required=True)
+    ingest = commands.add_parser('ingest', help='append EDI files to the archive')
+    ingest.add_argument('database')
+    ingest.add_argument('files', nargs='+', help='EDI files, folders, zip or tar archives, glob patterns')
+    for name, help_text in (('query', 'list the archived QSOs matching the criteria'),
+                            ('odx', 'print or write the DUBUS _DXs.txt files of the matching archived contests')):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('database')
+        command.add_argument('--band', help='PBand, e.g. "144 MHz"')
+        command.add_argument('--min-qrb', type=int, help='minimum distance in km (odx: default ODX limit of the band)')
+        command.add_argument('--since', help='first date, YYYY-MM-DD')
+        command.add_argument('--until', help='last date, YYYY-MM-DD')
+        command.add_argument('--call', help='call of the worked station')
+        command.add_argument('--locator', help='locator (or beginning of) of the worked station')
+        command.add_argument('--station', help='call of the contest station')
+        command.add_argument('--near', nargs=2, metavar=('LOCATOR', 'KM'),
+                             help='worked stations within KM km of LOCATOR')
+        command.add_argument('--bbox', nargs=4, type=float, metavar=('WEST', 'SOUTH', 'EAST', 'NORTH'),
+                             help='worked stations in this box of longitudes and latitudes (degrees)')
+        command.add_argument('--sector', nargs='+', metavar='VALUE',
+                             help='LOCATOR FROM TO [MIN_KM [MAX_KM]]: worked stations seen from LOCATOR between the '
+                                  'azimuths FROM and TO (clockwise, degrees), optionally between MIN_KM and MAX_KM km')
+    query_parser = commands.choices['query']
+    query_parser.add_argument('-o', '--output', help='write the QSOs to a CSV file instead of printing them')
+    commands.choices['odx'].add_argument('-o', '--output', metavar='FOLDER',
+                                         help='write the output files in FOLDER instead of printing the _DXs.txt text')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == 'ingest':
+        ingest_files(args.database, edisources.expand(args.files))
+        return 0
+    if args.sector is not None and not 3 <= len(args.sector) <= 5:
+        parser.error('--sector needs LOCATOR FROM TO and optionally MIN_KM and MAX_KM')
+    try:
+        near = (args.near[0], float(args.near[1])) if args.near else None
+        sector = [args.sector[0]] + [float(value) for value in args.sector[1:]] if args.sector else None
+        for criterion in (near, sector):
+            if criterion:
+                reference_position(criterion[0])
+    except ValueError as error:
+        parser.error(str(error))
+    connection = connect(args.database)
+    criteria = dict(band=args.band, since=args.since, until=args.until, call=args.call,
+                    locator=args.locator, station=args.station, near=near, bbox=args.bbox, sector=sector)
+    if args.command == 'odx':
+        import edi2odx  # in local folder, ODX selection and output files (only here: edi2odx imports this module)
+        edi2odx.write_archived_odx_files(connection, min_qrb=args.min_qrb, output=args.output, **criteria)
+        return 0
+    qsos = query(connection, min_qrb=args.min_qrb, **criteria)
+    columns = ['contest', 'station', 'station_locator', 'band', 'utc', 'call', 'mode', 'locator', 'qrb']
+    columns += [name for name in ('distance', 'azimuth') if name in qsos]
+    if args.output:
+        qsos[columns].to_csv(args.output, index=False)
+    else:
+        print(qsos[columns].to_string(index=False))
+    logging.info('%s QSOs', len(qsos))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
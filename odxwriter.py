@@ -0,0 +1,257 @@
+# Output files of EDI2ODX: DUBUS txt, xlsx, CSV, JSON and ADIF, for the ODX QSOs and for the full log
+# Part of EDI2ODX, project hosted on https://github.com/HB9DTX/EDI2ODX
+#
+# All the requested formats are written in a single pass over the QSO rows: each row is formatted once
+# and handed to one writer per format, through buffered files (xlsx: openpyxl write-only workbook).
+# Formats of the ODX QSOs: txt (DUBUS report), xlsx, csv, json, adif
+# Formats of the full log: log_csv, log_json, log_adif
+
+import csv
+import io
+import json
+
+import contestlog   # in local folder
+import ediparser    # in local folder
+
+# output format: suffix of the output file name (after the common prefix of the contest)
+OUTPUT_FILES = {'txt': '_DXs.txt',
+                'xlsx': '_DXs.xlsx',
+                'csv': '_DXs.csv',
+                'json': '_DXs.json',
+                'adif': '_DXs.adi',
+                'log_csv': '_log.csv',
+                'log_json': '_log.json',
+                'log_adif': '_log.adi'}
+ODX_FORMATS = ('txt', 'xlsx', 'csv', 'json', 'adif')
+LOG_FORMATS = ('log_csv', 'log_json', 'log_adif')
+BUFFER_SIZE = 1 << 16
+
+# ADIF band names of the EDI PBand values (see contestlog.WAVELENGTHS)
+ADIF_BANDS = {'50 MHz': '6m', '144 MHz': '2m', '145 MHz': '2m', '432 MHz': '70cm', '435 MHz': '70cm',
+              '1,3 GHz': '23cm', '2,3 GHz': '13cm', '3,4 GHz': '9cm', '5,7 GHz': '6cm', '10 GHz': '3cm',
+              '24 GHz': '1.25cm'}
+# ADIF modes of the EDI mode codes (sent mode of the mixed-mode codes)
+ADIF_MODES = {1: 'SSB', 2: 'CW', 3: 'SSB', 4: 'CW', 5: 'AM', 6: 'FM', 7: 'RTTY', 8: 'SSTV', 9: 'ATV'}
+ADIF_VERSION = '3.1.4'
+# ADIF field: QSO column of the full log
+ADIF_LOG_FIELDS = (('RST_SENT', 'SENT_RST'), ('STX', 'SENT_NR'), ('RST_RCVD', 'RECEIVED_RST'),
+                   ('SRX', 'RECEIVED_NUMBER'), ('SRX_STRING', 'EXCHANGE'), ('COMMENT', 'REMARK'))
+
+
+def _encoded(values, encode):
+    # encode() of each value of a column, computed once per distinct value (calls, locators, modes repeat a lot)
+    cache = {}
+    return [cache[value] if value in cache else cache.setdefault(value, encode(value)) for value in values]
+
+
+def _remark(table):
+    # ('REMARK',) if the table has a REMARK column (cross-checked log, see crosscheck.py), else ()
+    return ('REMARK',) if 'REMARK' in table else ()
+
+
+class _TextWriter:
+    # DUBUS report: header lines, then DATE TIME CALL LOCATOR QRB MOD (REMARK) separated by tabs
+    def __init__(self, stream, contest, wavelength):
+        self.columns = ('DATE', 'TIME', 'CALL', 'LOCATOR', 'QRB_KM', 'MOD') + _remark(contest.qsoDx)
+        stream.write(contest.call + ' (' + contest.locator + ') wkd ' + wavelength
+                     + ' with QRB > ' + str(contest.minDistance) + ' km:\n')
+        stream.write('DATE\tTIME\tCALL\tLOCATOR\tQRB/MOD' + ''.join('\t' + name for name in _remark(contest.qsoDx))
+                     + '\n')   # no time between QSB and MOD ==> manual header write
+        # stream.write('DATE\t\tTIME\tCALL\tLOCATOR\tQRB\t\tMOD\n')   # align header with QSO list,
+        # but less optimal for DG7SFL for integration into DUBUS
+        self.write = csv.writer(stream, delimiter='\t', lineterminator='\n').writerow
+
+    def prepare(self, columns):
+        return columns
+
+    def close(self):
+        pass
+
+
+class _ExcelWriter(_TextWriter):
+    # Same columns as the DUBUS report, in a write-only (streamed) workbook, REQUIRES openpyxl
+    def __init__(self, stream, contest, wavelength):
+        import openpyxl
+        self.stream = stream
+        self.workbook = openpyxl.Workbook(write_only=True)
+        sheet = self.workbook.create_sheet('Sheet1')
+        self.columns = ('DATE', 'TIME', 'CALL', 'LOCATOR', 'QRB_KM', 'MOD') + _remark(contest.qsoDx)
+        sheet.append(['DATE', 'TIME', 'CALL', 'LOCATOR', 'QRB', 'MOD'] + list(_remark(contest.qsoDx)))
+        self.write = sheet.append
+
+    def close(self):
+        self.workbook.save(self.stream)
+
+
+class _CsvWriter(_TextWriter):
+    # Machine-readable table: UTC time (ISO 8601), numerical QRB and EDI mode code
+    def __init__(self, stream, contest, wavelength, columns):
+        self.columns = ('UTC',) + tuple(columns)
+        self.write = csv.writer(stream, lineterminator='\n').writerow
+        self.write(self.columns)
+
+
+class _JsonWriter:
+    # {"call", "locator", "band", ..., "qsos": [{"utc": ..., "call": ..., ...}, ...]}, written row by row
+    def __init__(self, stream, contest, wavelength, columns):
+        self.stream = stream
+        self.columns = ('UTC',) + tuple(columns)
+        self.separator = '\n{'
+        header = {'call': (contest.header or {}).get('PCall', contest.call), 'locator': contest.locator,
+                  'band': contest.bandEDI, 'wavelength': wavelength, 'start': contest.start,
+                  'min_qrb': contest.minDistance}
+        stream.write(json.dumps(header)[:-1] + ', "qsos": [')
+
+    def prepare(self, columns):
+        # '"name": value' items of each column
+        return [_encoded(values, lambda value, key='"%s": ' % name.lower(): key + json.dumps(value))
+                for name, values in zip(self.columns, columns)]
+
+    def write(self, items):
+        self.stream.write(self.separator + ', '.join(items) + '}')
+        self.separator = ',\n{'
+
+    def close(self):
+        self.stream.write('\n]}\n')
+
+
+def _adif_field(name, value):
+    # <NAME:length>value, empty if no value
+    if value is None or value == '':
+        return ''
+    value = str(value)
+    return '<%s:%d>%s ' % (name, len(value), value)
+
+
+class _AdifWriter:
+    # ADIF records (https://adif.org), the contest station is the STATION_CALLSIGN
+    def __init__(self, stream, contest, wavelength, fields):
+        self.stream = stream
+        self.fields = [name for name, _ in fields]
+        self.columns = ('CALL', 'UTC', 'MODE', 'LOCATOR', 'QRB') + tuple(column for _, column in fields)
+        self.station = ''.join(_adif_field(name, value) for name, value in (
+            ('BAND', ADIF_BANDS.get(contest.bandEDI)),
+            ('STATION_CALLSIGN', (contest.header or {}).get('PCall', contest.call)),
+            ('MY_GRIDSQUARE', contest.locator))) + '<EOR>\n'
+        stream.write('EDI2ODX export of %s\n' % contest.outputFilePrefix)
+        stream.write(_adif_field('ADIF_VER', ADIF_VERSION) + _adif_field('PROGRAMID', 'EDI2ODX') + '\n<EOH>\n')
+
+    def prepare(self, columns):
+        # ADIF fields of each column
+        call, utc, mode, locator, qrb = columns[:5]
+        return [_encoded(call, lambda value: _adif_field('CALL', value)),
+                _encoded(utc, lambda value: _adif_field('QSO_DATE', value and value[0:4] + value[5:7] + value[8:10])
+                         + _adif_field('TIME_ON', value and value[11:13] + value[14:16])),
+                _encoded(mode, lambda value: _adif_field('MODE', ADIF_MODES.get(value))),
+                _encoded(locator, lambda value: _adif_field('GRIDSQUARE', value)),
+                _encoded(qrb, lambda value: _adif_field('DISTANCE', value))] + \
+            [_encoded(values, lambda value, name=name: _adif_field(name, value))
+             for name, values in zip(self.fields, columns[5:])]
+
+    def write(self, fields):
+        self.stream.write(''.join(fields) + self.station)
+
+    def close(self):
+        pass
+
+
+def _values(column):
+    # Plain python values of a table column, None where missing (nullable integer columns hold pd.NA
+    # for the empty EDI fields, their dtype kind is also 'i' or 'u')
+    if column.dtype.kind in 'iub' and not column.hasnans:
+        return column.tolist()
+    values = column.astype(object)
+    return values.where(values.notna(), None).tolist()
+
+
+def _odx_columns(contest, names):
+    # Columns (lists) of the ODX QSOs: DUBUS columns of contest.qsoDx (QRB_KM: QRB column, e.g. '843 km')
+    # and the raw values of the log (QRB, MODE), UTC: time of the QSOs as ISO 8601 string
+    qsos = None
+    columns = {}
+    for name in names:
+        if name == 'UTC' or name in ('QRB', 'MODE'):
+            if qsos is None:
+                qsos = contest.qsoList.loc[contest.qsoDx.index]
+            columns[name] = _iso_times(qsos) if name == 'UTC' else _values(qsos[name])
+        else:
+            columns[name] = _values(contest.qsoDx['QRB' if name == 'QRB_KM' else name])
+    return columns
+
+
+def _log_columns(contest, names):
+    # Columns (lists) of all the QSOs of the log, UTC: time of the QSOs as ISO 8601 string
+    return {name: _iso_times(contest.qsoList) if name == 'UTC' else _values(contest.qsoList[name]) for name in names}
+
+
+def _iso_times(qsos):
+    # UTC time of the QSOs as ISO 8601 strings YYYY-MM-DDTHH:MMZ (None if the date or time is not valid)
+    dates, times = contestlog.format_timestamps(contestlog.qso_timestamps(qsos))
+    return [date + 'T' + time + 'Z' if date else None for date, time in zip(dates, times)]
+
+
+def _open(target, binary, opened):
+    # File object for a target (file name or file object), files opened here are added to opened
+    if not isinstance(target, (str, bytes)) and hasattr(target, 'write'):
+        return target
+    stream = open(target, 'wb' if binary else 'w', buffering=BUFFER_SIZE, **({} if binary else {'newline': ''}))
+    opened.append(stream)
+    return stream
+
+
+def write_outputs(contest, formats, wavelength, targets=None):
+    # Writes the output files of a contest (contest.qsoDx selected) in the requested formats (OUTPUT_FILES)
+    # wavelength: band name of the DUBUS header (e.g. '2 m')
+    # targets: {format: file name or file object}, default: <contest.outputFilePrefix><suffix of the format>
+    # (text formats: text file object, xlsx: binary file object)
+    targets = targets or {}
+    unknown = set(formats) - set(OUTPUT_FILES)
+    if unknown:
+        raise ValueError('unknown output format(s): %s' % ', '.join(sorted(unknown)))
+    log_columns = [name for name in ediparser.QSO_COLUMNS if name in contest.qsoList] + list(_remark(contest.qsoList))
+    odx_remark = list(_remark(contest.qsoDx))
+    log_fields = tuple((name, column) for name, column in ADIF_LOG_FIELDS if column in log_columns)
+    classes = {'txt': (_TextWriter, ()), 'xlsx': (_ExcelWriter, ()),
+               'csv': (_CsvWriter, (['DATE', 'TIME', 'CALL', 'LOCATOR', 'QRB', 'MODE', 'MOD'] + odx_remark,)),
+               'json': (_JsonWriter, (['CALL', 'LOCATOR', 'QRB', 'MODE', 'MOD'] + odx_remark,)),
+               'adif': (_AdifWriter, (tuple(('COMMENT', name) for name in odx_remark),)),
+               'log_csv': (_CsvWriter, (log_columns,)),
+               'log_json': (_JsonWriter, (log_columns,)),
+               'log_adif': (_AdifWriter, (log_fields,))}
+    opened = []
+    try:
+        for group, columns_of in ((ODX_FORMATS, _odx_columns), (LOG_FORMATS, _log_columns)):
+            writers = []
+            for output_format in group:
+                if output_format in formats:
+                    target = targets.get(output_format, contest.outputFilePrefix + OUTPUT_FILES[output_format])
+                    stream = _open(target, output_format == 'xlsx', opened)
+                    writer_class, args = classes[output_format]
+                    writers.append(writer_class(stream, contest, wavelength, *args))
+            if not writers:
+                continue
+            names = list(dict.fromkeys(name for writer in writers for name in writer.columns))
+            columns = columns_of(contest, names)
+            # the columns of each writer, encoded by the writer, are zipped together:
+            # single pass over the rows for all the formats
+            prepared = []
+            outputs = []
+            for writer in writers:
+                own = writer.prepare([columns[name] for name in writer.columns])
+                outputs.append((writer.write, slice(len(prepared), len(prepared) + len(own))))
+                prepared += own
+            for row in zip(*prepared):
+                for write, own in outputs:
+                    write(row[own])
+            for writer in writers:
+                writer.close()
+    finally:
+        for stream in opened:
+            stream.close()
+
+
+def write_to_memory(contest, formats, wavelength):
+    # Same as write_outputs, returns {format: content} (str, bytes for xlsx) instead of writing files
+    targets = {output_format: io.BytesIO() if output_format == 'xlsx' else io.StringIO() for output_format in formats}
+    write_outputs(contest, formats, wavelength, targets)
+    return {output_format: target.getvalue() for output_format, target in targets.items()}
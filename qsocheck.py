@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# Check of the QSOs of EDI logs: logged QRB against the locators, invalid locators, dupes
+# Part of EDI2ODX, project hosted on https://github.com/HB9DTX/EDI2ODX
+#
+# Flags of a QSO (CHECK column of contest.qsoList with edi2odx.py --check, several flags joined with '+'):
+#   locator   the locator of the worked station is missing or not valid (it would be drawn at the home position)
+#   qrb       the logged QRB differs from the distance computed from the locators by more than the tolerance
+#             (QRB_TOLERANCE_KM, or QRB_TOLERANCE_PERCENT of the distance if larger)
+#   dupe      marked as duplicate by the logging program (DUPE field), or call already logged in the log
+# If most QSOs of a log fail the QRB check, the home locator of the log (PWWLo) is probably wrong: 'suspect'.
+# The checks work on whole columns and the locators are decoded once per distinct (home, locator) pair,
+# so that all the QSOs of an archive are checked in one pass.
+#
+# Usage examples:
+#   python3 qsocheck.py *.edi                 (report per log, -v: each flagged QSO)
+#   python3 qsocheck.py --archive qsos.db     (all the logs of the QSO archive, see odxarchive.py)
+
+import argparse
+import logging
+import sys
+
+import numpy as np
+import pandas as pd
+
+import maiden       # in local folder
+import contestlog   # in local folder
+import edisources   # in local folder
+
+FLAGS = ('locator', 'qrb', 'dupe')
+# CHECK value of each combination of flags, index: bit i set for FLAGS[i]
+LABELS = ['+'.join(flag for bit, flag in enumerate(FLAGS) if code >> bit & 1) for code in range(1 << len(FLAGS))]
+HOME_SUSPECT_SHARE = 0.5        # home locator suspect if more than this share of the QSOs fail the QRB check
+HOME_SUSPECT_MIN_QSOS = 5       # ...out of at least this number of QSOs
+CHECK_COLUMNS = ['DATE', 'TIME', 'CALL', 'MODE', 'LOCATOR', 'QRB', 'DUPE']      # columns read for the check
+QRB_TOLERANCE_KM = 5            # default tolerances of the QRB check (edi2odx.py passes its own settings)
+QRB_TOLERANCE_PERCENT = 2.0
+
+
+def _per_value(column, function, missing):
+    # Array of function() of each value of a column, computed once per distinct value, missing for missing values
+    values = pd.Categorical(column)
+    return np.array([function(value) for value in values.categories.tolist()] + [missing])[values.codes]
+
+
+def qso_flags(qsos, homes, logs=None, tolerance_km=QRB_TOLERANCE_KM, tolerance_percent=QRB_TOLERANCE_PERCENT):
+    # Flags (bit i: FLAGS[i]) and distance computed from the locators (NaN if unknown) of each QSO, as arrays
+    # qsos: QSO table (LOCATOR, QRB, CALL and optionally DUPE columns)
+    # homes: locator of the contest station, one for all the QSOs or one per QSO
+    # logs: log of each QSO (dupes are looked for within each log), None: all the QSOs are of the same log
+    # tolerance_km, tolerance_percent: logged QRB accepted if it differs from the distance by up to tolerance_km,
+    # or tolerance_percent % of the distance if larger
+    mhl = maiden.Maiden()
+    count = len(qsos)
+    if homes is None or isinstance(homes, str):
+        homes = np.full(count, homes or '', dtype=object)
+    locators = pd.Categorical(qsos['LOCATOR'])
+    names = np.append([''], locators.categories.astype(str).to_numpy(dtype=object))  # index: code + 1, '': missing
+
+    # locators decoded and distances computed per home locator, for the locators logged from it only
+    invalid = np.ones(count, dtype=bool)
+    distances = np.full(count, np.nan)
+    home_codes, home_locators = pd.factorize(np.asarray(homes, dtype=object))
+    for code, rows in pd.Series(home_codes).groupby(home_codes).indices.items():
+        home = home_locators[code].strip() if code >= 0 and isinstance(home_locators[code], str) else ''
+        position = mhl.maiden2latlon(home) if home else (None, None)
+        codes = locators.codes[rows] + 1
+        used = np.flatnonzero(np.bincount(codes, minlength=len(names)))
+        index = np.zeros(len(names), dtype=np.int64)
+        index[used] = np.arange(len(used))
+        if position[0] is None:         # invalid home locator: QRB not checked
+            latitudes = mhl.maiden2latlon_array(names[used])[0]
+            results = np.full(len(used), np.nan)
+        else:
+            latitudes, _, results, _ = mhl.dist_az_locators(position, names[used])
+        invalid[rows] = np.isnan(latitudes)[index[codes]]
+        distances[rows] = results[index[codes]]
+
+    qrb = qsos['QRB'].to_numpy(dtype=np.float64, na_value=np.nan)
+    tolerance = np.maximum(tolerance_km, distances * tolerance_percent / 100)
+    with np.errstate(invalid='ignore'):
+        bad_qrb = ~invalid & (np.abs(qrb - distances) > tolerance)     # False where the distance is NaN
+
+    calls = _per_value(qsos['CALL'], lambda call: str(call).strip().upper(), '')
+    keys = pd.DataFrame({'log': 0 if logs is None else np.asarray(logs), 'call': calls})
+    dupe = keys.duplicated().to_numpy() & (calls != '')
+    if 'DUPE' in qsos:
+        dupe |= _per_value(qsos['DUPE'], lambda value: bool(str(value).strip()), False).astype(bool)
+    flags = invalid.astype(np.int8) | bad_qrb.astype(np.int8) << 1 | dupe.astype(np.int8) << 2
+    return flags, distances
+
+
+def report(flags, distances):
+    # Summary of the check of one log: number of QSOs, of flagged QSOs and of each flag,
+    # home: 'invalid' (the home locator is not valid), 'suspect' (most QSOs fail the QRB check) or ''
+    located = flags & 1 == 0
+    checked = located & ~np.isnan(distances)
+    bad_qrb = np.count_nonzero(flags[checked] & 2)
+    result = {'qsos': len(flags), 'flagged': int(np.count_nonzero(flags))}
+    result.update({flag: int(np.count_nonzero(flags >> bit & 1)) for bit, flag in enumerate(FLAGS)})
+    result['home'] = ''
+    if located.any() and not checked.any():
+        result['home'] = 'invalid'
+    elif checked.sum() >= HOME_SUSPECT_MIN_QSOS and bad_qrb > HOME_SUSPECT_SHARE * checked.sum():
+        result['home'] = 'suspect'
+    return result
+
+
+def summary(result):
+    # One line text of a report
+    text = '%s QSOs, %s flagged' % (result['qsos'], result['flagged'])
+    if result['flagged']:
+        text += ' (%s)' % ', '.join('%s %s' % (result[flag], flag) for flag in FLAGS if result[flag])
+    if result['home']:
+        text += ', home locator %s' % result['home']
+    return text
+
+
+def check_contest(contest, output=None, tolerance_km=QRB_TOLERANCE_KM, tolerance_percent=QRB_TOLERANCE_PERCENT):
+    # Checks the QSOs of a contest log (contestlog.Contest): sets the CHECK column of contest.qsoList (see LABELS),
+    # writes the flagged QSOs to output (CSV file name or text file object) if given, returns the report
+    # tolerance_km, tolerance_percent: tolerances of the QRB check, see qso_flags
+    qsos = contest.qsoList
+    flags, distances = qso_flags(qsos, contest.locator, None, tolerance_km, tolerance_percent)
+    qsos['CHECK'] = pd.Categorical.from_codes(flags, LABELS)
+    result = report(flags, distances)
+    if result['flagged']:
+        logging.warning('Check of the QSOs: %s', summary(result))
+    else:
+        logging.info('Check of the QSOs: %s', summary(result))
+    if result['home']:
+        logging.warning('Home locator %s (PWWLo) is %s', contest.locator,
+                        'not valid' if result['home'] == 'invalid' else 'probably wrong: most QSOs fail the QRB check')
+    if output is not None:
+        flagged = flags != 0
+        table = qsos.loc[flagged, [name for name in ('DATE', 'TIME', 'CALL', 'LOCATOR', 'QRB') if name in qsos]]
+        table.insert(table.shape[1], 'KM', pd.array(np.rint(distances[flagged]), dtype='Int64'))
+        table.insert(table.shape[1], 'CHECK', qsos.loc[flagged, 'CHECK'])
+        table.to_csv(output, index=False)
+    return result
+
+
+def check_files(filenames, tolerance_km=QRB_TOLERANCE_KM, tolerance_percent=QRB_TOLERANCE_PERCENT):
+    # Reads and checks EDI files (paths or edisources.EdiSource), returns a list of (name, Contest, report),
+    # the files which could not be read are logged and left out
+    results = []
+    for source in map(edisources.as_source, filenames):
+        contest = contestlog.Contest()
+        try:
+            contestlog.read_edi_file(source, contest, CHECK_COLUMNS)
+        except (OSError, ValueError) as error:
+            logging.error('%s not checked: %s', source.name, error)
+            continue
+        results.append((source.name, contest, check_contest(contest, None, tolerance_km, tolerance_percent)))
+    return results
+
+
+def check_archive(connection, tolerance_km=QRB_TOLERANCE_KM, tolerance_percent=QRB_TOLERANCE_PERCENT, **criteria):
+    # Checks the archived QSOs (see odxarchive.py) matching the criteria of odxarchive.query in one pass,
+    # returns the QSOs with their CHECK and KM columns and the list of the reports of the contest logs
+    import odxarchive   # in local folder
+    qsos = odxarchive.query(connection, **criteria)
+    columns = qsos.rename(columns=str.upper)
+    flags, distances = qso_flags(columns, qsos['station_locator'].to_numpy(dtype=object),
+                                 qsos['contest_id'].to_numpy(), tolerance_km, tolerance_percent)
+    qsos['check'] = pd.Categorical.from_codes(flags, LABELS)
+    qsos['km'] = pd.array(np.rint(distances), dtype='Int64')
+    reports = []
+    for rows in qsos.groupby('contest_id', sort=False).indices.values():
+        first = qsos.iloc[rows[0]]
+        reports.append(dict(contest=first['contest'], station=first['station'], band=first['band'],
+                            home_locator=first['station_locator'], **report(flags[rows], distances[rows])))
+    return qsos, reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check of the QSOs of EDI logs (logged QRB, locators, dupes)')
+    parser.add_argument('files', nargs='*', help='EDI files, folders, zip or tar archives, glob patterns')
+    parser.add_argument('--archive', metavar='DATABASE', help='check all the logs of this QSO archive')
+    parser.add_argument('--tolerance-km', type=float, default=QRB_TOLERANCE_KM,
+                        help='QRB tolerance in km (default: %(default)s)')
+    parser.add_argument('--tolerance-percent', type=float, default=QRB_TOLERANCE_PERCENT,
+                        help='QRB tolerance in %% of the distance (default: %(default)s)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='list each flagged QSO')
+    args = parser.parse_args()
+    if not args.files and not args.archive:
+        parser.error('no EDI file nor archive to check')
+    logging.basicConfig(level=logging.WARNING)
+
+    for name, contest, result in check_files(edisources.expand(args.files), args.tolerance_km, args.tolerance_percent):
+        print('%s: %s' % (name, summary(result)))
+        if args.verbose and result['flagged']:
+            qsos = contest.qsoList
+            print(qsos[qsos['CHECK'] != ''].to_string())
+    if args.archive:
+        import odxarchive
+        connection = odxarchive.connect(args.archive)
+        qsos, reports = check_archive(connection, args.tolerance_km, args.tolerance_percent)
+        connection.close()
+        for result in reports:
+            print('%s %s %s: %s' % (result['contest'], result['station'], result['band'], summary(result)))
+        if args.verbose:
+            columns = ['contest', 'station', 'station_locator', 'utc', 'call', 'locator', 'qrb', 'km', 'check']
+            print(qsos.loc[qsos['check'] != '', columns].to_string(index=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,5 @@
+# Test configuration of EDI2ODX: the modules of the project are in the parent folder
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,36 @@
+# Cross-check of the QSOs of several logs (crosscheck.py)
+
+import crosscheck   # in local folder
+import contestlog   # in local folder
+
+
+def _contest(call, locator, records):
+    contest = contestlog.Contest()
+    lines = ['[REG1TEST;1]', 'TDate=20230506;20230507', 'PCall=' + call, 'PWWLo=' + locator, 'PBand=144 MHz',
+             '[QSORecords;%s]' % len(records)]
+    contestlog.read_edi_lines([line + '\n' for line in lines + records], contest, crosscheck.CROSSCHECK_COLUMNS)
+    return contest
+
+
+def test_exact_match():
+    home = _contest('HB9XC', 'JN36BK', ['230506;1400;F1ZZZ;1;59;001;59;001;;IN88AB;700;;;;',
+                                        '230506;1410;F1YYY;2;59;002;59;001;;IN88AB;700;;;;',
+                                        '230506;1420;F1XXX;1;59;003;59;001;;IN88AA;700;;;;'])
+    others = [_contest('F1ZZZ', 'IN88AB', ['230506;1401;HB9XC;1;59;001;59;001;;JN36BK;700;;;;']),
+              _contest('F1YYY', 'IN88AB', ['230506;1410;HB9XC;1;59;001;59;002;;JN36BK;700;;;;']),
+              _contest('F1XXX', 'IN88AB', ['230506;1420;HB9XC;1;59;001;59;003;;JN36BK;700;;;;'])]
+    statuses = crosscheck.crosscheck([home] + others)[0]
+    assert list(statuses) == [crosscheck.CONFIRMED, crosscheck.BAD_MODE, crosscheck.BAD_LOCATOR]
+
+
+def test_busted_call_of_the_other_log():
+    # the worked station logged a busted call of this station: locator and mode are still checked
+    home = _contest('HB9XC', 'JN36BK', ['230506;1400;F1ZZZ;1;59;001;59;001;;IN88AA;700;;;;',
+                                        '230506;1410;F1YYY;2;59;002;59;001;;IN88AB;700;;;;',
+                                        '230506;1420;F1XXX;1;59;003;59;001;;IN88AB;700;;;;'])
+    others = [_contest('F1ZZZ', 'IN88AB', ['230506;1401;HB9XD;1;59;001;59;001;;JN36BK;700;;;;']),
+              _contest('F1YYY', 'IN88AB', ['230506;1410;HB9XC/P;1;59;001;59;002;;JN36BK;700;;;;']),
+              _contest('F1XXX', 'IN88AB', ['230506;1420;HB8XC;1;59;001;59;003;;JN36BK;700;;;;'])]
+    statuses = crosscheck.crosscheck([home] + others)
+    assert list(statuses[0]) == [crosscheck.BAD_LOCATOR, crosscheck.BAD_MODE, crosscheck.CONFIRMED]
+    assert list(statuses[1]) == [crosscheck.BAD_CALL]
@@ -0,0 +1,102 @@
+# EDI parser (ediparser.py): header, QSO records, lines which are not QSO records, chunked reading
+
+import logging
+
+import pandas as pd
+import pytest
+
+import contestlog   # in local folder
+import ediparser    # in local folder
+
+HEADER = ['[REG1TEST;1]', 'TName=Test contest', 'TDate=20230506;20230507', 'PCall=HB9XC/P', 'PWWLo=JN36BK',
+          'PBand=144 MHz', '[Remarks]', 'free text; with = signs', '[QSORecords;%s]']
+RECORDS = ['230506;1400;DL1ABC;1;59;001;59;011;;JN47AA;250;;N;;',
+           '230506;1401;F6XYZ;2;599;002;599;012;;JN25AA;;;;;',        # empty QRB
+           '230506;1402;OK1KIR;6;;003;;013;;JO60LJ;650;;N;;',          # empty RSTs
+           '230506;1403;I2ABC;;59;004;59;014;;JN45AA;310;;;;D']         # empty mode, dupe
+GARBAGE = ['230506;1404;DL2ABC;1;59;005;59;015;;JN47AA',                # truncated
+           '2305061;1405;DL3ABC;1;59;006;59;016;;JN47AA;250;;;;',       # bad date
+           '230506;14x5;DL3ABC;1;59;006;59;016;;JN47AA;250;;;;',        # bad time
+           '230506;1406;DL4ABC;1;5²;007;59;017;;JN47AA;250;;;;',   # non-ASCII digit
+           '230506;1407;DL5ABC;1;59;008;59;018;;JN47AA;99999999999999999999999;;;;',    # too long number
+           '230506;1408;DL6ABC;1;59;009;59;019;;JN47AA;250;;;;;extra',  # extra field
+           'IDENT;Tucnak;4.36']                                         # footer of Tucnak
+FOOTER = ['[END;Tucnak 4.36]']
+
+
+def _reader(records, declared=None, newline='\n'):
+    lines = HEADER[:-1] + [HEADER[-1] % (len(records) if declared is None else declared)] + records
+    return ediparser.EdiReader([line + newline for line in lines])
+
+
+def test_header():
+    reader = _reader(RECORDS)
+    header = reader.read_header()
+    assert header['PCall'] == 'HB9XC/P' and header['PBand'] == '144 MHz' and header['TDate'] == '20230506;20230507'
+    assert reader.remarks == ['free text; with = signs']
+    assert reader.declaredQsos == 4
+    assert reader.lineNumber == len(HEADER)
+
+
+def test_not_an_edi_file():
+    with pytest.raises(ediparser.EdiFormatError):
+        ediparser.EdiReader(['some text\n', 'PCall=HB9XC\n']).read_header()
+
+
+@pytest.mark.parametrize('newline', ['\n', '\r\n'])
+def test_records(newline):
+    reader = _reader(RECORDS, newline=newline)
+    columns = next(reader.read_chunks())
+    assert columns['CALL'] == ['DL1ABC', 'F6XYZ', 'OK1KIR', 'I2ABC']
+    assert columns['QRB'] == [250, None, 650, 310]
+    assert columns['SENT_RST'] == [59, 599, None, 59]
+    assert columns['MODE'] == [1, 2, 6, None]
+    assert columns['DUPE'] == ['', '', '', 'D']
+    assert reader.qsoCount == 4 and not reader.rejected
+
+
+def test_garbage_lines_and_footer():
+    lines = RECORDS[:2] + GARBAGE + RECORDS[2:] + FOOTER + ['']
+    reader = _reader(lines, declared=4)
+    columns = next(reader.read_chunks(['CALL', 'QRB']))
+    assert list(columns) == ['CALL', 'QRB']
+    assert columns['CALL'] == ['DL1ABC', 'F6XYZ', 'OK1KIR', 'I2ABC']
+    first = len(HEADER) + 3
+    assert reader.rejected == [(first + number, line) for number, line in enumerate(GARBAGE)] \
+        + [(first + len(GARBAGE) + 2, FOOTER[0])]
+    assert reader.qsoCount == reader.declaredQsos == 4
+
+
+def test_qso_count_mismatch(caplog):
+    contest = contestlog.Contest()
+    with caplog.at_level(logging.WARNING):
+        contestlog.read_edi_lines([line + '\n' for line in HEADER[:-1] + [HEADER[-1] % 6] + RECORDS + FOOTER],
+                               contest)
+    assert len(contest.qsoList) == 4
+    assert contest.rejectedLines == [(len(HEADER) + 5, FOOTER[0])]
+    assert '6 QSO records announced in header, 4 read' in caplog.text
+    assert '1 line(s) of EDI log are not QSO records' in caplog.text
+
+
+def test_empty_log():
+    reader = _reader([])
+    assert list(reader.read_chunks(['CALL'])) == [{'CALL': []}]
+    contest = contestlog.Contest()
+    contestlog.read_edi_lines([line + '\n' for line in HEADER[:-1] + [HEADER[-1] % 0]], contest)
+    assert len(contest.qsoList) == 0 and contest.call == 'HB9XC-P'
+
+
+@pytest.mark.parametrize('size', [1, 3, 4, 1000])
+def test_chunks(size):
+    records = [RECORDS[number % 4].replace('DL1ABC', 'DL%sABC' % number) for number in range(10)] + GARBAGE
+    chunks = list(_reader(records).read_chunks(size=size))
+    assert [len(chunk['CALL']) for chunk in chunks] == [min(size, 10 - start) for start in range(0, 10, size)]
+    whole = next(_reader(records).read_chunks())
+    assert {name: sum((chunk[name] for chunk in chunks), []) for name in whole} == whole
+    pd.testing.assert_frame_equal(contestlog.qso_table(iter(chunks)), contestlog.qso_table(iter([whole])))
+
+
+def test_no_columns():
+    reader = _reader(RECORDS + GARBAGE)
+    assert list(reader.read_chunks([], size=3)) == [{}, {}]
+    assert reader.qsoCount == 4 and len(reader.rejected) == len(GARBAGE)
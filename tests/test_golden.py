@@ -0,0 +1,57 @@
+# Output of the DUBUS txt, xlsx and csv writers against golden files
+# tests/data/golden_DXs.txt, golden_extendedmodes_DXs.txt and golden_DXs.xlsx were written by the edi2odx.py of
+# the first version (EXTENDEDMODES: its commented-out 'f'/'m' MOD variant) from tests/data/golden.edi
+# golden_sortbyqrb_DXs.txt: the same QSOs by decreasing numerical QRB (the first version compared the 'xxx km' strings)
+# golden_DXs.csv: CSV export of the same QSOs, format added later (UTC time, numerical QRB and EDI mode code)
+
+import io
+import os
+import shutil
+
+import pytest
+
+import edi2odx      # in local folder
+
+DATA = os.path.join(os.path.dirname(__file__), 'data')
+PREFIX = '20221001_HB9XC-P_JN36BK__432MHz'
+
+
+def _golden(name, mode='r'):
+    with open(os.path.join(DATA, name), mode, **({} if 'b' in mode else {'newline': ''})) as goldenFile:
+        return goldenFile.read()
+
+
+def _outputs(formats, **settings):
+    settings = dict(settings, OUTPUT_FORMATS=formats)
+    return edi2odx.process_edi(_golden('golden.edi'), settings=settings, images=False)['outputs']
+
+
+@pytest.mark.parametrize('settings, golden', [({}, 'golden_DXs.txt'),
+                                              ({'SORTBYQRB': True}, 'golden_sortbyqrb_DXs.txt'),
+                                              ({'EXTENDEDMODES': True}, 'golden_extendedmodes_DXs.txt')])
+def test_txt(settings, golden):
+    assert _outputs(['txt'], **settings)['txt'] == _golden(golden)
+
+
+def test_csv():
+    assert _outputs(['csv'])['csv'] == _golden('golden_DXs.csv')
+
+
+def test_xlsx():
+    openpyxl = pytest.importorskip('openpyxl')
+    written = openpyxl.load_workbook(io.BytesIO(_outputs(['xlsx'])['xlsx'])).active
+    golden = openpyxl.load_workbook(os.path.join(DATA, 'golden_DXs.xlsx')).active
+    assert list(written.values) == list(golden.values)
+
+
+def test_files(tmp_path, monkeypatch):
+    # same bytes through the output files of a normal run
+    shutil.copy(os.path.join(DATA, 'golden.edi'), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    for name, value in (('STATSMAP', False), ('OUTPUT_FORMATS', ['txt', 'csv']), ('EXCELOUTPUT', False),
+                        ('CHECK_QSOS', False), ('ARCHIVE_DB', None)):
+        monkeypatch.setattr(edi2odx, name, value)
+    edi2odx.process_file('golden.edi')
+    for suffix in ('_DXs.txt', '_DXs.csv'):
+        with open(PREFIX + suffix, 'rb') as outputFile:
+            assert outputFile.read() == _golden('golden' + suffix, 'rb')
@@ -0,0 +1,121 @@
+# Live mode (edi2odx.py --follow): LogFollower reading a growing log, LiveLog accumulating its QSOs
+
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import benchmark    # in local folder
+import contestlog   # in local folder
+import edi2odx      # in local folder
+import livelog      # in local folder
+
+
+@pytest.fixture
+def log_lines(tmp_path):
+    # Header lines and QSO record lines of a synthetic log of 300 QSOs
+    benchmark.generate_edi(str(tmp_path / 'full.edi'), 300, band='432 MHz')
+    with open(tmp_path / 'full.edi', newline='') as ediFile:
+        lines = ediFile.readlines()
+    first = lines.index(next(line for line in lines if line.startswith('[QSORecords'))) + 1
+    return lines[:first], lines[first:]
+
+
+def _write(path, text, mode='a'):
+    with open(path, mode, newline='') as logFile:
+        logFile.write(text)
+
+
+def test_follower_partial_lines(tmp_path, log_lines):
+    header, records = log_lines
+    path = tmp_path / 'live.edi'
+    follower = livelog.LogFollower(str(path))
+    assert follower.poll() is None                                  # no file yet
+    _write(path, ''.join(header[:3]), 'w')
+    assert follower.poll() is None                                  # header not complete
+    _write(path, ''.join(header[3:] + records[:10]) + records[10][:7])
+    update = follower.poll()
+    assert update.reset and ''.join(update.lines) == ''.join(header + records[:10])
+    assert follower.poll() is None                                  # unchanged file
+
+    _write(path, records[10][7:12])                                 # line still incomplete
+    assert follower.poll() is None
+    _write(path, records[10][12:] + ''.join(records[11:15]) + records[15][:20])
+    update = follower.poll()
+    assert not update.reset and update.lines == records[10:15]
+    assert update.lineNumber == len(header) + 10
+
+    _write(path, records[15][20:] + '[END;Tucnak 4.36]\n')          # footer: not a QSO record
+    update = follower.poll()
+    assert update.lines == records[15:16] and update.lineNumber == len(header) + 15
+
+    _write(path, ''.join(header + records[:5]), 'w')                # log rewritten, shorter
+    update = follower.poll()
+    assert update.reset and ''.join(update.lines) == ''.join(header + records[:5])
+
+
+def test_live_log_accumulates(tmp_path, log_lines, monkeypatch):
+    # Statistics and ODX QSOs updated with each part of the log equal those of the whole log read at once
+    monkeypatch.setattr(edi2odx, 'STATSMAP', True)
+    monkeypatch.setattr(edi2odx, 'SORTBYQRB', True)
+    header, records = log_lines
+    live = edi2odx.LiveLog()
+    live.start(header + records[:100], 'live.edi')
+    assert live.append(records[100:101], len(header) + 100) == 1
+    assert live.append(records[101:250] + ['[END;Tucnak 4.36]\n'], len(header) + 101) == 149
+    assert live.append(records[250:], len(header) + 250) == 50
+    contest = live.update()
+
+    whole = edi2odx.Contest()
+    edi2odx.read_edi_lines(header + records, whole, edi2odx.ODX_COLUMNS)
+    edi2odx.compute_dist_az(whole)
+    edi2odx.select_odx_only(whole, edi2odx.ODX['432 MHz'])
+    assert live.qsos == contest.qsoList.shape[0] == 300
+    assert contest.qsoDx.reset_index(drop=True).equals(whole.qsoDx.reset_index(drop=True))
+    bins = np.minimum((whole.qsoList['AZIMUTH'].to_numpy() / edi2odx.AZIMUTH_STEP).astype(int),
+                      len(live.azimuths) - 1)
+    assert np.array_equal(live.azimuthCounts, np.bincount(bins, minlength=len(live.azimuths)))
+    assert np.allclose(live.azimuthKm, np.bincount(bins, weights=whole.qsoList['DISTANCE2'],
+                                                   minlength=len(live.azimuths)))
+    assert live.locators == set(whole.qsoList['LOCATOR'])
+    assert np.array_equal(live.density, edi2odx.density_counts(whole.qsoList, edi2odx.global_settings()))
+
+
+def _wait_for(check, timeout=10.0):
+    # Waits until check() is true
+    end = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < end, 'timeout'
+        time.sleep(0.02)
+
+
+def test_follow_file(tmp_path, log_lines, monkeypatch):
+    # Outputs of the followed log updated as it grows, equal to the outputs of the complete log
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(edi2odx, 'STATSMAP', False)
+    monkeypatch.setattr(edi2odx, 'OUTPUT_FORMATS', ['txt', 'csv'])
+    monkeypatch.setattr(edi2odx, 'EXCELOUTPUT', False)
+    header, records = log_lines
+    expected = edi2odx.process_edi(''.join(header + records), images=False)['outputs']
+    _write('live.edi', ''.join(header + records[:150]) + records[150][:5], 'w')
+    stop = threading.Event()
+    thread = threading.Thread(target=edi2odx.follow_file, args=('live.edi', 0.02, stop))
+    thread.start()
+    try:
+        prefix = contestlog.Contest()
+        edi2odx.read_edi_lines(header, prefix)
+        txt = prefix.outputFilePrefix + '_DXs.txt'
+        _wait_for(lambda: os.path.exists(txt))
+        _write('live.edi', records[150][5:] + ''.join(records[151:]) + 'IDENT;Tucnak;4.36\n')
+
+        def updated():
+            with open(txt, newline='') as txtFile:
+                return txtFile.read() == expected['txt']
+        _wait_for(updated)
+    finally:
+        stop.set()
+        thread.join()
+    with open(prefix.outputFilePrefix + '_DXs.csv', newline='') as csvFile:
+        assert csvFile.read() == expected['csv']
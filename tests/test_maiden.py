@@ -0,0 +1,99 @@
+# Vectorized locator functions of maiden.py: same results as the scalar functions for every element
+
+import math
+
+import numpy as np
+import pytest
+
+import maiden       # in local folder
+
+INVALID_LOCATORS = ['', 'XX99', 'JN3', 'JN36B', '1234', 'ZZ00', 'JN36 BK', 'J N36', 'JNAB', 'JN36BK1',
+                    'JN36BK12AB34', 'JN36BKBK']
+EDGE_POSITIONS = [(-90.0, -180.0), (89.999999, 179.999999), (-89.999999, 0.0), (0.0, -180.0), (0.0, 179.999999),
+                  (45.0, 179.5), (45.0, -179.5), (0.0, 0.0), (-33.9, 18.4), (64.1, -21.9)]
+
+
+def _positions(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.concatenate([rng.uniform(-89.999, 89.999, count), [p[0] for p in EDGE_POSITIONS]]), \
+        np.concatenate([rng.uniform(-179.999, 179.999, count), [p[1] for p in EDGE_POSITIONS]])
+
+
+def _scalar_position(mhl, locator):
+    try:
+        position = mhl._maiden2latlon(locator)
+    except ValueError:
+        return math.nan, math.nan
+    return (math.nan, math.nan) if position[0] is None else position
+
+
+@pytest.mark.parametrize('length', [4, 6, 8, 10, 5, 3, 12])
+def test_latlon2maiden_array(length):
+    latitudes, longitudes = _positions(2000)
+    expected = [maiden.Maiden.latlon2maiden((lat, lon), length) for lat, lon in zip(latitudes, longitudes)]
+    assert maiden.Maiden.latlon2maiden_array(latitudes, longitudes, length).tolist() == expected
+
+
+def test_latlon2maiden_array_invalid_positions():
+    locators = maiden.Maiden.latlon2maiden_array([np.nan, 46.4, np.inf], [7.1, np.nan, 7.1], 6)
+    assert locators.tolist() == ['', '', '']
+
+
+def test_maiden2latlon_array():
+    mhl = maiden.Maiden()
+    latitudes, longitudes = _positions(1000, seed=1)
+    locators = [maiden.Maiden.latlon2maiden((lat, lon), length)
+                for lat, lon in zip(latitudes, longitudes) for length in (4, 6, 8, 10)]
+    locators += [locator.lower() for locator in locators[:200]] + INVALID_LOCATORS + [None]
+    maiden.LOCATOR_CACHE.clear()
+    lat, lon = mhl.maiden2latlon_array(np.array(locators, dtype=object))
+    expected = np.array([_scalar_position(mhl, locator if isinstance(locator, str) else '')
+                         for locator in locators])
+    np.testing.assert_array_equal(lat, expected[:, 0])
+    np.testing.assert_array_equal(lon, expected[:, 1])
+    for locator in ('', 'XX99', 'ZZ00', '1234', 'JNAB', None):
+        assert np.isnan(lat[locators.index(locator)])
+    # cached results (second call) and scalar function with cache
+    lat_cached, lon_cached = mhl.maiden2latlon_array(locators)
+    np.testing.assert_array_equal(lat_cached, lat)
+    np.testing.assert_array_equal(lon_cached, lon)
+    for locator, latitude in zip(locators[:500], lat[:500]):
+        assert mhl.maiden2latlon(locator)[0] == latitude
+
+
+@pytest.mark.parametrize('home', [(46.4375, 6.875), (89.5, 0.0), (-89.5, 179.0), (0.0, 179.9), (12.3, -179.9)])
+def test_dist_az_array(home):
+    latitudes, longitudes = _positions(3000, seed=2)
+    latitudes = np.append(latitudes, home[0])
+    longitudes = np.append(longitudes, home[1])
+    distances, azimuths = maiden.Maiden.dist_az_array(home, latitudes, longitudes)
+    compared = 0
+    for lat, lon, distance, azimuth in zip(latitudes, longitudes, distances, azimuths):
+        try:
+            expected = maiden.Maiden.dist_az(home, (lat, lon))
+        except ValueError:      # acos out of its domain (rounding, antipodal positions), clipped by the array version
+            continue
+        assert (distance, azimuth) == expected
+        compared += 1
+    assert compared > 2900
+    assert (distances[-1], azimuths[-1]) == (0, 0)
+
+
+def test_dist_az_array_missing_positions():
+    distances, azimuths = maiden.Maiden.dist_az_array((46.4, 6.9), [np.nan, 47.0], [7.0, np.nan])
+    assert np.isnan(distances).all() and np.isnan(azimuths).all()
+
+
+def test_dist_az_locators():
+    mhl = maiden.Maiden()
+    home = mhl.maiden2latlon('JN36BK')
+    locators = ['JN47', 'IO91WM', 'KM72JT', 'XX99', 'JN36BK', 'PM95', 'FN31pr']
+    maiden.DIST_AZ_CACHE.clear()
+    for _ in range(2):          # computed, then cached
+        lat, lon, distances, azimuths = mhl.dist_az_locators(home, locators)
+        for locator, values in zip(locators, zip(lat, lon, distances, azimuths)):
+            position = mhl.maiden2latlon(locator)
+            if position[0] is None:
+                assert np.isnan(values).all()
+            else:
+                assert values == position + maiden.Maiden.dist_az(home, position)
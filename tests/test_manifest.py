@@ -0,0 +1,94 @@
+# Manifest of the outputs and incremental rebuild (edi2odx.stage_fingerprints, stale_stages, process_file)
+
+import os
+
+import pytest
+
+import benchmark    # in local folder
+import edi2odx      # in local folder
+
+
+@pytest.fixture
+def folder(tmp_path, monkeypatch):
+    # log of 300 QSOs in an empty current folder, text outputs only
+    monkeypatch.chdir(tmp_path)
+    for name, value in (('STATSMAP', False), ('OUTPUT_FORMATS', ['txt', 'csv', 'log_csv']), ('EXCELOUTPUT', False),
+                        ('CHECK_QSOS', False), ('EXCLUDE_FLAGGED', False), ('ARCHIVE_DB', None),
+                        ('ODX', dict(edi2odx.ODX)), ('SORTBYQRB', False)):
+        monkeypatch.setattr(edi2odx, name, value)
+    benchmark.generate_edi('log.edi', 300)
+    return tmp_path
+
+
+def _outputs(entry):
+    # modification time of each output file of a manifest entry
+    return {suffix: os.stat(entry['prefix'] + suffix).st_mtime_ns
+            for suffix in ('_DXs.txt', '_DXs.csv', '_log.csv')}
+
+
+def test_unchanged_rerun_skips_all_stages(folder):
+    entry = edi2odx.process_file('log.edi')['manifest']
+    assert set(entry['stages']) == {'txt', 'csv', 'log_csv'}
+    assert edi2odx.stale_stages(entry, edi2odx.file_digest('log.edi')) == set()
+    result = edi2odx.process_file('log.edi', entry)
+    assert result['skipped'] and result['manifest'] == entry
+
+
+def test_settings_change(folder, monkeypatch):
+    entry = edi2odx.process_file('log.edi')['manifest']
+    digest = edi2odx.file_digest('log.edi')
+    before = _outputs(entry)
+
+    monkeypatch.setitem(edi2odx.ODX, '432 MHz', 500)              # limit of another band: nothing to do
+    assert edi2odx.stale_stages(entry, digest) == set()
+    monkeypatch.setitem(edi2odx.ODX, '144 MHz', 700)              # ODX files, not the log export
+    assert edi2odx.stale_stages(entry, digest) == {'txt', 'csv'}
+
+    result = edi2odx.process_file('log.edi', entry)
+    after = _outputs(result['manifest'])
+    assert after['_log.csv'] == before['_log.csv']
+    assert after['_DXs.txt'] != before['_DXs.txt'] and after['_DXs.csv'] != before['_DXs.csv']
+    assert edi2odx.stale_stages(result['manifest'], digest) == set()
+
+    monkeypatch.setattr(edi2odx, 'SORTBYQRB', True)
+    assert edi2odx.stale_stages(result['manifest'], digest) == {'txt', 'csv'}
+
+
+def test_new_stages(folder, monkeypatch):
+    entry = edi2odx.process_file('log.edi')['manifest']
+    digest = edi2odx.file_digest('log.edi')
+    monkeypatch.setattr(edi2odx, 'OUTPUT_FORMATS', ['txt', 'csv', 'log_csv', 'json'])
+    assert edi2odx.stale_stages(entry, digest) == {'json'}
+    monkeypatch.setattr(edi2odx, 'CHECK_QSOS', True)
+    assert edi2odx.stale_stages(entry, digest) == {'json', 'check'}
+    monkeypatch.setattr(edi2odx, 'EXCLUDE_FLAGGED', True)             # the ODX files change
+    assert edi2odx.stale_stages(entry, digest) == {'txt', 'csv', 'json', 'check'}
+    monkeypatch.setattr(edi2odx, 'ARCHIVE_DB', str(folder / 'qsos.db'))
+    assert 'archive' in edi2odx.stale_stages(entry, digest)
+
+
+def test_plot_stages(folder, monkeypatch):
+    # stages of the images, with their output files present
+    monkeypatch.setattr(edi2odx, 'STATSMAP', True)
+    entry = {'sha256': 'x', 'band': '144 MHz', 'prefix': 'log', 'qsos': 1, 'odx': 0,
+             'stages': edi2odx.stage_fingerprints('144 MHz')}
+    for suffix in ('_DXs.txt', '_DXs.csv', '_log.csv', '_Azimuth.png', '_Points.png', '_Map.png'):
+        open('log' + suffix, 'w').close()
+    assert edi2odx.stale_stages(entry, 'x') == set()
+    monkeypatch.setattr(edi2odx, 'MAP_ZOOM', edi2odx.MAP_ZOOM + 1)
+    assert edi2odx.stale_stages(entry, 'x') == {'map'}
+    monkeypatch.setattr(edi2odx, 'PLOT_DPI', 50)
+    assert edi2odx.stale_stages(entry, 'x') == {'map', 'plots'}
+    os.remove('log_DXs.txt')                                            # output file deleted
+    assert edi2odx.stale_stages(entry, 'x') == {'map', 'plots', 'txt'}
+
+
+def test_source_change(folder):
+    entry = edi2odx.process_file('log.edi')['manifest']
+    with open('log.edi', 'a') as ediFile:
+        ediFile.write('230507;1300;DL1ABC;1;59;001;59;001;;JN47AA;250;;;;\n')
+    assert edi2odx.stale_stages(entry, edi2odx.file_digest('log.edi')) is None     # all stages
+    assert edi2odx.stale_stages(None, edi2odx.file_digest('log.edi')) is None
+    result = edi2odx.process_file('log.edi', entry)
+    assert not result.get('skipped') and result['qsos'] == 301
+    assert set(result['manifest']['stages']) == {'txt', 'csv', 'log_csv'}
@@ -0,0 +1,83 @@
+# Spatial queries of the QSO archive (odxarchive.py, gridindex.py) against a brute-force filter
+
+import numpy as np
+import pytest
+
+import benchmark    # in local folder
+import gridindex    # in local folder
+import maiden       # in local folder
+import odxarchive   # in local folder
+
+
+@pytest.fixture(scope='module')
+def archive(tmp_path_factory):
+    folder = tmp_path_factory.mktemp('archive')
+    filenames = []
+    for number, locator in enumerate(('JN36BK', 'JO60LJ')):
+        filenames.append(str(folder / ('log_%s.edi' % number)))
+        benchmark.generate_edi(filenames[-1], 3000, call='HB9X%s' % number, locator=locator, spread=12.0,
+                               seed=number)
+    database = str(folder / 'qsos.db')
+    odxarchive.ingest_files(database, filenames)
+    connection = odxarchive.connect(database)
+    yield connection, odxarchive.query(connection)
+    connection.close()
+
+
+def _keys(qsos):
+    return sorted(zip(qsos['contest_id'], qsos['utc'], qsos['call'], qsos['locator']))
+
+
+def _brute_force(qsos, near=None, bbox=None, sector=None):
+    keep = np.ones(len(qsos), dtype=bool)
+    if bbox:
+        keep &= gridindex.in_box(qsos['lat'], qsos['lon'], *bbox)
+    if near:
+        distances, _ = maiden.Maiden.dist_az_array(odxarchive.reference_position(near[0]), qsos['lat'], qsos['lon'])
+        keep &= distances <= near[1]
+    if sector:
+        distances, azimuths = maiden.Maiden.dist_az_array(odxarchive.reference_position(sector[0]), qsos['lat'],
+                                                          qsos['lon'])
+        keep &= gridindex.in_sector(azimuths, sector[1], sector[2])
+        if len(sector) > 3:
+            keep &= distances >= sector[3]
+        if len(sector) > 4:
+            keep &= distances <= sector[4]
+    return _keys(qsos[keep])
+
+
+@pytest.mark.parametrize('criteria', [
+    {'near': ('JN47', 150)},
+    {'near': ('JN36BK', 1500)},
+    {'bbox': (5, 45, 11, 48)},
+    {'sector': ('JN36BK', 300, 330)},
+    {'sector': ('JN36BK', 300, 330, 600)},              # minimum distance only
+    {'sector': ('JN36BK', 300, 330, 600, 900)},
+    {'sector': ('JO60LJ', 350, 20, 200)},               # across north
+    {'sector': ('JO60LJ', 90, 270, 0, 500)},
+    {'near': ('JN36BK', 800), 'sector': ('JO60LJ', 180, 300, 100)},
+])
+def test_spatial_query(archive, criteria):
+    connection, qsos = archive
+    found = odxarchive.query(connection, **criteria)
+    expected = _brute_force(qsos, **criteria)
+    assert expected
+    assert _keys(found) == expected
+    assert found['utc'].is_monotonic_increasing
+
+
+def test_random_sectors(archive):
+    connection, qsos = archive
+    rng = np.random.default_rng(0)
+    locators = qsos['locator'].unique()
+    for _ in range(40):
+        sector = [str(rng.choice(locators))[:6], float(rng.integers(0, 360)), float(rng.integers(0, 360)),
+                  float(rng.integers(0, 800))]
+        if rng.random() < 0.5:
+            sector.append(sector[3] + float(rng.integers(1, 1500)))
+        assert _keys(odxarchive.query(connection, sector=sector)) == _brute_force(qsos, sector=sector)
+
+
+def test_invalid_reference(archive):
+    with pytest.raises(ValueError):
+        odxarchive.query(archive[0], near=('XX99', 10))
@@ -0,0 +1,80 @@
+# Output formats of the ODX QSOs and of the whole log (odxwriter.py), on a log with empty fields
+
+import csv
+import io
+import json
+
+import pytest
+
+import edi2odx      # in local folder
+import odxwriter    # in local folder
+
+# empty MODE (2nd QSO), empty received RST (3rd QSO) and empty sent RST and numbers (4th QSO)
+SAMPLE_LOG = '''[REG1TEST;1]
+TName=Test
+TDate=20221001;20221002
+PCall=HB9XC/P
+PWWLo=JN36BK
+PBand=432 MHz
+[Remarks]
+[QSORecords;4]
+221001;1400;DL0ABC;2;59;001;59;005;;KM41PO;972;;N;;
+221001;1401;DL1ABC;;59;002;59;006;;JM17AM;891;;N;;
+221001;1402;DL2ABC;6;59;003;;007;;IO74XH;914;;N;;
+221001;1403;DL3ABC;1;;;59;;;JO78MS;75;;N;;
+'''
+
+
+@pytest.fixture(scope='module')
+def outputs():
+    formats = [name for name in odxwriter.OUTPUT_FILES if name != 'xlsx' or _has_openpyxl()]
+    return edi2odx.process_edi(SAMPLE_LOG, settings={'OUTPUT_FORMATS': formats}, images=False)['outputs']
+
+
+def _has_openpyxl():
+    try:
+        import openpyxl     # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def test_all_formats_written(outputs):
+    assert set(outputs) >= set(odxwriter.OUTPUT_FILES) - {'xlsx'}
+
+
+def test_json_empty_fields(outputs):
+    qsos = json.loads(outputs['log_json'])['qsos']
+    assert len(qsos) == 4
+    assert qsos[1]['mode'] is None
+    assert qsos[2]['received_rst'] is None
+    assert qsos[3]['sent_rst'] is None and qsos[3]['sent_nr'] is None and qsos[3]['received_number'] is None
+    assert qsos[0]['received_rst'] == 59
+    odx = json.loads(outputs['json'])['qsos']
+    assert [qso['call'] for qso in odx] == ['DL0ABC', 'DL1ABC', 'DL2ABC']
+    assert odx[1]['mode'] is None
+
+
+def test_csv_empty_fields(outputs):
+    rows = list(csv.DictReader(io.StringIO(outputs['log_csv'])))
+    assert [row['MODE'] for row in rows] == ['2', '', '6', '1']
+    assert rows[2]['RECEIVED_RST'] == '' and rows[3]['SENT_NR'] == ''
+    rows = list(csv.DictReader(io.StringIO(outputs['csv'])))
+    assert [row['MODE'] for row in rows] == ['2', '', '6']
+
+
+def test_adif_empty_fields(outputs):
+    records = outputs['log_adif'].split('<EOH>')[1].split('<EOR>')[:-1]
+    records = [record for record in records if '<CALL:' in record]
+    assert len(records) == 4
+    assert '<MODE:' not in records[1]
+    assert '<RST_RCVD:' not in records[2] and '<RST_SENT:3>' not in records[2]
+    assert '<RST_SENT:' not in records[3] and '<STX:' not in records[3] and '<SRX:' not in records[3]
+    assert '<RST_RCVD:2>59' in records[0]
+    assert outputs['adif'].count('<CALL:') == 3
+
+
+def test_text_outputs(outputs):
+    assert outputs['txt'].splitlines()[2].split('\t')[2] == 'DL0ABC'
+    if 'xlsx' in outputs:
+        assert outputs['xlsx'][:2] == b'PK'
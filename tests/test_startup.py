@@ -0,0 +1,42 @@
+# Documented target of the text-only mode: a run (`edi2odx.py --text-only log.edi`) converting a log of
+# STARTUP_QSOS QSOs completes within TEXT_ONLY_STARTUP_TARGET seconds wall time, interpreter startup included,
+# and never imports the plotting/mapping stack
+
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import benchmark    # in local folder
+
+TEXT_ONLY_STARTUP_TARGET = 1.0
+STARTUP_QSOS = 1000
+HEAVY_MODULES = ('matplotlib', 'geotiler', 'tilecache')
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'edi2odx.py')
+
+
+@pytest.fixture
+def sample_folder(tmp_path):
+    benchmark.generate_edi(str(tmp_path / 'sample.edi'), STARTUP_QSOS)
+    return tmp_path
+
+
+def test_text_only_startup_time(sample_folder):
+    # best of 3 runs in a new interpreter
+    durations = []
+    for _ in range(3):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, SCRIPT, '--text-only', 'sample.edi'], cwd=sample_folder, check=True,
+                       capture_output=True)
+        durations.append(time.perf_counter() - start)
+    assert min(durations) <= TEXT_ONLY_STARTUP_TARGET
+    assert (sample_folder / '20230506_HB9XC_JN36BK__144MHz_DXs.txt').exists()
+
+
+def test_text_only_imports(sample_folder):
+    imports = subprocess.run([sys.executable, '-X', 'importtime', SCRIPT, '--text-only', 'sample.edi'],
+                             cwd=sample_folder, check=True, capture_output=True, text=True).stderr
+    modules = {line.split('|')[-1].strip().split('.')[0] for line in imports.splitlines() if '|' in line}
+    assert not modules & set(HEAVY_MODULES)
@@ -0,0 +1,236 @@
+# Map tiles cache for the station maps of EDI2ODX
+# Part of EDI2ODX, project hosted on https://github.com/HB9DTX/EDI2ODX
+#
+# - TileCache: persistent on-disk cache of the map tiles, limited in size (least recently used tiles are evicted)
+# - base_map(): in-process cache of the rendered base map image, keyed by map limits and zoom,
+#   so that the map is rendered only once per process whatever the number of EDI files (not kept if tiles are missing)
+# - prefill(): fills the disk cache from a local tile directory ({z}/{x}/{y}.png files) or from a local
+#   stand-in tile server, so that maps can be generated without network access
+
+import asyncio
+import functools
+import hashlib
+import logging
+import math
+import os
+import tempfile
+import threading
+import urllib.parse
+import urllib.request
+
+import numpy as np
+import geotiler     # as `pip` package, usage: https://wrobell.dcmod.org/geotiler/usage.html
+import geotiler.cache
+import geotiler.geo
+import geotiler.tile.io
+
+
+class TileCache:
+    # Tiles are stored as files <directory>/<host>/<path of the tile URL>, the file modification time
+    # is updated at each cache hit and used to evict the least recently used tiles
+    def __init__(self, directory, max_size_mb=200):
+        self.directory = directory
+        self.maxSize = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._files())
+
+    def _files(self):
+        # (path, size, modification time) of all the cached tiles
+        for folder, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(folder, name)
+                try:
+                    status = os.stat(path)
+                except FileNotFoundError:   # evicted by another process meanwhile
+                    continue
+                yield path, status.st_size, status.st_mtime
+
+    def path(self, url):
+        # File name of the tile of a given URL
+        url = urllib.parse.urlsplit(url)
+        path = url.netloc.replace(':', '_') + url.path
+        if url.query:   # e.g. API key, kept out of the file name
+            path += '_' + hashlib.sha1(url.query.encode()).hexdigest()[:10]
+        return os.path.join(self.directory, *[part for part in path.split('/') if part not in ('', '.', '..')])
+
+    def get(self, url):
+        # Tile data, None if not in cache
+        path = self.path(url)
+        try:
+            with open(path, 'rb') as tile_file:
+                data = tile_file.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def set(self, url, data):
+        # Stores tile data (ignored if None: tile not downloaded)
+        # geotiler also calls set for the tiles read from the cache: a tile already stored is not written again
+        if not data:
+            return
+        path = self.path(url)
+        try:
+            if os.path.getsize(path) == len(data):
+                return
+        except OSError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename, other processes never read a partially written tile
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(handle, 'wb') as tile_file:
+            tile_file.write(data)
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        os.replace(temp_path, path)
+        with self._lock:
+            self._size += len(data) - old_size
+            if self._size > self.maxSize:
+                self._evict()
+
+    def _evict(self):
+        # Removes the least recently used tiles until the cache is filled at 90% of its maximum size
+        files = sorted(self._files(), key=lambda item: item[2])
+        self._size = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if self._size <= 0.9 * self.maxSize:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+            logging.debug('tile evicted from cache: %s', path)
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size_mb': round(self._size / 1024 / 1024, 1),
+                'max_size_mb': round(self.maxSize / 1024 / 1024, 1)}
+
+    def downloader(self, source=None):
+        # geotiler downloader using this cache, the missing tiles are fetched from source
+        # (local tile directory or stand-in tile server URL) or from the map provider if source is None
+        fetch = geotiler.tile.io.fetch_tiles if source is None else functools.partial(_fetch_local_tiles, source)
+        return functools.partial(geotiler.cache.caching_downloader, self.get, self.set, fetch)
+
+
+def _local_tile_path(url):
+    # {z}/{x}/{y}.png part of a tile URL
+    return '/'.join(urllib.parse.urlsplit(url).path.split('/')[-3:])
+
+
+async def _fetch_local_tiles(source, tiles, num_workers):
+    # geotiler downloader reading the tiles from a local directory or from a local stand-in tile server
+    for tile in tiles:
+        location = _local_tile_path(tile.url)
+        try:
+            if os.path.isdir(source):
+                with open(os.path.join(source, *location.split('/')), 'rb') as tile_file:
+                    data = tile_file.read()
+            else:
+                with urllib.request.urlopen(source.rstrip('/') + '/' + location, timeout=10) as response:
+                    data = response.read()
+        except OSError as error:
+            logging.warning('Tile %s not available from %s: %s', location, source, error)
+            yield tile._replace(img=None, error=ValueError(str(error)))
+        else:
+            yield tile._replace(img=data, error=None)
+
+
+_base_maps = {}                         # (bbox, zoom, provider) -> (geotiler.Map, PIL image)
+_base_maps_lock = threading.Lock()
+
+
+def _recording(downloader, failed):
+    # geotiler downloader appending to failed the URLs of the tiles which could not be fetched
+    # (geotiler doesn't raise on them, they are left blank on the map)
+    async def fetch(tiles, num_workers, **kw):
+        async for tile in downloader(tiles, num_workers, **kw):
+            if tile.error is not None or not tile.img:
+                failed.append(tile.url)
+            yield tile
+    return fetch
+
+
+def map_key(bbox, zoom, provider='osm'):
+    # Identifies a base map: rendered again only if one of these changes (or if some tiles were missing)
+    return tuple(bbox), zoom, provider
+
+
+def base_map(bbox, zoom, cache=None, source=None, provider='osm'):
+    # Returns (geotiler.Map, rendered image) of the base map, rendered once per process
+    # (rendered again at the next call if some tiles could not be fetched, e.g. no network)
+    # cache: TileCache used for the tiles, source: see TileCache.downloader
+    key = map_key(bbox, zoom, provider)
+    with _base_maps_lock:
+        if key in _base_maps:
+            return _base_maps[key]
+        mm = geotiler.Map(extent=bbox, zoom=zoom, provider=provider)
+        downloader = cache.downloader(source) if cache is not None else geotiler.tile.io.fetch_tiles
+        failed = []
+        rendered = (mm, _render(mm, _recording(downloader, failed)))
+        if cache is not None:
+            logging.info('Map tiles cache: %s', cache.info())
+        if failed:
+            logging.warning('%s map tiles not available, the map is incomplete', len(failed))
+        else:
+            _base_maps[key] = rendered
+        return rendered
+
+
+def _render(mm, downloader):
+    # geotiler.render_map needs an event loop, which doesn't exist in the threads other than the main one
+    if threading.current_thread() is threading.main_thread():
+        return geotiler.render_map(mm, downloader=downloader)
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(geotiler.render_map_async(mm, downloader=downloader))
+    finally:
+        loop.close()
+
+
+def rev_geocode(mm, longitudes, latitudes):
+    # Vectorized geotiler.Map.rev_geocode: pixel coordinates (x, y arrays) on the map image of the positions
+    # given as arrays of longitudes and latitudes (degrees), same computation as geotiler (Web Mercator)
+    projection = mm.provider.projection
+    if not isinstance(projection, geotiler.geo.WebMercator):
+        raise ValueError('projection %s not supported' % type(projection).__name__)
+    transformation = projection.transformation
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    lat = np.log(np.tan(0.25 * np.pi + 0.5 * np.radians(np.asarray(latitudes, dtype=np.float64))))
+    scale = math.pow(2, mm.zoom - projection.zoom)
+    column = (transformation.ax * lon + transformation.bx * lat + transformation.cx) * scale
+    row = (transformation.ay * lon + transformation.by * lat + transformation.cy) * scale
+    width, height = mm.size
+    x = mm.offset[0] + mm.provider.tile_width * (column - mm.origin[0]) + width / 2
+    y = mm.offset[1] + mm.provider.tile_height * (row - mm.origin[1]) + height / 2
+    return x, y
+
+
+def prefill(bbox, zooms, cache, source=None, provider='osm'):
+    # Fills the cache with all the tiles of the map for each zoom level, from source (local tile directory,
+    # stand-in tile server URL or None: map provider)
+    # Returns the number of tiles available in the cache
+    count = 0
+    for zoom in zooms:
+        mm = geotiler.Map(extent=bbox, zoom=zoom, provider=provider)
+
+        async def fill():
+            return [tile async for tile in geotiler.map.fetch_tiles(mm, cache.downloader(source))]
+
+        loop = asyncio.new_event_loop()
+        try:
+            tiles = loop.run_until_complete(fill())
+        finally:
+            loop.close()
+        count += sum(1 for tile in tiles if tile.img)
+        logging.info('zoom %s: %s of %s tiles in cache', zoom, sum(1 for tile in tiles if tile.img), len(tiles))
+    return count
@@ -0,0 +1,113 @@
+# Watch of a folder for new or modified EDI files, for the daemon mode of EDI2ODX (edi2odx.py --watch)
+# Part of EDI2ODX, project hosted on https://github.com/HB9DTX/EDI2ODX
+#
+# Uses inotify on Linux if the optional `inotify_simple` package is installed (`pip install inotify_simple`),
+# else the folder is scanned every poll_interval seconds.
+# A file is only reported once its size and modification time have not changed for `settle` seconds,
+# so that files still being copied into the folder are not processed half written.
+
+import logging
+import os
+import time
+
+try:
+    import inotify_simple   # optional, Linux only
+except ImportError:
+    inotify_simple = None
+
+
+class FolderWatcher:
+    # Usage: watcher = FolderWatcher(folder); while True: files = watcher.wait(); ...
+    # The files already in the folder are reported at the first wait()
+    def __init__(self, folder, suffixes=('.edi',), settle=2.0, poll_interval=1.0, use_inotify=True):
+        self.folder = folder
+        self.suffixes = tuple(suffix.lower() for suffix in suffixes)
+        self.settle = settle
+        self.pollInterval = poll_interval
+        self.reported = {}              # path -> (size, mtime) when reported
+        self.pending = {}               # path -> (size, mtime, time of the last change seen)
+        self.inotify = None
+        if use_inotify and inotify_simple is not None:
+            try:
+                self.inotify = inotify_simple.INotify()
+                self.inotify.add_watch(folder, inotify_simple.flags.CLOSE_WRITE | inotify_simple.flags.MOVED_TO
+                                       | inotify_simple.flags.CREATE | inotify_simple.flags.MODIFY)
+            except OSError as error:    # e.g. network file system, too many watches
+                logging.warning('inotify not available for %s (%s), polling the folder', folder, error)
+                self.inotify = None
+        logging.info('Watching %s (%s)', folder, 'inotify' if self.inotify else
+                     'polling every %s s' % poll_interval)
+        self._scan()
+
+    def _matches(self, name):
+        return name.lower().endswith(self.suffixes) and not name.startswith('.')
+
+    def _check(self, path, now):
+        # Records a change of a file (new size or modification time), forgets deleted files
+        try:
+            status = os.stat(path)
+        except OSError:
+            self.pending.pop(path, None)
+            self.reported.pop(path, None)
+            return
+        signature = (status.st_size, status.st_mtime)
+        if signature == self.reported.get(path):
+            self.pending.pop(path, None)
+        elif path not in self.pending or self.pending[path][:2] != signature:
+            self.pending[path] = signature + (now,)
+
+    def _scan(self):
+        # Checks all the files of the folder
+        now = time.monotonic()
+        for name in os.listdir(self.folder):
+            if self._matches(name):
+                self._check(os.path.normpath(os.path.join(self.folder, name)), now)
+        for path in list(self.pending):
+            if not os.path.exists(path):
+                self._check(path, now)
+
+    def _ready(self):
+        # Pending files which have not changed for `settle` seconds, marked as reported
+        now = time.monotonic()
+        for path in list(self.pending):
+            self._check(path, now)      # a file may change without any event (e.g. network share)
+        ready = sorted(path for path, (_, _, changed) in self.pending.items() if now - changed >= self.settle)
+        for path in ready:
+            self.reported[path] = self.pending.pop(path)[:2]
+        return ready
+
+    def _events(self, timeout):
+        # Waits up to timeout seconds for changes in the folder
+        if self.inotify is None:
+            time.sleep(timeout)
+            self._scan()
+            return
+        events = self.inotify.read(timeout=int(timeout * 1000))
+        now = time.monotonic()
+        for event in events:
+            if event.name and self._matches(event.name):
+                self._check(os.path.normpath(os.path.join(self.folder, event.name)), now)
+
+    def wait(self, timeout=None):
+        # Returns the list of the new or modified files, once they are complete (not changed for `settle` s)
+        # Blocks until there is at least one, or returns an empty list after timeout seconds (None: no limit)
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            ready = self._ready()
+            if ready:
+                return ready
+            if self.inotify is None:
+                delay = self.pollInterval
+            elif self.pending:
+                delay = min(self.settle, 1.0)
+            else:
+                delay = 60.0            # nothing to debounce: sleep until an event arrives
+            if end is not None:
+                delay = min(delay, end - time.monotonic())
+                if delay <= 0:
+                    return []
+            self._events(delay)
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()